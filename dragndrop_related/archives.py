@@ -0,0 +1,250 @@
+import io
+import mimetypes
+import posixpath
+import tarfile
+import time
+import zipfile
+
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import TemporaryUploadedFile
+from django.template.defaultfilters import filesizeformat
+
+
+''' File name extensions of the archives which may be extracted into related
+    model instances (see the `archive_uploads` option of the mixin)
+'''
+ARCHIVE_EXTENSIONS = (
+    '.zip',
+    '.tar',
+    '.tar.gz',
+    '.tgz',
+    '.tar.bz2',
+    '.tbz2',
+    '.tar.xz',
+    '.txz',
+)
+
+''' Size of the chunks in which archive entries are read and written '''
+CHUNK_SIZE = 64 * 1024
+
+''' Errors raised by `zipfile` and `tarfile` (and the decompressors they use)
+    when reading a corrupt archive
+'''
+ARCHIVE_ERRORS = (
+    zipfile.BadZipFile,
+    zipfile.LargeZipFile,
+    tarfile.TarError,
+    EOFError,
+    OSError,
+    ValueError,
+)
+
+
+def is_archive(name):
+    ''' Return whether the file called `name` is an archive, judging by its
+        extension. Formats which happen to be ZIP files, e.g. `.docx` or
+        `.epub`, aren't treated as archives.
+    '''
+
+    return name.lower().endswith(ARCHIVE_EXTENSIONS)
+
+
+class Archive(object):
+    ''' A ZIP or tar archive uploaded as `file`, from which entries are
+        extracted one at a time without reading the whole archive into
+        memory. To guard against archive bombs, `check` rejects archives with
+        more than `max_entries` entries, whose entries add up to more than
+        `max_size` bytes, or which expand to more than `max_ratio` times their
+        own size, using only the ZIP central directory or the tar headers.
+        Extraction then stops any entry exceeding its stated size.
+    '''
+
+    def __init__(self, file, max_entries, max_size, max_ratio):
+        self.file = file
+        self.max_entries = max_entries
+        self.max_size = max_size
+        self.max_ratio = max_ratio
+        self.is_zip = file.name.lower().endswith('.zip')
+
+    def get_members(self):
+        ''' Yield a tuple of the name, size and whether it's a regular file
+            for each entry in the archive, reading the tar headers in a single
+            pass. Tar archives are read as a stream (`r|*`), so compressed
+            archives are decompressed once per pass without seeking back.
+        '''
+
+        self.file.seek(0)
+        if self.is_zip:
+            with zipfile.ZipFile(self.file) as archive:
+                for info in archive.infolist():
+                    yield info.filename, info.file_size, not info.is_dir()
+        else:
+            with tarfile.open(fileobj=self.file, mode='r|*') as archive:
+                for member in archive:
+                    yield member.name, member.size, member.isfile()
+
+    def check(self):
+        ''' Raise a `ValidationError` if the archive can't be read or exceeds
+            any of the limits, before any of it is extracted
+        '''
+
+        entries = 0
+        total_size = 0
+        try:
+            for _, size, _ in self.get_members():
+                entries += 1
+                total_size += size
+                if entries > self.max_entries:
+                    raise ValidationError(
+                        'Archive has more than {0} entries.'.format(
+                            self.max_entries))
+                if total_size > self.max_size:
+                    raise ValidationError(
+                        'Archive expands to more than {0}.'.format(
+                            filesizeformat(self.max_size)))
+                if total_size > self.max_ratio * max(self.file.size or 0, 1):
+                    raise ValidationError(
+                        'Archive expands to more than {0} times its '
+                        'size.'.format(self.max_ratio))
+        except ARCHIVE_ERRORS:
+            raise ValidationError('Not a valid ZIP or tar archive.')
+
+    def is_extracted(self, name, is_file):
+        ''' Return whether the entry called `name` should be extracted,
+            leaving out directories, links and the like, as well as hidden
+            files and resource forks such as `.DS_Store` and `__MACOSX/`
+        '''
+
+        parts = name.replace('\\', '/').split('/')
+        return is_file and not any(
+            part.startswith('.') or part == '__MACOSX' for part in parts)
+
+    def extract(self, source, name, size):
+        ''' Copy the entry `name` of `size` bytes from the `source` stream
+            into a `TemporaryUploadedFile` named after its base name
+        '''
+
+        base_name = posixpath.basename(name.replace('\\', '/'))
+        file = TemporaryUploadedFile(
+            base_name, mimetypes.guess_type(base_name)[0], size, None)
+        try:
+            written = 0
+            for chunk in iter(lambda: source.read(CHUNK_SIZE), b''):
+                written += len(chunk)
+                if written > size:
+                    raise ValidationError(
+                        'Entry is larger than the archive says.')
+                file.write(chunk)
+            file.seek(0)
+        except BaseException:
+            file.close()
+            raise
+        return file
+
+    def __iter__(self):
+        ''' Yield a tuple of the entry's name, a `TemporaryUploadedFile` of
+            its contents (or `None` if it can't be read) and a list of error
+            messages for each regular file in the archive, in archive order.
+            Each file is extracted as it's reached; the caller is responsible
+            for closing them.
+        '''
+
+        self.file.seek(0)
+        if self.is_zip:
+            with zipfile.ZipFile(self.file) as archive:
+                for info in archive.infolist():
+                    if not self.is_extracted(info.filename, not info.is_dir()):
+                        continue
+                    if info.flag_bits & 0x1:
+                        yield info.filename, None, ['Entry is encrypted.']
+                        continue
+                    try:
+                        with archive.open(info) as source:
+                            file = self.extract(
+                                source, info.filename, info.file_size)
+                    except ValidationError as e:
+                        yield info.filename, None, e.messages
+                    except (*ARCHIVE_ERRORS, NotImplementedError):
+                        yield info.filename, None, ['Entry is corrupt.']
+                    else:
+                        yield info.filename, file, []
+        else:
+            try:
+                with tarfile.open(fileobj=self.file, mode='r|*') as archive:
+                    for member in archive:
+                        if not self.is_extracted(
+                                member.name, member.isfile()):
+                            continue
+                        try:
+                            file = self.extract(
+                                archive.extractfile(member), member.name,
+                                member.size)
+                        except ValidationError as e:
+                            yield member.name, None, e.messages
+                        else:
+                            yield member.name, file, []
+            except ARCHIVE_ERRORS:
+                raise ValidationError('Archive is corrupt.')
+
+
+class StreamBuffer(io.RawIOBase):
+    ''' An unseekable stream which collects the data written to it until
+        it's taken with `pop`, so that `zipfile` can write an archive a piece
+        at a time into a streaming response. Reports its position, as
+        `zipfile` needs for its offsets.
+    '''
+
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def pop(self):
+        ''' Return and forget the data written since the last call '''
+
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def stream_zip(storage, entries):
+    ''' Yield a ZIP archive a chunk at a time, containing the files stored
+        in `storage` for each `(name, stored_name)` pair in the iterable
+        `entries`, under `name`. Files are read from storage in chunks and
+        stored uncompressed (uploads are usually compressed already), so
+        memory use doesn't grow with the size of the files; only the archive's
+        central directory, written at the end, grows with their number (by
+        under 1KB per file).
+        Files missing from storage, or already included under the same
+        `name`, are skipped.
+    '''
+
+    date_time = time.localtime(time.time())[:6]
+    buffer = StreamBuffer()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_STORED) as archive:
+        for name, stored_name in entries:
+            if name in archive.NameToInfo:
+                continue
+            try:
+                source = storage.open(stored_name, 'rb')
+            except OSError:
+                continue
+
+            info = zipfile.ZipInfo(name, date_time)
+            info.external_attr = 0o644 << 16
+            with source, archive.open(info, 'w', force_zip64=True) as dest:
+                for chunk in source.chunks(CHUNK_SIZE):
+                    dest.write(chunk)
+                    yield buffer.pop()
+            yield buffer.pop()
+    yield buffer.pop()
@@ -0,0 +1,51 @@
+import hashlib
+
+
+''' Values for the `deduplicate_uploads` option of the mixin: skip files
+    already attached to the same parent, or additionally reuse the stored file
+    of an identical upload attached to any parent
+'''
+DEDUPLICATE_PARENT = 'parent'
+DEDUPLICATE_STORAGE = 'storage'
+
+
+def hash_file(file):
+    ''' Return the hex SHA-256 digest of `file`'s contents, read in chunks so
+        large files aren't loaded into memory. The file is rewound afterwards
+        so it can still be saved. Files streamed to storage (see
+        `StoredUploadedFile`) were hashed as they were received.
+    '''
+
+    content_hash = getattr(file, 'content_hash', None)
+    if content_hash:
+        return content_hash
+
+    digest = hashlib.sha256()
+    for chunk in file.chunks():
+        digest.update(chunk)
+    file.seek(0)
+    return digest.hexdigest()
+
+
+def find_duplicates(spec, related_manager, hashes, mode):
+    ''' Look up the supplied content `hashes` in the related model's hash
+        field. Returns a tuple of the set of hashes already attached to the
+        parent of `related_manager`, and (when `mode` is `DEDUPLICATE_STORAGE`)
+        a dict mapping hashes found elsewhere to the name of their stored file.
+    '''
+
+    hash_field_name = spec.related_model_hash_field_name
+    lookup = {f'{hash_field_name}__in': set(hashes)}
+
+    attached = set(related_manager.filter(**lookup).values_list(
+        hash_field_name, flat=True))
+
+    stored = {}
+    if mode == DEDUPLICATE_STORAGE:
+        stored = dict(spec.related_model._default_manager
+                      .filter(**lookup)
+                      .exclude(**{f'{hash_field_name}__in': attached})
+                      .values_list(hash_field_name,
+                                   spec.related_model_field_name))
+
+    return attached, stored
@@ -0,0 +1,198 @@
+import hashlib
+import os
+import posixpath
+
+from django.conf import settings
+from django.core import signing
+from django.core.files import File
+from django.core.validators import validate_image_file_extension
+
+from .processing import get_cache
+
+
+''' Salt used when signing direct upload tokens '''
+TOKEN_SALT = 'dragndrop_related.direct'
+
+
+def get_direct_upload_expiry():
+    ''' Return how long in seconds signed upload targets remain valid, from
+        the `DRAGNDROP_RELATED_DIRECT_UPLOAD_EXPIRY` setting (defaults to one
+        hour)
+    '''
+
+    return getattr(settings, 'DRAGNDROP_RELATED_DIRECT_UPLOAD_EXPIRY', 3600)
+
+
+def sign_upload(parent, key, purpose='finalize'):
+    ''' Return a token allowing the file stored under `key` to be attached
+        to `parent`. Tokens for the local upload endpoint (see
+        `LocalDirectUploadBackend`) use a `purpose` of `upload`, so they can't
+        be passed to the finalize step.
+    '''
+
+    return signing.dumps({
+        'model': parent._meta.label_lower,
+        'pk': str(parent.pk),
+        'key': key,
+    }, salt=f'{TOKEN_SALT}.{purpose}')
+
+
+def unsign_upload(parent, token, purpose='finalize'):
+    ''' Return the storage key from a token created by `sign_upload`, or
+        raise `signing.BadSignature` if it's invalid, has expired or was
+        issued for a different parent or purpose
+    '''
+
+    data = signing.loads(
+        token, salt=f'{TOKEN_SALT}.{purpose}',
+        max_age=get_direct_upload_expiry())
+    if data['model'] != parent._meta.label_lower or \
+            data['pk'] != str(parent.pk):
+        raise signing.BadSignature('Token was issued for another object')
+    return data['key']
+
+
+def get_claim_cache_key(key):
+    return 'dragndrop_related:direct:{0}'.format(
+        hashlib.sha256(key.encode()).hexdigest())
+
+
+def claim_upload(key):
+    ''' Return whether this is the first claim on the file stored under
+        `key`, which should then be attached. Finalize tokens remain valid
+        until they expire, so this makes each usable only once: claims are
+        kept for as long as tokens are valid, and made with the cache's atomic
+        `add`, so given a cache shared between processes (see `get_cache`)
+        only one of several concurrent attempts succeeds.
+    '''
+
+    return get_cache().add(
+        get_claim_cache_key(key), True, get_direct_upload_expiry())
+
+
+def release_upload(key):
+    ''' Forget the claim on the file stored under `key`, so it may be
+        finalized again, e.g. after attaching it failed
+    '''
+
+    get_cache().delete(get_claim_cache_key(key))
+
+
+class BaseDirectUploadBackend(object):
+    ''' Base class for backends issuing short-lived upload targets, allowing
+        the browser to send files straight to storage rather than via a
+        Django worker. Backends are instantiated with the `RelatedModelSpec`
+        of the `ModelAdmin`, the parent instance and the URL of the local
+        signed upload endpoint.
+    '''
+
+    def __init__(self, spec, parent, upload_url=None):
+        self.spec = spec
+        self.parent = parent
+        self.upload_url = upload_url
+        self.storage = spec.related_model_field.storage
+
+    def get_key(self, name):
+        ''' Return the storage key a file called `name` will be uploaded to,
+            generated by the related model's field (i.e. respecting its
+            `upload_to`) with a random suffix so concurrent uploads of files
+            with the same name don't collide
+        '''
+
+        add_kwargs = {}
+        add_kwargs[self.spec.foreign_key_name] = self.parent
+        instance = self.spec.related_model(**add_kwargs)
+
+        key = self.spec.related_model_field.generate_filename(instance, name)
+        directory, name = os.path.split(key)
+        root, ext = os.path.splitext(name)
+        return os.path.join(
+            directory, self.storage.get_alternative_name(root, ext)) \
+            .replace('\\', '/')
+
+    def validate_name(self, name):
+        ''' Run the related model field's validators (e.g.
+            `FileExtensionValidator`) against the name of a file before issuing
+            a target for it, since its content is never seen by Django
+        '''
+
+        file = File(None, name=name)
+        if self.spec.is_image:
+            validate_image_file_extension(file)
+        self.spec.related_model_field.run_validators(file)
+
+    def create_target(self, name, content_type, size):
+        ''' Return a dict describing where and how to upload a file, with
+            keys `url`, `method`, `fields` (form fields to send before the
+            file) and `token` (to be passed to the finalize endpoint once the
+            upload is complete)
+        '''
+
+        raise NotImplementedError(
+            'subclasses of BaseDirectUploadBackend must provide a '
+            'create_target() method')
+
+    def exists(self, key):
+        return self.storage.exists(key)
+
+
+class LocalDirectUploadBackend(BaseDirectUploadBackend):
+    ''' Issue targets for a signed endpoint served by the drag-and-drop view
+        itself, which saves the file to the field's storage. Files still pass
+        through Django in this case, so this is mainly a stand-in for
+        `FileSystemStorage` and development environments. The endpoint
+        responds with the token to be passed on to the finalize endpoint.
+    '''
+
+    def create_target(self, name, content_type, size):
+        return {
+            'url': self.upload_url,
+            'method': 'post',
+            'fields': {
+                'token': sign_upload(
+                    self.parent, self.get_key(name), purpose='upload'),
+            },
+            'token': None,
+        }
+
+
+class S3DirectUploadBackend(BaseDirectUploadBackend):
+    ''' Issue presigned POST targets for an S3-compatible storage from
+        `django-storages` (e.g. `storages.backends.s3.S3Storage`). Any
+        endpoint configured for the storage (`AWS_S3_ENDPOINT_URL`) is
+        honoured, so S3-compatible services such as MinIO work too. The bucket
+        must allow cross-origin `POST` requests from the admin.
+    '''
+
+    def get_object_key(self, key):
+        ''' Return the key in the bucket of the file stored under `key`,
+            below the storage's `location` prefix (`AWS_LOCATION`)
+        '''
+
+        key = self.storage.generate_filename(key)
+        location = self.storage.location.strip('/')
+        return posixpath.join(location, key) if location else key
+
+    def create_target(self, name, content_type, size):
+        key = self.get_key(name)
+        fields = {}
+        conditions = []
+        if content_type:
+            fields['Content-Type'] = content_type
+            conditions.append({'Content-Type': content_type})
+        if size is not None:
+            conditions.append(['content-length-range', size, size])
+
+        post = self.storage.bucket.meta.client.generate_presigned_post(
+            Bucket=self.storage.bucket_name,
+            Key=self.get_object_key(key),
+            Fields=fields,
+            Conditions=conditions,
+            ExpiresIn=get_direct_upload_expiry())
+
+        return {
+            'url': post['url'],
+            'method': 'post',
+            'fields': post['fields'],
+            'token': sign_upload(self.parent, key),
+        }
@@ -0,0 +1,99 @@
+import hashlib
+import re
+
+from django.conf import settings
+from django.http import HttpResponse
+
+from .processing import get_cache
+from .throttling import get_throttle_timeout
+
+
+''' Pattern that each client-supplied upload key must match; a request
+    carrying several files sends their keys separated by commas
+'''
+UPLOAD_KEY_RE = re.compile(r'^[0-9A-Za-z-]{1,64}$')
+
+''' Seconds clients are asked to wait before retrying an upload whose key
+    is already being handled by another request
+'''
+UPLOAD_IN_PROGRESS_RETRY_AFTER = 1
+
+
+def get_upload_key_timeout():
+    ''' Return how long in seconds the outcome of an upload is kept for
+        repeats of its key, from the `DRAGNDROP_RELATED_UPLOAD_KEY_TIMEOUT`
+        setting (defaults to one hour)
+    '''
+
+    return getattr(settings, 'DRAGNDROP_RELATED_UPLOAD_KEY_TIMEOUT', 3600)
+
+
+def parse_upload_keys(value):
+    ''' Return the list of upload keys in the header `value`, raising
+        `ValueError` if any are invalid
+    '''
+
+    keys = [key.strip() for key in value.split(',')]
+    if not all(UPLOAD_KEY_RE.match(key) for key in keys):
+        raise ValueError('Invalid upload key')
+    return keys
+
+
+class UploadKey(object):
+    ''' An idempotency record for an upload by `user` to the parent `model`
+        instance with primary key `pk`, identified by the client-supplied
+        `keys` (one per file sent). The first request to `claim` the record
+        handles the upload and then `complete`s it with its response, which
+        is replayed to any repeats until it expires. Claims are made with the
+        cache's atomic `add`, so given a cache shared between processes (see
+        `get_cache`) only one of several concurrent attempts goes ahead.
+
+        A claimed record which is never completed or released (e.g. if the
+        process dies) expires after `DRAGNDROP_RELATED_THROTTLE_TIMEOUT`
+        seconds, as for counts of uploads in progress.
+    '''
+
+    def __init__(self, user, model, pk, keys):
+        digest = hashlib.sha256(','.join(keys).encode()).hexdigest()
+        self.cache = get_cache()
+        self.cache_key = 'dragndrop_related:upload:{0}:{1}:{2}:{3}'.format(
+            user.pk, model._meta.label_lower, pk, digest)
+
+    def claim(self):
+        ''' Return whether this request is the first with the key, and so
+            should handle the upload
+        '''
+
+        return self.cache.add(self.cache_key, None, get_throttle_timeout())
+
+    def complete(self, response):
+        ''' Record the `response` to the upload, to be replayed for repeats
+            of the key
+        '''
+
+        self.cache.set(self.cache_key, {
+            'status': response.status_code,
+            'content_type': response['Content-Type'],
+            'content': response.content,
+        }, get_upload_key_timeout())
+
+    def release(self):
+        ''' Forget the claim on the key, so the upload may be retried, e.g.
+            after it failed or was refused by the throttle
+        '''
+
+        self.cache.delete(self.cache_key)
+
+    def replay(self):
+        ''' Return the response recorded for the key, or `None` if the
+            upload is still in progress
+        '''
+
+        record = self.cache.get(self.cache_key)
+        if record is None:
+            return None
+        response = HttpResponse(
+            record['content'], content_type=record['content_type'],
+            status=record['status'])
+        response['Idempotent-Replayed'] = 'true'
+        return response
@@ -0,0 +1,158 @@
+import logging
+import socket
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+
+class UploadMetrics(object):
+    ''' Timings and sizes recorded while the drag-and-drop view handles a
+        single request. Time is accumulated per named phase (e.g. `validate`
+        or `store`), in the order phases were first entered, so a phase which
+        runs once per file reports its total.
+    '''
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases = {}
+        self.total = None
+        self.files = 0
+        self.bytes = 0
+
+    @contextmanager
+    def phase(self, name):
+        ''' Time the enclosed block as (part of) the phase `name` '''
+
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = self.phases.get(name, 0) + \
+                time.perf_counter() - started
+
+    def add_files(self, files):
+        ''' Count the uploaded `files` received and their total size '''
+
+        for file in files:
+            self.files += 1
+            self.bytes += file.size or 0
+
+    def finish(self):
+        self.total = time.perf_counter() - self.started
+
+    def as_dict(self):
+        ''' Return the metrics as a dict, with times in milliseconds '''
+
+        return {
+            'phases': {name: duration * 1000
+                       for name, duration in self.phases.items()},
+            'total': self.total * 1000 if self.total is not None else None,
+            'files': self.files,
+            'bytes': self.bytes,
+        }
+
+    def server_timing(self):
+        ''' Return the value of a `Server-Timing` header for the metrics '''
+
+        metrics = [f'{name};dur={duration * 1000:.1f}'
+                   for name, duration in self.phases.items()]
+        if self.total is not None:
+            metrics.append(f'total;dur={self.total * 1000:.1f}')
+        return ', '.join(metrics)
+
+
+class BaseMetricsSink(object):
+    ''' Base class for metrics sinks, which receive the `UploadMetrics` of
+        each request handled by the drag-and-drop view. To send them
+        elsewhere, subclass this and implement `record`.
+    '''
+
+    def __init__(self, **options):
+        self.options = options
+
+    def record(self, metrics, model, status):
+        ''' Record the completed `metrics` of a request to the drag-and-drop
+            view for the parent `model`, which responded with `status`
+        '''
+
+        raise NotImplementedError(
+            'subclasses of BaseMetricsSink must provide a record() method')
+
+
+class StatsdLineMetricsSink(BaseMetricsSink):
+    ''' Base class for sinks which format metrics as statsd lines, named
+        after the `prefix` option (defaults to `dragndrop_related.upload`)
+        and the parent model's label, e.g. `<prefix>.gallery.album.validate`.
+        Reports a timer per phase plus `total`, and counters of `files`,
+        `bytes` and responses by `status`.
+    '''
+
+    def get_lines(self, metrics, model, status):
+        prefix = '{0}.{1}'.format(
+            self.options.get('prefix', 'dragndrop_related.upload'),
+            model._meta.label_lower)
+        lines = [f'{prefix}.{name}:{duration:.3f}|ms'
+                 for name, duration in metrics.as_dict()['phases'].items()]
+        lines += [
+            f'{prefix}.total:{metrics.total * 1000:.3f}|ms',
+            f'{prefix}.files:{metrics.files}|c',
+            f'{prefix}.bytes:{metrics.bytes}|c',
+            f'{prefix}.status.{status}:1|c',
+        ]
+        return lines
+
+
+class LoggingMetricsSink(StatsdLineMetricsSink):
+    ''' Log each metric as a statsd line at `INFO` level, to the logger named
+        by the `logger` option (defaults to `dragndrop_related.metrics`)
+    '''
+
+    def __init__(self, **options):
+        super().__init__(**options)
+        self.logger = logging.getLogger(
+            options.get('logger', 'dragndrop_related.metrics'))
+
+    def record(self, metrics, model, status):
+        for line in self.get_lines(metrics, model, status):
+            self.logger.info(line)
+
+
+class StatsdMetricsSink(StatsdLineMetricsSink):
+    ''' Send metrics to a statsd server over UDP, at the `host` and `port`
+        options (default to `localhost` and 8125). Errors sending are
+        ignored, as for statsd clients generally.
+    '''
+
+    def __init__(self, **options):
+        super().__init__(**options)
+        self.address = (options.get('host', 'localhost'),
+                        options.get('port', 8125))
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+    def record(self, metrics, model, status):
+        data = '\n'.join(self.get_lines(metrics, model, status)).encode()
+        try:
+            self.socket.sendto(data, self.address)
+        except OSError:
+            pass
+
+
+_sink = None
+
+
+def get_metrics_sink():
+    ''' Return the metrics sink instance, created on first use from the
+        `DRAGNDROP_RELATED_METRICS_SINK` (dotted path, defaults to `None` for
+        no sink) and `DRAGNDROP_RELATED_METRICS_OPTIONS` settings
+    '''
+
+    global _sink
+    sink_path = getattr(settings, 'DRAGNDROP_RELATED_METRICS_SINK', None)
+    if sink_path is None:
+        return None
+    if _sink is None:
+        _sink = import_string(sink_path)(**getattr(
+            settings, 'DRAGNDROP_RELATED_METRICS_OPTIONS', {}))
+    return _sink
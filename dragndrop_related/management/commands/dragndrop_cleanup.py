@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from dragndrop_related.staging import (cleanup_stale_uploads,
+                                       get_staging_max_age)
+
+
+class Command(BaseCommand):
+    ''' Remove partial uploads from the staging area which haven't been
+        touched for a while, e.g. chunked uploads which were abandoned part
+        way through, or files uploaded on `add` views which were never saved.
+        Intended to be run periodically, e.g. from `cron`.
+    '''
+
+    help = 'Remove stale partial uploads from the drag-and-drop staging area'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--max-age', type=int, default=None,
+            help='Age in seconds after which a staged upload is considered '
+                 'stale (defaults to the DRAGNDROP_RELATED_STAGING_MAX_AGE '
+                 f'setting, currently {get_staging_max_age()})')
+
+    def handle(self, *args, **options):
+        removed = cleanup_stale_uploads(max_age=options['max_age'])
+        self.stdout.write(f'Removed {removed} stale upload(s)')
@@ -0,0 +1,72 @@
+from django.contrib.admin.sites import all_sites
+from django.core.management.base import BaseCommand, CommandError
+
+from dragndrop_related.metadata import backfill_metadata
+from dragndrop_related.views import DragAndDropRelatedImageMixin
+
+
+class Command(BaseCommand):
+    ''' Record the metadata configured with `related_model_metadata_fields`
+        (dimensions, format, size and placeholder colour) for existing
+        related model instances, e.g. those created before it was configured
+        or attached from files already in storage. Files are read in parallel
+        batches; see `dragndrop_related.metadata.backfill_metadata`.
+    '''
+
+    help = 'Record metadata for existing drag-and-drop uploaded files'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--model', action='append', dest='models',
+            help='Related model to process, as app_label.ModelName; may be '
+                 'repeated (defaults to all with metadata fields)')
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Number of instances to read and save at a time (default: '
+                 '%(default)s)')
+        parser.add_argument(
+            '--refresh', action='store_true',
+            help='Process all instances, rather than only those missing '
+                 'some of their metadata')
+
+    def get_specs(self):
+        ''' Return the `RelatedModelSpec` of each related model with metadata
+            fields configured through `DragAndDropRelatedImageMixin` on any
+            admin site, once per related model field
+        '''
+
+        specs = {}
+        for admin_site in all_sites:
+            for model_admin in admin_site._registry.values():
+                if not isinstance(model_admin, DragAndDropRelatedImageMixin) \
+                        or not model_admin.related_model_metadata_fields:
+                    continue
+                spec = model_admin.get_related_model_spec()
+                specs.setdefault(
+                    (spec.related_model._meta.label_lower,
+                     spec.related_model_field_name), spec)
+        return specs
+
+    def handle(self, *args, **options):
+        specs = self.get_specs()
+        if options['models']:
+            labels = {label.lower() for label in options['models']}
+            unknown = labels - {label for label, _ in specs}
+            if unknown:
+                raise CommandError('No metadata fields are configured for '
+                                   '{0}'.format(', '.join(sorted(unknown))))
+            specs = {key: spec for key, spec in specs.items()
+                     if key[0] in labels}
+
+        for (label, field_name), spec in specs.items():
+            updated = 0
+            for count, errors in backfill_metadata(
+                    spec, options['batch_size'], options['refresh']):
+                updated += count
+                for name, error in errors:
+                    self.stderr.write(f'Could not read {name}: {error}')
+                if options['verbosity'] > 1:
+                    self.stdout.write(f'{label}.{field_name}: {updated}')
+            self.stdout.write(
+                f'Updated metadata of {updated} {label}.{field_name} '
+                f'file(s)')
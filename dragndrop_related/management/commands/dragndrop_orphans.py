@@ -0,0 +1,77 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from dragndrop_related.orphans import (DEFAULT_MIN_AGE, ReferenceSet,
+                                       get_storage_scans)
+
+
+class Command(BaseCommand):
+    ''' Find files in the storage of fields configured through
+        `DragAndDropRelatedImageMixin` which no longer belong to any model
+        instance, e.g. those of deleted children or of uploads which failed
+        part way through, and list or delete them. Only the directories those
+        fields upload into are scanned, and a file is kept if any `FileField`
+        of any model using the same storage refers to it. Intended to be run
+        periodically, e.g. from `cron`.
+    '''
+
+    help = 'List or delete stored files not referenced by any FileField'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--delete', action='store_true',
+            help='Delete the orphaned files; without this they are only '
+                 'listed')
+        parser.add_argument(
+            '--min-age', type=int, default=DEFAULT_MIN_AGE,
+            help='Age in seconds below which unreferenced files are left '
+                 'alone, as they may belong to uploads in progress '
+                 '(default: %(default)s)')
+        parser.add_argument(
+            '--directory', action='append', dest='directories',
+            help='Directory of storage to scan; may be repeated (defaults to '
+                 'those the configured fields upload into, and required if '
+                 'any of their upload_to are callable)')
+        parser.add_argument(
+            '--workers', type=int, default=8,
+            help='Number of files to delete at once (default: %(default)s)')
+
+    def handle(self, *args, **options):
+        scans = get_storage_scans()
+        unscoped_fields = [field for scan in scans
+                           for field in scan.unscoped_fields]
+        if unscoped_fields and not options['directories']:
+            raise CommandError(
+                'The directory {0} upload into can\'t be told, as their '
+                'upload_to is callable; pass --directory to choose which '
+                'directories to scan'.format(
+                    ', '.join(str(field) for field in unscoped_fields)))
+
+        found = deleted = failed = 0
+        for scan in scans:
+            with ReferenceSet() as references:
+                scan.collect_references(references)
+                for orphans in scan.iter_orphans(
+                        references, options['directories'],
+                        options['min_age']):
+                    found += len(orphans)
+                    if not options['delete']:
+                        for name in orphans:
+                            self.stdout.write(name)
+                        continue
+
+                    failures = scan.delete(orphans, options['workers'])
+                    for name, e in failures:
+                        self.stderr.write(f'Could not delete {name}: {e}')
+                    failed += len(failures)
+                    deleted += len(orphans) - len(failures)
+                    if options['verbosity'] > 1:
+                        for name in sorted(
+                                set(orphans) - {name for name, _ in failures}):
+                            self.stdout.write(f'Deleted {name}')
+
+        if options['delete']:
+            self.stdout.write(
+                f'Deleted {deleted} orphaned file(s)' +
+                (f', {failed} could not be deleted' if failed else ''))
+        else:
+            self.stdout.write(f'Found {found} orphaned file(s)')
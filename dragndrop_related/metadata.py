@@ -0,0 +1,166 @@
+import os
+from io import BytesIO
+
+from django.db.models import Q
+
+from .renditions import get_local_path, submit
+
+
+''' Metadata which can be recorded about each uploaded file, in the fields of
+    the related model named by the `related_model_metadata_fields` option of
+    the mixin. All but `size` only apply to images.
+'''
+METADATA_KEYS = ('width', 'height', 'format', 'size', 'placeholder')
+IMAGE_METADATA_KEYS = ('width', 'height', 'format', 'placeholder')
+
+''' Size the image is reduced to before its placeholder colour is taken '''
+PLACEHOLDER_SAMPLE_SIZE = (64, 64)
+
+# EXIF orientations in which the image is displayed rotated by 90 degrees
+_TRANSPOSED_ORIENTATIONS = (5, 6, 7, 8)
+
+
+def read_metadata(source, is_image, placeholder=False):
+    ''' Return a dict of metadata about the file `source` (a local path, a
+        file object or the file's bytes): its `size` in bytes and, if
+        `is_image` is set, the image's `width` and `height` as displayed
+        (i.e. taking its EXIF orientation into account) and Pillow `format`.
+        These are read from the image's header, without decoding it. If
+        `placeholder` is set, the image's average colour is also given as a
+        `placeholder` hex string such as `#a0b1c2`, for display while the
+        image loads; JPEGs are decoded at a reduced size for it (using
+        Pillow's `draft` mode). Images which can't be read only have their
+        `size` given.
+
+        This is a plain function with no Django dependencies so that it can
+        run in a worker process.
+    '''
+
+    if isinstance(source, bytes):
+        metadata = {'size': len(source)}
+        source = BytesIO(source)
+    elif isinstance(source, str):
+        metadata = {'size': os.path.getsize(source)}
+    else:
+        metadata = {'size': source.size}
+    if not is_image:
+        return metadata
+
+    from PIL import Image
+
+    try:
+        with Image.open(source) as image:
+            width, height = image.size
+            if image.getexif().get(0x0112) in _TRANSPOSED_ORIENTATIONS:
+                width, height = height, width
+            metadata.update(width=width, height=height, format=image.format)
+            if placeholder:
+                image.draft('RGB', PLACEHOLDER_SAMPLE_SIZE)
+                image.thumbnail(PLACEHOLDER_SAMPLE_SIZE)
+                red, green, blue = image.convert('RGB') \
+                    .resize((1, 1), Image.BOX).getpixel((0, 0))
+                metadata['placeholder'] = \
+                    f'#{red:02x}{green:02x}{blue:02x}'
+    except Exception:
+        pass
+    return metadata
+
+
+def get_metadata_kwargs(spec, file):
+    ''' Return a dict of the values of the related model's metadata fields
+        (see `RelatedModelSpec.related_model_metadata_fields`) for the
+        uploaded `file`, read from the local copy of a file which has been
+        uploaded to a temporary file, or otherwise from the file itself.
+        Fields whose metadata can't be read are left out, so they keep their
+        defaults.
+    '''
+
+    metadata_fields = spec.related_model_metadata_fields
+    if hasattr(file, 'temporary_file_path'):
+        source = file.temporary_file_path()
+    else:
+        source = file
+    try:
+        metadata = read_metadata(
+            source, spec.is_image, 'placeholder' in metadata_fields)
+    finally:
+        if hasattr(file, 'seek') and callable(file.seek):
+            file.seek(0)
+    return {field_name: metadata[key]
+            for key, field_name in metadata_fields.items()
+            if key in metadata}
+
+
+def backfill_metadata(spec, batch_size=1000, refresh=False):
+    ''' Record the metadata of the related model's existing instances in its
+        metadata fields, a batch of `batch_size` at a time in primary key
+        order. Only instances with any of the fields empty are processed
+        unless `refresh` is set. The files of each batch are read in
+        parallel, on the process pool renditions are generated on (see
+        `get_executor`), from temporary local copies of any in storage
+        without local paths (see `get_local_path`), and the batch is saved
+        with a single `bulk_update`. Yields a tuple of the number of
+        instances updated and a list of `(name, exception)` tuples for any
+        files which couldn't be read, for each batch.
+    '''
+
+    related_model = spec.related_model
+    field_name = spec.related_model_field_name
+    metadata_fields = spec.related_model_metadata_fields
+
+    queryset = related_model._base_manager.exclude(**{field_name: ''}) \
+        .exclude(**{f'{field_name}__isnull': True})
+    if not refresh:
+        missing = Q()
+        for name in metadata_fields.values():
+            missing |= Q(**{f'{name}__isnull': True})
+            if related_model._meta.get_field(name).empty_strings_allowed:
+                missing |= Q(**{name: ''})
+        queryset = queryset.filter(missing)
+    queryset = queryset.order_by('pk').only('pk', field_name)
+
+    last_pk = None
+    while True:
+        batch_queryset = queryset
+        if last_pk is not None:
+            batch_queryset = batch_queryset.filter(pk__gt=last_pk)
+        instances = list(batch_queryset[:batch_size])
+        if not instances:
+            return
+        last_pk = instances[-1].pk
+
+        futures = []
+        errors = []
+        temporary_paths = []
+        try:
+            for instance in instances:
+                field_file = getattr(instance, field_name)
+                try:
+                    path, is_temporary = get_local_path(field_file)
+                except Exception as e:
+                    errors.append((field_file.name, e))
+                    continue
+                if is_temporary:
+                    temporary_paths.append(path)
+                futures.append((instance, submit(
+                    read_metadata, path, spec.is_image,
+                    'placeholder' in metadata_fields)))
+
+            updated = []
+            for instance, future in futures:
+                try:
+                    metadata = future.result()
+                except Exception as e:
+                    errors.append((getattr(instance, field_name).name, e))
+                    continue
+                for key, name in metadata_fields.items():
+                    if key in metadata:
+                        setattr(instance, name, metadata[key])
+                updated.append(instance)
+        finally:
+            for path in temporary_paths:
+                os.remove(path)
+        related_model._base_manager.bulk_update(
+            updated, list(metadata_fields.values()))
+
+        yield len(updated), errors
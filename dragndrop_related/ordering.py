@@ -0,0 +1,57 @@
+from django.db import connections
+from django.db.models import F
+
+
+class OrderAllocator(object):
+    ''' Base class for allocating values of the ordering field (i.e.
+        `related_model_order_field_name`) to new instances of the related
+        model. Subclasses implement `allocate`, which is always called inside
+        the transaction used to create the new instances.
+    '''
+
+    def __init__(self, field_name):
+        self.field_name = field_name
+
+    def allocate(self, parent, related_manager, count=1):
+        ''' Reserve `count` consecutive order values for new children of
+            `parent` and return the first of them
+        '''
+
+        raise NotImplementedError(
+            'subclasses of OrderAllocator must provide an allocate() method')
+
+
+class ParentLockOrderAllocator(OrderAllocator):
+    ''' Serialise allocation per parent by locking the parent's row for the
+        rest of the transaction, then continue from the highest existing
+        order value. Concurrent uploads to the same parent therefore receive
+        distinct values, while uploads to other parents aren't blocked.
+
+        The highest value is read with `ORDER BY ... DESC LIMIT 1` rather than
+        an aggregate, so with an index covering the foreign key and ordering
+        field (e.g. `models.Index(fields=['album', 'order'])`) the cost stays
+        roughly constant however many children the parent has.
+    '''
+
+    def lock_parent(self, parent):
+        ''' Take a row lock on `parent`, using `SELECT ... FOR UPDATE` where
+            the database supports it. Elsewhere (i.e. SQLite) a no-op
+            `UPDATE` of the row is used instead, which obtains the database's
+            write lock up front.
+        '''
+
+        queryset = type(parent)._default_manager.filter(pk=parent.pk)
+        if connections[queryset.db].features.has_select_for_update:
+            list(queryset.select_for_update().values_list('pk', flat=True))
+        else:
+            pk_name = parent._meta.pk.attname
+            queryset.update(**{pk_name: F(pk_name)})
+
+    def allocate(self, parent, related_manager, count=1):
+        self.lock_parent(parent)
+        current = related_manager \
+            .filter(**{f'{self.field_name}__isnull': False}) \
+            .order_by(f'-{self.field_name}') \
+            .values_list(self.field_name, flat=True) \
+            .first()
+        return (current or 0) + 1
@@ -0,0 +1,312 @@
+import hashlib
+import os
+import posixpath
+import sqlite3
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
+from django.apps import apps
+from django.contrib.admin.sites import all_sites
+from django.db import models
+
+from .renditions import get_rendition_name
+from .spec import RelatedModelSpecError
+
+
+''' Number of names read from the database or storage, and checked or
+    deleted, at a time
+'''
+BATCH_SIZE = 1000
+
+''' Age in seconds below which unreferenced files are left alone, as they may
+    belong to an upload in progress (files are stored before their instance
+    is inserted)
+'''
+DEFAULT_MIN_AGE = 86400
+
+# SQLite's default limit on the number of parameters in a statement is 999
+_QUERY_SIZE = 500
+
+
+def get_storage_key(storage):
+    ''' Return a value identifying the files `storage` holds, so that fields
+        using separate instances of the same storage are scanned together:
+        the root directory for local storage, otherwise its deconstructed
+        class and arguments
+    '''
+
+    try:
+        return os.path.realpath(storage.path(''))
+    except NotImplementedError:
+        return repr(storage.deconstruct())
+
+
+def get_upload_directory(field):
+    ''' Return the directory of storage the `FileField` `field` uploads
+        into, from the part of its `upload_to` before any `strftime`
+        placeholder, or `None` if `upload_to` is callable and so the
+        directory can't be told
+    '''
+
+    upload_to = field.upload_to
+    if callable(upload_to):
+        return None
+    static, placeholder, _ = upload_to.partition('%')
+    if placeholder:
+        return posixpath.dirname(static)
+    return upload_to.strip('/')
+
+
+def iter_stored_names(storage, directory=''):
+    ''' Yield the name of each file stored under `directory` in `storage`.
+        Local storage is walked with `os.scandir`, which reads directories a
+        few entries at a time, so listing a directory of millions of files
+        doesn't load all of their names at once; other storages are listed
+        with `listdir`. Symbolic links to directories aren't followed.
+    '''
+
+    try:
+        root = storage.path('')
+    except NotImplementedError:
+        root = None
+
+    pending = [directory]
+    while pending:
+        directory = pending.pop()
+        if root is not None:
+            try:
+                entries = os.scandir(os.path.join(root, directory))
+            except FileNotFoundError:
+                continue
+            with entries:
+                for entry in entries:
+                    name = posixpath.join(directory, entry.name)
+                    if entry.is_dir(follow_symlinks=False):
+                        pending.append(name)
+                    elif entry.is_file():
+                        yield name
+        else:
+            directories, files = storage.listdir(directory)
+            pending.extend(posixpath.join(directory, name)
+                           for name in directories)
+            for name in files:
+                yield posixpath.join(directory, name)
+
+
+class ReferenceSet(object):
+    ''' A set of stored file names held in a temporary SQLite database
+        rather than in memory, so that memory use stays bounded however many
+        files are referenced. Each name is kept as a 64-bit hash, the table's
+        integer primary key, taking around 10 bytes of disk per name (so
+        about 100MB for ten million). A hash collision could only make an
+        orphan appear referenced, so it's never deleted by mistake.
+    '''
+
+    def __init__(self):
+        self.directory = tempfile.TemporaryDirectory(
+            prefix='dragndrop_orphans')
+        self.connection = sqlite3.connect(
+            os.path.join(self.directory.name, 'references.sqlite3'))
+        self.connection.execute('PRAGMA journal_mode = OFF')
+        self.connection.execute('PRAGMA synchronous = OFF')
+        self.connection.execute(
+            'CREATE TABLE reference (hash INTEGER PRIMARY KEY)')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    @staticmethod
+    def hash(name):
+        return int.from_bytes(
+            hashlib.blake2b(name.encode(), digest_size=8).digest(), 'big',
+            signed=True)
+
+    def update(self, names):
+        ''' Add the iterable of `names` to the set '''
+
+        with self.connection:
+            self.connection.executemany(
+                'INSERT OR IGNORE INTO reference VALUES (?)',
+                ((self.hash(name),) for name in names))
+
+    def difference(self, names):
+        ''' Return those of the list of `names` which aren't in the set '''
+
+        hashes = {name: self.hash(name) for name in names}
+        found = set()
+        values = list(hashes.values())
+        for start in range(0, len(values), _QUERY_SIZE):
+            chunk = values[start:start + _QUERY_SIZE]
+            found.update(row[0] for row in self.connection.execute(
+                'SELECT hash FROM reference WHERE hash IN ({0})'.format(
+                    ', '.join('?' * len(chunk))), chunk))
+        return [name for name in names if hashes[name] not in found]
+
+    def close(self):
+        self.connection.close()
+        self.directory.cleanup()
+
+
+class StorageScan(object):
+    ''' The reconciliation of one storage: the `directories` of it which
+        fields configured through `DragAndDropRelatedImageMixin` upload into
+        are listed, and a file is an orphan if it isn't referenced by any
+        `FileField` of any model using the same storage (or, for fields with
+        `image_renditions`, is a rendition of a referenced file).
+    '''
+
+    def __init__(self, storage):
+        self.storage = storage
+        self.directories = set()
+        self.unscoped_fields = []
+        self.fields = []
+        self.renditions = {}
+
+    def add_upload_field(self, field, presets):
+        ''' Add the directory `field` uploads into to those scanned (or, if
+            it can't be told, `field` to `unscoped_fields`), and the
+            renditions described by `presets` to those expected of its files
+        '''
+
+        directory = get_upload_directory(field)
+        if directory is None:
+            self.unscoped_fields.append(field)
+        else:
+            self.directories.add(directory)
+        if presets:
+            self.renditions.setdefault(field, {}).update(presets)
+
+    def get_directories(self):
+        ''' Return the directories to scan, leaving out any within another '''
+
+        directories = []
+        for directory in sorted(self.directories):
+            if not any(parent == '' or directory == parent or
+                       directory.startswith(parent + '/')
+                       for parent in directories):
+                directories.append(directory)
+        return directories
+
+    def iter_referenced_names(self, field):
+        ''' Yield the name of each file referenced by `field`, and of its
+            expected renditions, fetching them in chunks of `BATCH_SIZE`.
+            The model's base manager is used, so that instances hidden by a
+            custom default manager are still counted.
+        '''
+
+        presets = self.renditions.get(field, {})
+        queryset = field.model._base_manager \
+            .exclude(**{field.name: ''}) \
+            .exclude(**{f'{field.name}__isnull': True}) \
+            .order_by() \
+            .values_list(field.name, flat=True)
+        for name in queryset.iterator(chunk_size=BATCH_SIZE):
+            yield name
+            for preset_name, preset in presets.items():
+                yield get_rendition_name(name, preset_name, preset)
+
+    def collect_references(self, references):
+        ''' Add the names of all referenced files to the `ReferenceSet`
+            `references`
+        '''
+
+        for field in self.fields:
+            names = self.iter_referenced_names(field)
+            batch = list(islice(names, BATCH_SIZE))
+            while batch:
+                references.update(batch)
+                batch = list(islice(names, BATCH_SIZE))
+
+    def is_stale(self, name, cutoff):
+        ''' Return whether the file `name` was last modified before `cutoff`.
+            Files whose age can't be told are assumed to be recent.
+        '''
+
+        try:
+            modified = self.storage.get_modified_time(name)
+        except (NotImplementedError, OSError):
+            return False
+        return modified.timestamp() < cutoff
+
+    def iter_orphans(self, references, directories=None,
+                     min_age=DEFAULT_MIN_AGE):
+        ''' Yield lists of up to `BATCH_SIZE` names of files in the scanned
+            `directories` (defaults to `get_directories()`) which aren't in
+            the `ReferenceSet` `references` and haven't been modified for
+            `min_age` seconds. The `directories` must be given if any fields
+            are in `unscoped_fields`, as the files they upload could be
+            anywhere in storage.
+        '''
+
+        if not directories and self.unscoped_fields:
+            raise ValueError(
+                'The directories to scan must be given for storage used by '
+                'fields with a callable upload_to')
+        cutoff = time.time() - min_age
+        for directory in directories or self.get_directories():
+            names = iter_stored_names(self.storage, directory)
+            batch = list(islice(names, BATCH_SIZE))
+            while batch:
+                orphans = [name for name in references.difference(batch)
+                           if self.is_stale(name, cutoff)]
+                if orphans:
+                    yield orphans
+                batch = list(islice(names, BATCH_SIZE))
+
+    def delete(self, names, workers=1):
+        ''' Delete the files `names` from storage, on up to `workers` threads
+            at once. Returns a list of `(name, exception)` tuples for those
+            which couldn't be deleted.
+        '''
+
+        def delete(name):
+            try:
+                self.storage.delete(name)
+            except Exception as e:
+                return name, e
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            return [failure for failure in executor.map(delete, names)
+                    if failure]
+
+
+def get_storage_scans():
+    ''' Return a `StorageScan` for each storage used by a field configured
+        through `DragAndDropRelatedImageMixin` on any admin site, each listing
+        every `FileField` of any installed model which uses the same storage
+    '''
+
+    from .views import DragAndDropRelatedImageMixin
+
+    scans = {}
+    for admin_site in all_sites:
+        for model_admin in admin_site._registry.values():
+            if not isinstance(model_admin, DragAndDropRelatedImageMixin):
+                continue
+            try:
+                spec = model_admin.get_related_model_spec()
+            except RelatedModelSpecError:
+                continue
+            field = spec.related_model_field
+            key = get_storage_key(field.storage)
+            if key not in scans:
+                scans[key] = StorageScan(field.storage)
+            scans[key].add_upload_field(
+                field,
+                model_admin.image_renditions if spec.is_image else None)
+
+    for model in apps.get_models():
+        if model._meta.proxy:
+            continue
+        for field in model._meta.local_concrete_fields:
+            if isinstance(field, models.FileField):
+                scan = scans.get(get_storage_key(field.storage))
+                if scan is not None:
+                    scan.fields.append(field)
+
+    return list(scans.values())
@@ -0,0 +1,248 @@
+import os
+import shutil
+import threading
+import uuid
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from multiprocessing import get_context
+
+from django.apps import apps
+from django.conf import settings
+from django.contrib.admin.sites import all_sites
+from django.core.cache import caches
+from django.core.files.move import file_move_safe
+from django.db import close_old_connections
+from django.utils.module_loading import import_string
+
+from .staging import StagedFile, get_staging_root
+
+
+''' Job states reported by the status endpoint '''
+JOB_QUEUED = 'queued'
+JOB_PROCESSING = 'processing'
+JOB_DONE = 'done'
+JOB_FAILED = 'failed'
+
+
+def get_cache():
+    ''' Return the cache used to record job state, from the
+        `DRAGNDROP_RELATED_CACHE` setting (defaults to `default`). When jobs
+        are processed outside the web process this must be a shared cache,
+        e.g. Redis or Memcached.
+    '''
+
+    return caches[getattr(settings, 'DRAGNDROP_RELATED_CACHE', 'default')]
+
+
+def get_job_timeout():
+    ''' Return how long in seconds job state is kept, from the
+        `DRAGNDROP_RELATED_JOB_TIMEOUT` setting (defaults to one day)
+    '''
+
+    return getattr(settings, 'DRAGNDROP_RELATED_JOB_TIMEOUT', 86400)
+
+
+def get_job_key(job_id):
+    return f'dragndrop_related:job:{job_id}'
+
+
+def get_job(job_id):
+    return get_cache().get(get_job_key(job_id))
+
+
+def set_job(job_id, **state):
+    get_cache().set(get_job_key(job_id), state, get_job_timeout())
+
+
+def get_job_directory(job_id):
+    return os.path.join(get_staging_root(), 'jobs', job_id)
+
+
+def enqueue_upload(model_admin, parent, files, hashes=None):
+    ''' Move the supplied (already validated) uploaded `files` into the
+        staging area and submit a job to create related model instances for
+        them on `parent` via the configured processing backend. Items in
+        `files` may also be the names of files already in storage (or
+        `StoredUploadedFile`s), which are passed through as they are, and
+        `hashes` their content hashes.
+        Returns the job ID.
+
+        The job payload only contains JSON-serialisable values, so that
+        backends can hand it to an external queue.
+    '''
+
+    job_id = uuid.uuid4().hex
+    directory = get_job_directory(job_id)
+    os.makedirs(directory)
+
+    staged = []
+    for index, file in enumerate(files):
+        content_hash = hashes[index] if hashes else None
+        if isinstance(file, str) or hasattr(file, 'stored_name'):
+            staged.append({'stored': getattr(file, 'stored_name', file),
+                           'hash': content_hash})
+            continue
+
+        path = os.path.join(directory, str(index))
+        if hasattr(file, 'temporary_file_path'):
+            file_move_safe(file.temporary_file_path(), path,
+                           allow_overwrite=True)
+        else:
+            with open(path, 'wb') as destination:
+                for chunk in file.chunks():
+                    destination.write(chunk)
+        staged.append(
+            {'path': path, 'name': file.name, 'hash': content_hash})
+
+    payload = {
+        'job': job_id,
+        'admin_site': model_admin.admin_site.name,
+        'model': parent._meta.label_lower,
+        'pk': parent.pk,
+        'files': staged,
+    }
+
+    set_job(job_id, status=JOB_QUEUED, model=payload['model'],
+            pk=str(parent.pk))
+    get_processing_backend().submit(payload)
+    return job_id
+
+
+def process_upload(payload, close_connections=True):
+    ''' Create the related model instances described by a job `payload`
+        created by `enqueue_upload`. This is the unit of work run by
+        processing backends; it looks up the `ModelAdmin` the upload was made
+        through and uses its drag-and-drop view to create the instances, so
+        the configured ordering and field names apply as normal.
+
+        Stale database connections are closed before and after the job, as
+        they would be around a request, unless `close_connections` is unset
+        because the job is run within a request (which has its own
+        connection handling and may be inside a transaction).
+    '''
+
+    job_id = payload['job']
+    state = {'model': payload['model'], 'pk': str(payload['pk'])}
+    set_job(job_id, status=JOB_PROCESSING, **state)
+
+    if close_connections:
+        close_old_connections()
+    files = []
+    try:
+        model = apps.get_model(payload['model'])
+        admin_site = next(site for site in all_sites
+                          if site.name == payload['admin_site'])
+        model_admin = admin_site._registry[model]
+
+        view = model_admin.drag_and_drop_view_class(
+            model=model, model_admin=model_admin)
+        view.kwargs = model_admin.get_related_model_info()
+        view.object = model._default_manager.get(pk=payload['pk'])
+
+        files = [staged['stored'] if 'stored' in staged
+                 else StagedFile(staged['path'], staged['name'])
+                 for staged in payload['files']]
+        hashes = [staged['hash'] for staged in payload['files']]
+        instances = view.create_related(
+            files, hashes if any(hashes) else None)
+    except Exception as e:
+        set_job(job_id, status=JOB_FAILED, error=str(e), **state)
+        raise
+    else:
+        set_job(job_id, status=JOB_DONE,
+                pks=[str(instance.pk) for instance in instances], **state)
+    finally:
+        for file in files:
+            if not isinstance(file, str):
+                file.close()
+        shutil.rmtree(get_job_directory(job_id), ignore_errors=True)
+        if close_connections:
+            close_old_connections()
+
+
+class BaseProcessingBackend(object):
+    ''' Base class for processing backends, which run `process_upload` for
+        job payloads submitted by the drag-and-drop view. To use an external
+        queue (e.g. Celery), subclass this and implement `submit` to enqueue
+        a task which calls `process_upload(payload)`.
+    '''
+
+    def __init__(self, **options):
+        self.options = options
+
+    def submit(self, payload):
+        raise NotImplementedError(
+            'subclasses of BaseProcessingBackend must provide a submit() '
+            'method')
+
+
+class ImmediateProcessingBackend(BaseProcessingBackend):
+    ''' Process jobs synchronously within the request; mostly useful for
+        development and testing
+    '''
+
+    def submit(self, payload):
+        process_upload(payload, close_connections=False)
+
+
+class ThreadPoolProcessingBackend(BaseProcessingBackend):
+    ''' Process jobs on a pool of threads in the web process. Accepts a
+        `max_workers` option.
+    '''
+
+    def __init__(self, **options):
+        super().__init__(**options)
+        self.executor = ThreadPoolExecutor(
+            max_workers=options.get('max_workers'),
+            thread_name_prefix='dragndrop_related')
+
+    def submit(self, payload):
+        self.executor.submit(process_upload, payload)
+
+
+def _initialise_worker():
+    import django
+    django.setup()
+
+
+class ProcessPoolProcessingBackend(BaseProcessingBackend):
+    ''' Process jobs on a pool of worker processes, started with `spawn` so
+        they don't inherit the web process's database connections. Accepts a
+        `max_workers` option. Requires a cache shared between processes (see
+        `get_cache`).
+    '''
+
+    def __init__(self, **options):
+        super().__init__(**options)
+        self.executor = ProcessPoolExecutor(
+            max_workers=options.get('max_workers'),
+            mp_context=get_context('spawn'),
+            initializer=_initialise_worker)
+
+    def submit(self, payload):
+        self.executor.submit(process_upload, payload)
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_processing_backend():
+    ''' Return the processing backend instance, created on first use from the
+        `DRAGNDROP_RELATED_PROCESSING_BACKEND` (dotted path, defaults to
+        `ThreadPoolProcessingBackend`) and
+        `DRAGNDROP_RELATED_PROCESSING_OPTIONS` settings
+    '''
+
+    global _backend
+    if _backend is None:
+        # Requests on several threads may get here at once; only one
+        # backend (and so one pool) may be created
+        with _backend_lock:
+            if _backend is None:
+                backend_class = import_string(getattr(
+                    settings, 'DRAGNDROP_RELATED_PROCESSING_BACKEND',
+                    'dragndrop_related.processing.'
+                    'ThreadPoolProcessingBackend'))
+                _backend = backend_class(**getattr(
+                    settings, 'DRAGNDROP_RELATED_PROCESSING_OPTIONS', {}))
+    return _backend
@@ -0,0 +1,195 @@
+import logging
+import os
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from io import BytesIO
+from multiprocessing import get_context
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+
+logger = logging.getLogger(__name__)
+
+''' File extensions used for renditions, by Pillow format name '''
+FORMAT_EXTENSIONS = {
+    'JPEG': 'jpg',
+    'PNG': 'png',
+    'WEBP': 'webp',
+    'GIF': 'gif',
+    'AVIF': 'avif',
+}
+
+
+def render(source, preset):
+    ''' Render a single rendition of the image `source` (a local path or the
+        image's bytes) according to `preset`, a dict which may contain:
+
+        * `size`: a `(width, height)` tuple the image is scaled down to fit
+        * `format`: the Pillow format to save as (defaults to `JPEG`)
+        * `quality`: the encoder quality (defaults to 85)
+
+        The image is rotated according to its EXIF orientation, and its
+        metadata isn't copied to the rendition. JPEGs are decoded at a reduced
+        size where possible (using Pillow's `draft` mode) to bound memory use,
+        and saved as progressive JPEGs. Returns the rendition's bytes.
+
+        This is a plain function with no Django dependencies so that it can
+        run in a worker process.
+    '''
+
+    from PIL import Image, ImageOps
+
+    if isinstance(source, bytes):
+        source = BytesIO(source)
+
+    with Image.open(source) as image:
+        size = preset.get('size')
+        if size:
+            # Request a square at least as large as the longest side, since
+            # the EXIF orientation isn't applied until after decoding
+            image.draft('RGB', (max(size), max(size)))
+        image = ImageOps.exif_transpose(image)
+        if size:
+            image.thumbnail(tuple(size))
+
+        image_format = preset.get('format', 'JPEG').upper()
+        save_kwargs = {'quality': preset.get('quality', 85)}
+        if image_format == 'JPEG':
+            if image.mode not in ('RGB', 'L'):
+                image = image.convert('RGB')
+            save_kwargs.update(progressive=True, optimize=True)
+
+        output = BytesIO()
+        image.save(output, image_format, **save_kwargs)
+        return output.getvalue()
+
+
+def get_rendition_name(name, preset_name, preset):
+    ''' Return the storage name of the rendition `preset_name` of the file
+        stored as `name`, alongside the original, e.g. `photo.thumb.webp`
+    '''
+
+    root, _ = os.path.splitext(name)
+    image_format = preset.get('format', 'JPEG').upper()
+    extension = FORMAT_EXTENSIONS.get(image_format, image_format.lower())
+    return f'{root}.{preset_name}.{extension}'
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor(broken=None):
+    ''' Return the process pool renditions are generated on, created on
+        first use with the number of workers given by the
+        `DRAGNDROP_RELATED_RENDITION_WORKERS` setting (defaults to the number
+        of CPUs). Passing the `broken` pool replaces it with a new one.
+    '''
+
+    global _executor
+    with _executor_lock:
+        # Several threads may find the same pool broken; only replace it once
+        if _executor is None or _executor is broken:
+            if _executor is not None:
+                _executor.shutdown(wait=False)
+            _executor = ProcessPoolExecutor(
+                max_workers=getattr(
+                    settings, 'DRAGNDROP_RELATED_RENDITION_WORKERS', None),
+                mp_context=get_context('spawn'))
+        return _executor
+
+
+def submit(fn, *args):
+    ''' Submit `fn` to be called with `args` on the process pool, returning
+        a `Future`. A pool is broken for good if a worker dies (e.g. killed
+        for running out of memory), so it's replaced and the call submitted
+        again.
+    '''
+
+    executor = get_executor()
+    try:
+        return executor.submit(fn, *args)
+    except BrokenProcessPool:
+        return get_executor(broken=executor).submit(fn, *args)
+
+
+def get_local_path(field_file):
+    ''' Return a tuple of a local path to the stored file `field_file`, for
+        the worker processes to read, and whether it's a temporary copy the
+        caller should remove. Files in storage without local paths (e.g. S3)
+        are copied to a temporary file a chunk at a time, so the original is
+        never held in memory in full.
+    '''
+
+    storage = field_file.storage
+    try:
+        return storage.path(field_file.name), False
+    except NotImplementedError:
+        pass
+
+    _, extension = os.path.splitext(field_file.name)
+    descriptor, path = tempfile.mkstemp(
+        prefix='dragndrop_rendition', suffix=extension)
+    try:
+        with os.fdopen(descriptor, 'wb') as destination, \
+                storage.open(field_file.name, 'rb') as file:
+            for chunk in file.chunks():
+                destination.write(chunk)
+    except BaseException:
+        os.remove(path)
+        raise
+    return path, True
+
+
+def generate_renditions(field_files, presets):
+    ''' Generate the renditions described by `presets` (a dict of preset
+        dicts, keyed by name) for each of the stored images in `field_files`,
+        rendering them in parallel on the process pool and saving them next
+        to the originals in the same storage. Existing renditions are
+        replaced.
+
+        Renditions are generated once their instances exist, so one which
+        can't be generated (e.g. as the image can't be decoded) is logged and
+        skipped rather than raising. Returns the names of any such
+        renditions.
+    '''
+
+    futures = []
+    failed = []
+    temporary_paths = []
+    try:
+        for field_file in field_files:
+            storage = field_file.storage
+            names = {
+                preset_name: get_rendition_name(
+                    field_file.name, preset_name, preset)
+                for preset_name, preset in presets.items()}
+            try:
+                source, is_temporary = get_local_path(field_file)
+            except Exception:
+                logger.exception(
+                    'Unable to read %s to generate renditions',
+                    field_file.name)
+                failed.extend(names.values())
+                continue
+            if is_temporary:
+                temporary_paths.append(source)
+            for preset_name, preset in presets.items():
+                futures.append((storage, names[preset_name],
+                                submit(render, source, preset)))
+
+        for storage, name, future in futures:
+            try:
+                content = future.result()
+                if storage.exists(name):
+                    storage.delete(name)
+                storage.save(name, ContentFile(content))
+            except Exception:
+                logger.exception('Unable to generate rendition %s', name)
+                failed.append(name)
+    finally:
+        for path in temporary_paths:
+            os.remove(path)
+    return failed
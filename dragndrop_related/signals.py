@@ -0,0 +1,16 @@
+from django.dispatch import Signal
+
+
+''' Sent when the drag-and-drop view starts handling a POST, before the
+    permission check, with `sender` (the parent model class), `request`, `pk`
+    (of the parent) and `metrics` (the request's `UploadMetrics`, which
+    receivers may keep a reference to)
+'''
+pre_upload = Signal()
+
+''' Sent when the drag-and-drop view has finished handling a POST, with
+    `sender` (the parent model class), `request`, `response`, `instances` (a
+    list of the related model instances created, if any) and `metrics` (the
+    request's completed `UploadMetrics`)
+'''
+post_upload = Signal()
@@ -0,0 +1,262 @@
+from django import forms
+from django.core.exceptions import (
+    FieldDoesNotExist, ImproperlyConfigured, ValidationError,
+)
+from django.db import models
+from django.db.models.fields.related_descriptors import \
+    ReverseManyToOneDescriptor
+from django.template.defaultfilters import filesizeformat
+
+from .metadata import METADATA_KEYS
+
+
+class RelatedModelSpecError(ImproperlyConfigured):
+    ''' Raised by `build_related_model_spec` for invalid configuration;
+        `check_id` is the ID of the corresponding system check error
+    '''
+
+    def __init__(self, message, check_id):
+        super().__init__(message)
+        self.check_id = check_id
+
+
+class RelatedModelSpec(object):
+    ''' An immutable description of the relationship between a parent model
+        and the related model its drag-and-drop uploads create, resolved once
+        per `ModelAdmin` by `build_related_model_spec` rather than on every
+        request. Also holds the (cached) form class used to validate uploads.
+    '''
+
+    __slots__ = (
+        'related_model',
+        'related_manager_field_name',
+        'foreign_key_name',
+        'related_model_field_name',
+        'related_model_field',
+        'related_model_order_field_name',
+        'related_model_hash_field_name',
+        'related_model_metadata_fields',
+        'max_upload_size',
+        'max_image_dimensions',
+        'is_image',
+        'form_class',
+    )
+
+    def __init__(self, **kwargs):
+        for name in self.__slots__:
+            object.__setattr__(self, name, kwargs[name])
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f'{type(self).__name__} is immutable')
+
+    def __delattr__(self, name):
+        raise AttributeError(f'{type(self).__name__} is immutable')
+
+    def __repr__(self):
+        return '<{0}: {1}.{2}>'.format(
+            type(self).__name__, self.related_model._meta.label,
+            self.related_model_field_name)
+
+
+def get_related_manager_descriptor(model, related_manager_field_name):
+    ''' Return the descriptor for the reverse relation named
+        `related_manager_field_name` on `model`, raising
+        `RelatedModelSpecError` if there isn't a suitable one
+    '''
+
+    descriptor = getattr(model, related_manager_field_name, None)
+    if not isinstance(descriptor, ReverseManyToOneDescriptor) or \
+            descriptor.field.many_to_many:
+        raise RelatedModelSpecError(
+            "'{0}' is not a reverse foreign key relation on {1}.".format(
+                related_manager_field_name, model._meta.label),
+            'dragndrop_related.E001')
+    return descriptor
+
+
+class UploadFileField(forms.FileField):
+    ''' A `FileField` which rejects files larger than `max_upload_size` bytes
+        before their content is looked at
+    '''
+
+    default_error_messages = {
+        'max_upload_size':
+            'Ensure this file is no larger than %(limit)s (it is %(size)s).',
+    }
+
+    def __init__(self, *, max_upload_size=None, **kwargs):
+        self.max_upload_size = max_upload_size
+        super().__init__(**kwargs)
+
+    def to_python(self, data):
+        if data and self.max_upload_size is not None and \
+                data.size is not None and data.size > self.max_upload_size:
+            raise ValidationError(
+                self.error_messages['max_upload_size'],
+                code='max_upload_size',
+                params={
+                    'limit': filesizeformat(self.max_upload_size),
+                    'size': filesizeformat(data.size),
+                })
+        return super().to_python(data)
+
+
+class UploadImageField(UploadFileField, forms.ImageField):
+    ''' An `ImageField` which additionally rejects images larger than
+        `max_image_dimensions` (a `(width, height)` tuple), reading only the
+        image's header to find its dimensions rather than decoding it
+    '''
+
+    default_error_messages = {
+        'max_image_dimensions':
+            'Ensure this image is no larger than %(limit)s pixels (it is '
+            '%(dimensions)s pixels).',
+    }
+
+    def __init__(self, *, max_image_dimensions=None, **kwargs):
+        self.max_image_dimensions = max_image_dimensions
+        super().__init__(**kwargs)
+
+    def get_image_dimensions(self, data):
+        ''' Return the `(width, height)` of the uploaded image `data` from its
+            header, or `None` if it can't be read as an image
+        '''
+
+        from PIL import Image
+
+        if hasattr(data, 'temporary_file_path'):
+            file = data.temporary_file_path()
+        else:
+            file = data
+        try:
+            with Image.open(file) as image:
+                return image.size
+        except Exception:
+            # Leave it to `ImageField` to report the image as invalid
+            return None
+        finally:
+            if hasattr(data, 'seek') and callable(data.seek):
+                data.seek(0)
+
+    def to_python(self, data):
+        if data and self.max_image_dimensions:
+            dimensions = self.get_image_dimensions(data)
+            max_width, max_height = self.max_image_dimensions
+            if dimensions and \
+                    (dimensions[0] > max_width or dimensions[1] > max_height):
+                raise ValidationError(
+                    self.error_messages['max_image_dimensions'],
+                    code='max_image_dimensions',
+                    params={
+                        'limit': '{0}x{1}'.format(max_width, max_height),
+                        'dimensions': '{0}x{1}'.format(*dimensions),
+                    })
+        return super().to_python(data)
+
+
+def build_form_class(related_model_field_name, is_image,
+                     max_upload_size=None, max_image_dimensions=None):
+    ''' Construct a form class with a field named using the
+        `related_model_field_name`, and with a type appropriate to the
+        underlying field on the related model, enforcing the given upload
+        limits
+
+        source: https://stackoverflow.com/a/27505090/258794
+    '''
+
+    form_fields = {}
+    if is_image:
+        form_fields[related_model_field_name] = UploadImageField(
+            max_upload_size=max_upload_size,
+            max_image_dimensions=max_image_dimensions)
+    else:
+        form_fields[related_model_field_name] = UploadFileField(
+            max_upload_size=max_upload_size)
+
+    return type('DragAndDropForm', (forms.Form,), form_fields)
+
+
+def build_related_model_spec(model, related_manager_field_name,
+                             related_model_field_name,
+                             related_model_order_field_name=None,
+                             related_model_hash_field_name=None,
+                             max_upload_size=None,
+                             max_image_dimensions=None,
+                             related_model_metadata_fields=None):
+    ''' Resolve and validate the configured field names against `model` and
+        return a `RelatedModelSpec`, raising `RelatedModelSpecError` if any of
+        them are invalid
+    '''
+
+    descriptor = get_related_manager_descriptor(
+        model, related_manager_field_name)
+    related_model = descriptor.field.model
+
+    try:
+        related_model_field = \
+            related_model._meta.get_field(related_model_field_name)
+    except FieldDoesNotExist:
+        raise RelatedModelSpecError(
+            "{0} has no field named '{1}'.".format(
+                related_model._meta.label, related_model_field_name),
+            'dragndrop_related.E002')
+    if not isinstance(related_model_field, models.FileField):
+        raise RelatedModelSpecError(
+            "'{0}.{1}' is not a FileField or ImageField.".format(
+                related_model._meta.label, related_model_field_name),
+            'dragndrop_related.E003')
+
+    if related_model_order_field_name:
+        try:
+            related_model._meta.get_field(related_model_order_field_name)
+        except FieldDoesNotExist:
+            raise RelatedModelSpecError(
+                "{0} has no field named '{1}'.".format(
+                    related_model._meta.label,
+                    related_model_order_field_name),
+                'dragndrop_related.E004')
+
+    if related_model_hash_field_name:
+        try:
+            related_model._meta.get_field(related_model_hash_field_name)
+        except FieldDoesNotExist:
+            raise RelatedModelSpecError(
+                "{0} has no field named '{1}'.".format(
+                    related_model._meta.label,
+                    related_model_hash_field_name),
+                'dragndrop_related.E008')
+
+    for key, field_name in (related_model_metadata_fields or {}).items():
+        if key not in METADATA_KEYS:
+            raise RelatedModelSpecError(
+                "'{0}' is not one of the metadata keys {1}.".format(
+                    key, ', '.join(METADATA_KEYS)),
+                'dragndrop_related.E018')
+        try:
+            related_model._meta.get_field(field_name)
+        except FieldDoesNotExist:
+            raise RelatedModelSpecError(
+                "{0} has no field named '{1}'.".format(
+                    related_model._meta.label, field_name),
+                'dragndrop_related.E019')
+
+    is_image = isinstance(related_model_field, models.ImageField)
+
+    return RelatedModelSpec(
+        related_model=related_model,
+        related_manager_field_name=related_manager_field_name,
+        foreign_key_name=descriptor.field.name,
+        related_model_field_name=related_model_field_name,
+        related_model_field=related_model_field,
+        related_model_order_field_name=related_model_order_field_name,
+        related_model_hash_field_name=related_model_hash_field_name,
+        related_model_metadata_fields=dict(
+            related_model_metadata_fields or {}),
+        max_upload_size=max_upload_size,
+        max_image_dimensions=max_image_dimensions,
+        is_image=is_image,
+        form_class=build_form_class(
+            related_model_field_name, is_image,
+            max_upload_size=max_upload_size,
+            max_image_dimensions=max_image_dimensions),
+    )
@@ -0,0 +1,285 @@
+import json
+import os
+import re
+import shutil
+import tempfile
+import time
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.move import file_move_safe
+
+
+''' Pattern that upload identifiers supplied by the client (e.g. Dropzone's
+    `dzuuid`) must match before they're used to build a path
+'''
+UPLOAD_ID_RE = re.compile(r'^[0-9A-Za-z-]{1,64}$')
+
+''' Name of the form field carrying the token which identifies the files
+    uploaded on an `add` view (see `StagedUploads`)
+'''
+FORM_TOKEN_FIELD = '_drag_and_drop_token'
+
+
+def get_staging_root():
+    ''' Return the local directory under which partial uploads are staged.
+        Defaults to a `dragndrop_related` directory in the system temporary
+        directory, and can be overridden with the
+        `DRAGNDROP_RELATED_STAGING_DIR` setting.
+    '''
+
+    return getattr(settings, 'DRAGNDROP_RELATED_STAGING_DIR',
+                   os.path.join(tempfile.gettempdir(), 'dragndrop_related'))
+
+
+def get_staging_max_age():
+    ''' Return the age in seconds after which untouched staged uploads are
+        considered abandoned, from the `DRAGNDROP_RELATED_STAGING_MAX_AGE`
+        setting (defaults to one day)
+    '''
+
+    return getattr(settings, 'DRAGNDROP_RELATED_STAGING_MAX_AGE', 86400)
+
+
+def get_claim_timeout():
+    ''' Return the age in seconds after which a chunked upload's claim to be
+        finalized is considered abandoned (e.g. by a process which died part
+        way through), from the `DRAGNDROP_RELATED_STAGING_CLAIM_TIMEOUT`
+        setting (defaults to one hour)
+    '''
+
+    return getattr(
+        settings, 'DRAGNDROP_RELATED_STAGING_CLAIM_TIMEOUT', 3600)
+
+
+class StagedFile(File):
+    ''' A `File` backed by a file in the staging area. Exposes
+        `temporary_file_path` in the same way as Django's
+        `TemporaryUploadedFile`, so that form fields can validate it from disk
+        and `FileSystemStorage` can move it into place rather than copying it.
+    '''
+
+    def __init__(self, path, name):
+        super().__init__(open(path, 'rb'), name=name)
+        self.path = path
+
+    def temporary_file_path(self):
+        return self.path
+
+
+class ChunkedUpload(object):
+    ''' A partial upload being received in chunks, identified by the
+        client's `upload_id` within `scope` (e.g. the user and parent). The
+        file's data is written to a single file at the byte offset given for
+        each chunk, so chunks may arrive in any order and re-sent chunks simply
+        overwrite themselves; an empty marker file is written for each chunk
+        received.
+    '''
+
+    def __init__(self, scope, upload_id):
+        if not UPLOAD_ID_RE.match(upload_id):
+            raise ValueError(f'Invalid upload identifier {upload_id!r}')
+        self.directory = os.path.join(
+            get_staging_root(), 'chunks', str(scope), upload_id)
+        self.data_path = os.path.join(self.directory, 'data')
+        self.received_directory = os.path.join(self.directory, 'received')
+
+    def write_chunk(self, index, offset, chunk):
+        ''' Write the contents of `chunk` (an `UploadedFile`) at `offset` and
+            record chunk `index` as received
+        '''
+
+        os.makedirs(self.received_directory, exist_ok=True)
+        with open(self.data_path, 'ab'):
+            pass
+        with open(self.data_path, 'r+b') as destination:
+            destination.seek(offset)
+            for data in chunk.chunks():
+                destination.write(data)
+        open(os.path.join(self.received_directory, str(index)), 'w').close()
+
+    def received_chunks(self):
+        ''' Return a sorted list of the indexes of the chunks received so
+            far
+        '''
+
+        try:
+            names = os.listdir(self.received_directory)
+        except FileNotFoundError:
+            return []
+        return sorted(int(name) for name in names if name.isdigit())
+
+    def is_complete(self, total_chunk_count):
+        return len(self.received_chunks()) >= total_chunk_count
+
+    def size(self):
+        try:
+            return os.path.getsize(self.data_path)
+        except FileNotFoundError:
+            return 0
+
+    def claim(self, timeout=None):
+        ''' Mark the upload as being finalized. Returns `False` if another
+            request has already claimed it within the last `timeout` seconds
+            (defaults to `get_claim_timeout()`); older claims are taken over.
+            The claim is released when the upload is deleted.
+        '''
+
+        if timeout is None:
+            timeout = get_claim_timeout()
+        path = os.path.join(self.directory, 'finalizing')
+        try:
+            os.mkdir(path)
+        except FileExistsError:
+            try:
+                if os.path.getmtime(path) >= time.time() - timeout:
+                    return False
+                os.rmdir(path)
+                os.mkdir(path)
+            except (FileNotFoundError, FileExistsError):
+                # Another request took over or finished it first
+                return False
+        return True
+
+    def open(self, name):
+        return StagedFile(self.data_path, name)
+
+    def delete(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+
+class StagedUploads(object):
+    ''' Files uploaded on the `add` view, before the parent they're to be
+        attached to exists, held in the staging area under the `token` of the
+        form until it's saved. Each file is staged under the upload `key` the
+        client identified it with, so a retried upload is only staged once;
+        files are listed in the order they were first received.
+    '''
+
+    def __init__(self, scope, token):
+        if not UPLOAD_ID_RE.match(token):
+            raise ValueError(f'Invalid form token {token!r}')
+        self.directory = os.path.join(
+            get_staging_root(), 'forms', str(scope), token)
+
+    def add(self, key, file, index=0):
+        ''' Move or copy the uploaded `file` into the staging area under
+            `key`, recording its `index` among the files of the request.
+            Returns `False` if a file with the same key was already staged.
+        '''
+
+        if not UPLOAD_ID_RE.match(key):
+            raise ValueError(f'Invalid upload key {key!r}')
+        entry = os.path.join(self.directory, key)
+        os.makedirs(self.directory, exist_ok=True)
+        try:
+            os.mkdir(entry)
+        except FileExistsError:
+            return False
+
+        try:
+            path = os.path.join(entry, 'data')
+            if hasattr(file, 'temporary_file_path'):
+                file_move_safe(file.temporary_file_path(), path,
+                               allow_overwrite=True)
+            else:
+                with open(path, 'wb') as destination:
+                    for chunk in file.chunks():
+                        destination.write(chunk)
+
+            # The metadata is written last, marking the file as complete
+            with open(os.path.join(entry, 'meta.tmp'), 'w') as meta:
+                json.dump({'name': file.name, 'staged': time.time(),
+                           'index': index}, meta)
+            os.replace(os.path.join(entry, 'meta.tmp'),
+                       os.path.join(entry, 'meta.json'))
+        except BaseException:
+            shutil.rmtree(entry, ignore_errors=True)
+            raise
+        return True
+
+    def entries(self):
+        ''' Return a list of dicts describing each completely staged file,
+            with its `name` and `path`, in the order they were received
+        '''
+
+        try:
+            keys = os.listdir(self.directory)
+        except FileNotFoundError:
+            return []
+
+        entries = []
+        for key in keys:
+            entry = os.path.join(self.directory, key)
+            try:
+                with open(os.path.join(entry, 'meta.json')) as meta:
+                    entry_meta = json.load(meta)
+            except (OSError, ValueError):
+                continue
+            path = os.path.join(entry, 'data')
+            if os.path.exists(path):
+                entries.append({**entry_meta, 'path': path})
+        entries.sort(key=lambda entry: (entry['staged'], entry['index']))
+        return entries
+
+    def open(self):
+        ''' Return a list of `StagedFile`s for the staged files, in order '''
+
+        return [StagedFile(entry['path'], entry['name'])
+                for entry in self.entries()]
+
+    def delete(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+
+def _remove_if_stale(directory, cutoff):
+    try:
+        latest = max(
+            [os.path.getmtime(os.path.join(root, name))
+             for root, _, names in os.walk(directory)
+             for name in names] + [os.path.getmtime(directory)])
+    except FileNotFoundError:
+        # Finalized or removed by a request while being checked
+        return False
+    if latest < cutoff:
+        shutil.rmtree(directory, ignore_errors=True)
+        return True
+    return False
+
+
+def cleanup_stale_uploads(max_age=None):
+    ''' Remove staged uploads (partial chunked uploads, files awaiting
+        deferred processing and files uploaded on `add` views which were
+        never saved) which haven't been touched for `max_age` seconds
+        (defaults to `get_staging_max_age()`). Returns the number of uploads
+        removed.
+    '''
+
+    if max_age is None:
+        max_age = get_staging_max_age()
+    cutoff = time.time() - max_age
+    removed = 0
+
+    for area in ('chunks', 'forms'):
+        area_root = os.path.join(get_staging_root(), area)
+        if not os.path.isdir(area_root):
+            continue
+        for scope in os.listdir(area_root):
+            scope_directory = os.path.join(area_root, scope)
+            for upload_id in os.listdir(scope_directory):
+                removed += _remove_if_stale(
+                    os.path.join(scope_directory, upload_id), cutoff)
+            try:
+                if not os.listdir(scope_directory):
+                    os.rmdir(scope_directory)
+            except OSError:
+                # Another upload started in the scope, or it's already gone
+                pass
+
+    jobs_root = os.path.join(get_staging_root(), 'jobs')
+    if os.path.isdir(jobs_root):
+        for job_id in os.listdir(jobs_root):
+            removed += _remove_if_stale(
+                os.path.join(jobs_root, job_id), cutoff)
+
+    return removed
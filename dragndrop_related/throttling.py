@@ -0,0 +1,113 @@
+import math
+import time
+
+from django.conf import settings
+
+from .processing import get_cache
+
+
+''' Seconds clients are asked to wait before retrying an upload refused
+    because too many are already in progress
+'''
+CONCURRENCY_RETRY_AFTER = 1
+
+
+def get_throttle_timeout():
+    ''' Return how long in seconds a count of uploads in progress is kept
+        without being released, from the `DRAGNDROP_RELATED_THROTTLE_TIMEOUT`
+        setting (defaults to ten minutes), so that counts held by requests
+        which never finished eventually expire
+    '''
+
+    return getattr(settings, 'DRAGNDROP_RELATED_THROTTLE_TIMEOUT', 600)
+
+
+class UploadThrottle(object):
+    ''' Admission control for uploads by `user` to the parent `model`
+        instance with primary key `pk`. Limits the number of uploads in
+        progress at once per user (`max_per_user`) and per parent
+        (`max_per_parent`) using counters in the cache (see `get_cache`), and
+        the rate of uploads per user with a token bucket, where `rate` is a
+        tuple of the bucket's capacity and the number of seconds it takes to
+        refill.
+
+        The counters are updated atomically, so the concurrency limits hold
+        across processes given a shared cache; the token bucket is updated
+        with a plain read and write, so concurrent requests may occasionally
+        overdraw it slightly.
+    '''
+
+    def __init__(self, user, model, pk, max_per_user=None,
+                 max_per_parent=None, rate=None):
+        self.cache = get_cache()
+        self.slots = []
+        if max_per_user:
+            self.slots.append(
+                (f'dragndrop_related:active:user:{user.pk}', max_per_user))
+        if max_per_parent:
+            self.slots.append((
+                f'dragndrop_related:active:{model._meta.label_lower}:{pk}',
+                max_per_parent))
+        self.rate = rate
+        self.bucket_key = f'dragndrop_related:bucket:user:{user.pk}'
+        self.acquired = []
+
+    def acquire_slot(self, key, limit):
+        timeout = get_throttle_timeout()
+        self.cache.add(key, 0, timeout)
+        try:
+            count = self.cache.incr(key)
+        except ValueError:
+            # The counter expired in the meantime
+            self.cache.add(key, 0, timeout)
+            count = self.cache.incr(key)
+        if count > limit:
+            self.release_slot(key)
+            return False
+        return True
+
+    def release_slot(self, key):
+        try:
+            if self.cache.decr(key) < 0:
+                self.cache.set(key, 0, get_throttle_timeout())
+        except ValueError:
+            pass
+
+    def take_token(self):
+        ''' Take a token from the user's bucket, returning `None` if there
+            was one, or otherwise the number of seconds until there will be
+        '''
+
+        capacity, period = self.rate
+        now = time.time()
+        tokens, updated = self.cache.get(self.bucket_key, (capacity, now))
+        tokens = min(capacity, tokens + (now - updated) * capacity / period)
+        if tokens < 1:
+            self.cache.set(self.bucket_key, (tokens, now), period)
+            return (1 - tokens) * period / capacity
+        self.cache.set(self.bucket_key, (tokens - 1, now), period)
+        return None
+
+    def acquire(self):
+        ''' Admit an upload, returning `None` if it may go ahead (in which
+            case `release` must be called once it's finished), or otherwise
+            the whole number of seconds the client should wait before
+            retrying
+        '''
+
+        if self.rate:
+            wait = self.take_token()
+            if wait is not None:
+                return max(1, math.ceil(wait))
+
+        for key, limit in self.slots:
+            if not self.acquire_slot(key, limit):
+                self.release()
+                return CONCURRENCY_RETRY_AFTER
+            self.acquired.append(key)
+        return None
+
+    def release(self):
+        for key in self.acquired:
+            self.release_slot(key)
+        self.acquired = []
@@ -0,0 +1,358 @@
+import hashlib
+import io
+import queue
+import threading
+from io import BytesIO
+
+from django.core.exceptions import ValidationError
+from django.core.files import File
+from django.core.files.uploadedfile import UploadedFile
+from django.core.files.uploadhandler import (
+    FileUploadHandler, SkipFile, StopFutureHandlers,
+)
+from django.template.defaultfilters import filesizeformat
+
+from .archives import is_archive
+from .direct import BaseDirectUploadBackend
+
+
+''' The most data to buffer from the start of an image while waiting for
+    enough of its header to identify it
+'''
+IMAGE_HEADER_LIMIT = 2 ** 20
+
+
+class StoredUploadedFile(UploadedFile):
+    ''' An uploaded file which has already been written to the storage of the
+        related model's field, as `stored_name`, by `StorageUploadHandler`.
+        Reading it reads the stored file. Views attach the stored file rather
+        than saving the upload again, and mark it as `attached`; the handler
+        deletes any which aren't once the request is done.
+    '''
+
+    attached = False
+
+    def __init__(self, storage, stored_name, name, content_type, size,
+                 charset, content_type_extra=None, content_hash=None):
+        super().__init__(
+            storage.open(stored_name, 'rb'), name, content_type, size,
+            charset, content_type_extra)
+        self.storage = storage
+        self.stored_name = stored_name
+        self.content_hash = content_hash
+
+
+class LocalStoredUploadedFile(StoredUploadedFile):
+    ''' A `StoredUploadedFile` in storage on the local filesystem, exposing
+        its path in the same way as `TemporaryUploadedFile` so that form
+        fields can validate it from disk
+    '''
+
+    def temporary_file_path(self):
+        return self.storage.path(self.stored_name)
+
+
+class StoragePipe(io.RawIOBase):
+    ''' A readable stream fed with chunks of data from another thread, so
+        that a storage's `save()` can consume an upload as it's received. The
+        queue is bounded, so at most a few chunks are held in memory. Putting
+        an exception raises it in the reader; putting `None` ends the stream.
+    '''
+
+    def __init__(self, maxsize=8):
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.buffer = b''
+        self.finished = False
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        while not self.buffer and not self.finished:
+            item = self.queue.get()
+            if item is None:
+                self.finished = True
+            elif isinstance(item, BaseException):
+                raise item
+            else:
+                self.buffer = item
+        size = min(len(buffer), len(self.buffer))
+        buffer[:size] = self.buffer[:size]
+        self.buffer = self.buffer[size:]
+        return size
+
+
+class StorageWriter(object):
+    ''' Save the data put to it to `storage` under `key` on a background
+        thread, via a `StoragePipe`
+    '''
+
+    def __init__(self, storage, key):
+        self.storage = storage
+        self.key = key
+        self.pipe = StoragePipe()
+        self.stored_name = None
+        self.error = None
+        self.thread = threading.Thread(
+            target=self.run, name='dragndrop_related-upload', daemon=True)
+        self.thread.start()
+
+    def run(self):
+        try:
+            self.stored_name = self.storage.save(
+                self.key, File(io.BufferedReader(self.pipe), name=self.key))
+        except Exception as e:
+            self.error = e
+
+    def put(self, item):
+        while True:
+            try:
+                self.pipe.queue.put(item, timeout=1)
+                return
+            except queue.Full:
+                if not self.thread.is_alive():
+                    return
+
+    def close(self):
+        ''' Finish writing, returning the name the data was stored under or
+            raising any error raised by the storage
+        '''
+
+        self.put(None)
+        self.thread.join()
+        if self.error is not None:
+            raise self.error
+        return self.stored_name
+
+    def abort(self):
+        ''' Stop writing and remove any partially stored data '''
+
+        self.put(ValidationError('Upload aborted'))
+        self.thread.join()
+        name = self.stored_name or self.key
+        if self.storage.exists(name):
+            self.storage.delete(name)
+
+
+class HashingUploadHandler(FileUploadHandler):
+    ''' An upload handler which hashes the files sent for the related model's
+        field as they're received, passing the data on to the next handler
+        unchanged, so that deduplication needn't read each file again once
+        it's been spooled. The hex SHA-256 digests are recorded in `hashes`,
+        in the order the files were received, for `apply()` to set as the
+        files' `content_hash`. Must be installed before the request's `POST`
+        or `FILES` are accessed.
+    '''
+
+    def __init__(self, request, field_name):
+        super().__init__(request)
+        self.field_name = field_name
+        self.digest = None
+        self.hashes = []
+
+    def new_file(self, field_name, *args, **kwargs):
+        super().new_file(field_name, *args, **kwargs)
+        self.digest = hashlib.sha256() \
+            if field_name == self.field_name else None
+
+    def receive_data_chunk(self, raw_data, start):
+        if self.digest is not None:
+            self.digest.update(raw_data)
+        return raw_data
+
+    def file_complete(self, file_size):
+        if self.digest is not None:
+            self.hashes.append(self.digest.hexdigest())
+            self.digest = None
+        return None
+
+    def apply(self, files):
+        ''' Set the recorded hashes as the `content_hash` of `files`, the
+            uploaded files for the field in the order they were received
+        '''
+
+        if len(files) != len(self.hashes):
+            return
+        for file, content_hash in zip(files, self.hashes):
+            file.content_hash = content_hash
+
+
+class StorageUploadHandler(FileUploadHandler):
+    ''' An upload handler which streams files sent for the related model's
+        field straight into that field's storage as they're received, rather
+        than spooling them to memory or a temporary file first, so that each
+        file is only written once. The file name is validated before any
+        data is written, and uploads which exceed `max_upload_size` or (for
+        images) aren't valid images or exceed `max_image_dimensions` according
+        to their header are abandoned as soon as that's known, skipping the
+        rest of the file; the reasons are recorded in `rejected`, keyed by the
+        file's position in the request.
+
+        With `archive_max_size` given, archives (see
+        `dragndrop_related.archives`) are stored as they are, up to that size,
+        for their entries to be validated once they're extracted.
+
+        Files sent for other fields are passed on to the next handler. Must be
+        installed before the request's `POST` or `FILES` are accessed.
+    '''
+
+    def __init__(self, request, spec, parent, archive_max_size=None):
+        super().__init__(request)
+        self.spec = spec
+        self.archive_max_size = archive_max_size
+        self.backend = BaseDirectUploadBackend(spec, parent)
+        self.storage = self.backend.storage
+        self.index = -1
+        self.active = False
+        self.writer = None
+        self.files = []
+        self.rejected = {}
+
+    def new_file(self, field_name, file_name, *args, **kwargs):
+        super().new_file(field_name, file_name, *args, **kwargs)
+        self.active = field_name == self.spec.related_model_field_name
+        if not self.active:
+            return
+
+        self.index += 1
+        self.size = 0
+        self.writer = None
+        if self.archive_max_size is not None and is_archive(file_name):
+            self.max_size = self.archive_max_size
+            self.header = None
+            self.digest = None
+            raise StopFutureHandlers()
+
+        self.max_size = self.spec.max_upload_size
+        self.header = b'' if self.spec.is_image else None
+        self.digest = hashlib.sha256() \
+            if self.spec.related_model_hash_field_name else None
+
+        try:
+            self.backend.validate_name(file_name)
+        except ValidationError as e:
+            self.reject(e.messages)
+            raise SkipFile()
+        raise StopFutureHandlers()
+
+    def reject(self, messages):
+        ''' Record the current file as rejected and abandon writing it '''
+
+        self.rejected[self.index] = (self.file_name, messages)
+        if self.writer is not None:
+            self.writer.abort()
+            self.writer = None
+        self.active = False
+
+    def check_image_header(self, raw_data):
+        ''' Buffer the start of an image until its header can be read,
+            rejecting it if it isn't a valid image or is too large. Returns
+            the buffered data once the image has been accepted, or `None`
+            while waiting for more (or if it's been rejected).
+        '''
+
+        from PIL import Image
+
+        self.header += raw_data
+        try:
+            with Image.open(BytesIO(self.header)) as image:
+                dimensions = image.size
+        except Exception:
+            if len(self.header) < IMAGE_HEADER_LIMIT:
+                return None
+            self.reject(['Upload a valid image. The file you uploaded was '
+                         'either not an image or a corrupted image.'])
+            return None
+
+        max_dimensions = self.spec.max_image_dimensions
+        if max_dimensions and (dimensions[0] > max_dimensions[0] or
+                               dimensions[1] > max_dimensions[1]):
+            self.reject([
+                'Ensure this image is no larger than {0}x{1} pixels (it is '
+                '{2}x{3} pixels).'.format(*max_dimensions, *dimensions)])
+            return None
+
+        header, self.header = self.header, None
+        return header
+
+    def write(self, data):
+        if self.writer is None:
+            self.writer = StorageWriter(
+                self.storage, self.backend.get_key(self.file_name))
+        if self.digest is not None:
+            self.digest.update(data)
+        self.writer.put(data)
+
+    def receive_data_chunk(self, raw_data, start):
+        if not self.active:
+            return raw_data
+
+        self.size += len(raw_data)
+        if self.max_size is not None and self.size > self.max_size:
+            self.reject([
+                'Ensure this file is no larger than {0}.'.format(
+                    filesizeformat(self.max_size))])
+            raise SkipFile()
+
+        if self.header is not None:
+            raw_data = self.check_image_header(raw_data)
+            if not self.active:
+                raise SkipFile()
+            if raw_data is None:
+                return None
+
+        self.write(raw_data)
+        return None
+
+    def file_complete(self, file_size):
+        if not self.active:
+            return None
+        self.active = False
+
+        if self.header is not None:
+            # The file ended before its header could be read; store it
+            # anyway and leave the form to report it as invalid, since the
+            # remaining upload handlers can't take it over at this point
+            header, self.header = self.header, None
+            self.write(header)
+        elif self.writer is None:
+            self.write(b'')
+
+        writer, self.writer = self.writer, None
+        try:
+            stored_name = writer.close()
+        except Exception:
+            writer.abort()
+            raise
+
+        try:
+            self.storage.path(stored_name)
+        except NotImplementedError:
+            file_class = StoredUploadedFile
+        else:
+            file_class = LocalStoredUploadedFile
+        file = file_class(
+            self.storage, stored_name, self.file_name, self.content_type,
+            file_size, self.charset, self.content_type_extra,
+            self.digest.hexdigest() if self.digest is not None else None)
+        self.files.append(file)
+        return file
+
+    def upload_interrupted(self):
+        # Called whenever the request's last file was skipped, as well as
+        # when it's cut short; files already stored are left for `discard()`
+        # once the view is done with them
+        if self.writer is not None:
+            self.writer.abort()
+            self.writer = None
+
+    def discard(self):
+        ''' Delete the stored files this handler created which haven't been
+            attached to a related model instance
+        '''
+
+        for file in self.files:
+            file.close()
+            if not file.attached and self.storage.exists(file.stored_name):
+                self.storage.delete(file.stored_name)
+        self.files = []
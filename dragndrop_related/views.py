@@ -1,113 +1,1949 @@
-from django import forms
+import asyncio
+import json
+import logging
+import os
+import uuid
+from contextlib import nullcontext
+from functools import update_wrapper
+
+from asgiref.sync import sync_to_async
+from django import VERSION as DJANGO_VERSION
+from django.contrib.admin.options import IS_POPUP_VAR
 from django.contrib.auth.mixins import PermissionRequiredMixin
-from django.db import models, transaction
-from django.db.models import Max
-from django.http import (HttpResponse, HttpResponseBadRequest,
-                         HttpResponseRedirect)
+from django.core import checks, signing
+from django.core.exceptions import ImproperlyConfigured, ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import Q
+from django.http import (Http404, HttpResponseBadRequest,
+                         HttpResponseRedirect, JsonResponse,
+                         StreamingHttpResponse)
+from django.shortcuts import get_object_or_404
+from django.template.loader import render_to_string
 from django.urls import re_path, reverse
-from django.views.generic import DetailView
+from django.utils.datastructures import MultiValueDict
+from django.utils.text import slugify
+from django.views.decorators.cache import never_cache
+from django.views.decorators.csrf import csrf_protect
+from django.views.generic import DetailView, View
 from django.views.generic.edit import FormMixin, ProcessFormView
 from django.conf import settings
 
+from .archives import ARCHIVE_EXTENSIONS, Archive, is_archive, stream_zip
+from .dedupe import (DEDUPLICATE_PARENT, DEDUPLICATE_STORAGE,
+                     find_duplicates, hash_file)
+from .direct import (BaseDirectUploadBackend, claim_upload, release_upload,
+                     sign_upload, unsign_upload)
+from .idempotency import (UPLOAD_IN_PROGRESS_RETRY_AFTER, UploadKey,
+                          parse_upload_keys)
+from .instrumentation import UploadMetrics, get_metrics_sink
+from .metadata import IMAGE_METADATA_KEYS, get_metadata_kwargs
+from .ordering import ParentLockOrderAllocator
+from .processing import enqueue_upload, get_job
+from .renditions import generate_renditions, get_rendition_name
+from .signals import post_upload, pre_upload
+from .spec import RelatedModelSpecError, build_related_model_spec
+from .staging import FORM_TOKEN_FIELD, ChunkedUpload, StagedUploads
+from .throttling import UploadThrottle
+from .uploadhandler import (HashingUploadHandler, StorageUploadHandler,
+                            StoredUploadedFile)
+
+
+logger = logging.getLogger(__name__)
+
+
+class DragAndDropPermissionMixin(PermissionRequiredMixin):
+    ''' Require `change` permission for the view's model, as for all of our
+        drag-and-drop views
+    '''
+
+    def get_permission_required(self):
+        ''' Ensure the user has `change` permission for the model '''
+
+        info = self.model._meta.app_label, self.model._meta.model_name
+        return ('{0}.change_{1}'.format(*info), )
+
+
+class DragAndDropInlineMixin(object):
+    ''' Describe newly created related model instances for the Dropzone UI,
+        including a rendered fragment of the `ModelAdmin`'s inline for the
+        related model (if it has one), so that the UI can insert the new rows
+        into the inline formset in place rather than reloading the page.
+        Requires `request`, `object`, `model_admin` and the related model info
+        `kwargs`.
+    '''
+
+    def get_related_inline(self):
+        ''' Return a tuple of the inline admin for the related model and the
+            prefix its formset is given on the change view, or `None` if the
+            `ModelAdmin` has no such inline
+        '''
+
+        spec = self.kwargs['related_model_spec']
+        prefixes = {}
+        for formset_class, inline in \
+                self.model_admin.get_formsets_with_inlines(
+                    self.request, self.object):
+            # Derive the prefix in the same way as `ModelAdmin`
+            prefix = formset_class.get_default_prefix()
+            prefixes[prefix] = prefixes.get(prefix, 0) + 1
+            if prefixes[prefix] != 1 or not prefix:
+                prefix = '{0}-{1}'.format(prefix, prefixes[prefix])
+            if inline.model is spec.related_model and \
+                    formset_class.fk.name == spec.foreign_key_name:
+                return inline, prefix
+        return None
+
+    def render_inline_fragments(self, instances):
+        ''' Render the inline for each of the `instances` on its own, as a
+            formset of one existing form, returning a list of HTML fragments
+            (or of `None`s if there's no inline). The row for each instance
+            is numbered `0`; the UI renumbers it on insertion.
+        '''
+
+        related_inline = self.get_related_inline()
+        if related_inline is None:
+            return [None] * len(instances)
+        inline, prefix = related_inline
+
+        formset_class = inline.get_formset(
+            self.request, self.object, extra=0, min_num=0)
+        self.request.current_app = self.model_admin.admin_site.name
+        context = self.model_admin.admin_site.each_context(self.request)
+
+        fragments = []
+        for instance in instances:
+            formset = formset_class(
+                instance=self.object, prefix=prefix,
+                queryset=inline.get_queryset(self.request)
+                .filter(pk=instance.pk))
+            inline_admin_formset, = self.model_admin.get_inline_formsets(
+                self.request, [formset], [inline], self.object)
+            fragments.append(render_to_string(
+                inline.template,
+                {**context, 'inline_admin_formset': inline_admin_formset},
+                request=self.request))
+        return fragments
+
+    def describe_child(self, instance):
+        ''' Return a JSON-serialisable description of the related model
+            `instance`: its `pk`, file `name` and `url`, `thumbnail` URL (for
+            images), `order` and admin `change_url` (if the related model is
+            registered with the same admin site)
+        '''
+
+        spec = self.kwargs['related_model_spec']
+        admin_site = self.model_admin.admin_site
+        field_file = getattr(instance, spec.related_model_field_name)
+
+        url = field_file.url if field_file else None
+        thumbnail = url if spec.is_image else None
+        rendition = self.kwargs['lazy_inline_thumbnail_rendition']
+        presets = self.kwargs['image_renditions']
+        if field_file and presets and rendition in presets:
+            thumbnail = field_file.storage.url(get_rendition_name(
+                field_file.name, rendition, presets[rendition]))
+
+        change_url = None
+        if spec.related_model in admin_site._registry:
+            info = \
+                spec.related_model._meta.app_label, \
+                spec.related_model._meta.model_name
+            change_url = reverse(
+                'admin:{0}_{1}_change'.format(*info), args=[instance.pk],
+                current_app=admin_site.name)
+
+        return {
+            'pk': str(instance.pk),
+            'name': os.path.basename(field_file.name) if field_file else '',
+            'url': url,
+            'thumbnail': thumbnail,
+            'order': getattr(instance, spec.related_model_order_field_name)
+            if spec.related_model_order_field_name else None,
+            'change_url': change_url,
+        }
+
+    def describe_related(self, instances):
+        ''' Return a description of each of the newly created related model
+            `instances` as per `describe_child`, along with its rendered
+            inline `fragment` and the formset `prefix` the fragment uses
+        '''
+
+        related_inline = self.get_related_inline()
+        prefix = related_inline[1] if related_inline else None
+        fragments = self.render_inline_fragments(instances)
+
+        return [
+            {**self.describe_child(instance),
+             'prefix': prefix, 'fragment': fragment}
+            for instance, fragment in zip(instances, fragments)
+        ]
+
 
-class DragAndDropView(PermissionRequiredMixin, FormMixin, ProcessFormView,
+class DragAndDropThrottleMixin(object):
+    ''' Apply the `ModelAdmin`'s limits on concurrent uploads and upload rate
+        (see `UploadThrottle`). Requires the related model info `kwargs`.
+    '''
+
+    def build_upload_throttle(self, pk):
+        ''' Return an `UploadThrottle` applying the limits to uploads to the
+            parent with primary key `pk`, or `None` if there aren't any
+        '''
+
+        limits = (
+            self.kwargs['max_concurrent_uploads_per_user'],
+            self.kwargs['max_concurrent_uploads_per_parent'],
+            self.kwargs['upload_rate_limit'],
+        )
+        if not any(limits):
+            return None
+        return UploadThrottle(self.request.user, self.model, pk, *limits)
+
+    def throttled(self, retry_after):
+        ''' Respond to an upload refused by the throttle with `429 Too Many
+            Requests`, telling the client when to retry
+        '''
+
+        response = JsonResponse({
+            'error': 'Too many uploads, retrying shortly',
+            'retry_after': retry_after,
+        }, status=429)
+        response['Retry-After'] = str(retry_after)
+        return response
+
+
+class DragAndDropView(DragAndDropPermissionMixin, DragAndDropInlineMixin,
+                      DragAndDropThrottleMixin, FormMixin, ProcessFormView,
                       DetailView):
     ''' Define a generic view used to handle POST requests from the Dropzone
-        library. The `model` will be injected dynamically by the `ModelAdmin`
-        when defining the custom route with `get_urls`
+        library. The `model` and `model_admin` will be injected dynamically
+        by the `ModelAdmin` when defining the custom route with `get_urls`
     '''
 
+    model_admin = None
+    upload_handler = None
+    metrics = None
+    created_instances = ()
+
+    ''' Number of valid archive entries to create at a time, with a single
+        bulk insert (see `archive_valid`)
+    '''
+    archive_batch_size = 100
+
+    def dispatch(self, request, *args, **kwargs):
+        ''' Instrument POSTs (see `start_upload`), replay the outcome of
+            uploads repeated with the same key (see `get_upload_key`) and
+            apply any admission control configured for uploads (see
+            `get_upload_throttle`) before handling the request
+        '''
+
+        if request.method != 'POST':
+            return self.dispatch_throttled(request, *args, **kwargs)
+
+        self.start_upload()
+        response = self.dispatch_idempotent(request, *args, **kwargs)
+        self.finish_upload(response)
+        return response
+
+    def start_upload(self):
+        ''' Start recording `UploadMetrics` for the request and send the
+            `pre_upload` signal
+        '''
+
+        self.metrics = UploadMetrics()
+        pre_upload.send(
+            sender=self.model, request=self.request,
+            pk=self.kwargs.get('pk'), metrics=self.metrics)
+
+    def finish_upload(self, response):
+        ''' Complete the request's `UploadMetrics`, report them in a
+            `Server-Timing` header on the `response` and to the configured
+            metrics sink, and send the `post_upload` signal
+        '''
+
+        self.metrics.finish()
+        response['Server-Timing'] = self.metrics.server_timing()
+        sink = get_metrics_sink()
+        if sink is not None:
+            sink.record(self.metrics, self.model, response.status_code)
+        post_upload.send(
+            sender=self.model, request=self.request, response=response,
+            instances=list(self.created_instances), metrics=self.metrics)
+
+    def timed(self, name):
+        ''' Return a context manager timing the phase `name` of the request
+            in its `metrics`, if they're being recorded
+        '''
+
+        if self.metrics is None:
+            return nullcontext()
+        return self.metrics.phase(name)
+
+    def has_permission(self):
+        with self.timed('permission'):
+            return super().has_permission()
+
+    def get_queryset(self):
+        ''' With `lean_uploads` enabled, fetch only the parent's primary key;
+            the parent is only needed for its related manager, and any other
+            fields are loaded if accessed
+        '''
+
+        queryset = super().get_queryset()
+        if self.kwargs['lean_uploads']:
+            queryset = queryset.only(self.model._meta.pk.name)
+        return queryset
+
+    def get_object(self, queryset=None):
+        with self.timed('object'):
+            return super().get_object(queryset)
+
+    def describe_related(self, instances):
+        with self.timed('render'):
+            return super().describe_related(instances)
+
+    def receive(self):
+        ''' Parse the request body, if it hasn't been already (e.g. by the
+            CSRF check), timing it and counting the files received. Files are
+            hashed as they're received if the related model has a
+            `related_model_hash_field_name` (streamed files already are).
+        '''
+
+        hashing_handler = None
+        spec = self.kwargs['related_model_spec']
+        if spec.related_model_hash_field_name and \
+                self.request.method == 'POST' and \
+                not hasattr(self.request, '_files') and \
+                self.upload_handler is None:
+            hashing_handler = HashingUploadHandler(
+                self.request, spec.related_model_field_name)
+            self.request.upload_handlers.insert(0, hashing_handler)
+
+        with self.timed('receive'):
+            files = self.request.FILES
+        if hashing_handler is not None:
+            hashing_handler.apply(
+                files.getlist(spec.related_model_field_name))
+        if self.metrics is not None and not self.metrics.files:
+            self.metrics.add_files(
+                file for _, values in files.lists() for file in values)
+
+    def dispatch_idempotent(self, request, *args, **kwargs):
+        try:
+            upload_key = self.get_upload_key()
+        except ValueError as e:
+            return HttpResponseBadRequest(str(e))
+        if upload_key is None:
+            return self.dispatch_throttled(request, *args, **kwargs)
+
+        with self.timed('idempotency'):
+            claimed = upload_key.claim()
+            if not claimed:
+                return self.repeated(upload_key.replay())
+        try:
+            response = self.dispatch_throttled(request, *args, **kwargs)
+        except BaseException:
+            upload_key.release()
+            raise
+        self.record_upload(upload_key, response)
+        return response
+
+    def get_upload_key(self):
+        ''' Return an `UploadKey` for the keys the client sent in the
+            `X-Upload-Key` header to identify the files in the request, or
+            `None` if it didn't send any. The Dropzone UI sends a unique key
+            for each file, which it keeps when retrying the upload. Raises
+            `ValueError` if the keys are invalid.
+        '''
+
+        value = self.request.headers.get('X-Upload-Key')
+        if not value:
+            return None
+        return UploadKey(
+            self.request.user, self.model, self.kwargs['pk'],
+            parse_upload_keys(value))
+
+    def repeated(self, response):
+        ''' Respond to an upload whose key has been seen before with the
+            `response` recorded for it, or if the first attempt is still in
+            progress with `409 Conflict`, telling the client when to retry
+        '''
+
+        if response is not None:
+            return response
+        response = JsonResponse({
+            'error': 'This upload is already in progress',
+            'retry_after': UPLOAD_IN_PROGRESS_RETRY_AFTER,
+        }, status=409)
+        response['Retry-After'] = str(UPLOAD_IN_PROGRESS_RETRY_AFTER)
+        return response
+
+    def record_upload(self, upload_key, response):
+        ''' Record the `response` to an upload with a key, to be replayed if
+            the key is repeated, unless the upload should be retried as a
+            fresh attempt (i.e. it was throttled, failed on the server or
+            was refused by the CSRF check)
+        '''
+
+        with self.timed('idempotency'):
+            if response.status_code >= 500 or \
+                    response.status_code in (403, 409, 429):
+                upload_key.release()
+            else:
+                upload_key.complete(response)
+
+    def dispatch_throttled(self, request, *args, **kwargs):
+        throttle = self.get_upload_throttle()
+        if throttle is None:
+            return self.dispatch_upload(request, *args, **kwargs)
+
+        with self.timed('throttle'):
+            retry_after = throttle.acquire()
+        if retry_after is not None:
+            return self.throttled(retry_after)
+        try:
+            return self.dispatch_upload(request, *args, **kwargs)
+        finally:
+            throttle.release()
+
+    def dispatch_upload(self, request, *args, **kwargs):
+        ''' Apply CSRF protection, which the view is exempt from in the
+            admin and middleware since checking it parses the body of a POST.
+            Doing it here, once the upload has been admitted (see
+            `get_upload_throttle`), means refused uploads are answered without
+            their bodies being parsed. With `streaming_uploads` enabled, a
+            `StorageUploadHandler` is installed first; any streamed files
+            which don't end up attached to a related model instance are
+            deleted afterwards.
+        '''
+
+        if not self.kwargs.get('streaming_uploads'):
+            if request.method == 'POST':
+                # Parse the body now (rather than in the CSRF check) so the
+                # time spent receiving it is recorded
+                self.receive()
+            return csrf_protect(super().dispatch)(request, *args, **kwargs)
+
+        if request.method == 'POST' and \
+                not self.kwargs.get('direct_action'):
+            if not self.has_permission():
+                return self.handle_no_permission()
+            self.upload_handler = StorageUploadHandler(
+                request, self.kwargs['related_model_spec'],
+                self.get_object(),
+                archive_max_size=self.kwargs['archive_max_size']
+                if self.kwargs['archive_uploads'] else None)
+            request.upload_handlers.insert(0, self.upload_handler)
+            # Parse the body now (rather than in the CSRF check) so the time
+            # spent streaming it into storage is recorded
+            self.receive()
+
+        try:
+            return csrf_protect(super().dispatch)(request, *args, **kwargs)
+        finally:
+            if self.upload_handler is not None:
+                self.upload_handler.discard()
+
+    def get_upload_throttle(self):
+        ''' Return an `UploadThrottle` applying the `ModelAdmin`'s limits on
+            concurrent uploads and upload rate, or `None` if there aren't any
+            or the request isn't an upload. Only requests carrying files are
+            throttled; e.g. deduplication pre-flight checks aren't.
+        '''
+
+        if self.request.method != 'POST' or \
+                self.request.content_type != 'multipart/form-data':
+            return None
+        return self.build_upload_throttle(self.kwargs['pk'])
+
     def get(self, request, *args, **kwargs):
         ''' Catch GET requests and redirect them to the `change` view for the
             model instance
         '''
 
-        self.object = self.get_object()
+        self.object = self.get_object()
+
+        upload_id = request.GET.get('dzuuid')
+        if upload_id:
+            return self.chunk_status(upload_id)
+
+        info = self.model._meta.app_label, self.model._meta.model_name
+        urlpattern = 'admin:{0}_{1}_change'.format(*info)
+        return HttpResponseRedirect(
+            reverse(urlpattern, kwargs={'object_id': self.object.pk}))
+
+    def get_form_class(self):
+        ''' Return the form class used to validate uploads, which is built
+            once per `ModelAdmin` along with the rest of its
+            `RelatedModelSpec`
+        '''
+
+        return self.kwargs['related_model_spec'].form_class
+
+    def post(self, request, *args, **kwargs):
+        ''' Make sure the `object` is available when handling POSTs (necessary
+            due to the composition of this class). Requests carrying more than
+            one file (i.e. from Dropzone's `uploadMultiple` mode) are handed
+            off to `batch_valid`.
+        '''
+
+        self.object = self.get_object()
+        self.receive()
+
+        if self.kwargs.get('direct_action'):
+            return self.direct_upload_valid()
+
+        if 'dzuuid' in request.POST:
+            return self.chunk_valid()
+
+        if 'content_hash' in request.POST and not request.FILES:
+            return self.preflight_valid()
+
+        files = request.FILES.getlist(self.kwargs['related_model_field_name'])
+        rejected = self.upload_handler.rejected if self.upload_handler else {}
+        if rejected and not files:
+            return HttpResponseBadRequest(' '.join(
+                message for _, messages in rejected.values()
+                for message in messages))
+        if self.has_archives(files):
+            return self.archive_valid(files, rejected)
+        if len(files) > 1 or rejected:
+            return self.batch_valid(files, rejected)
+
+        form = self.get_form()
+        with self.timed('validate'):
+            is_valid = form.is_valid()
+        if is_valid:
+            return self.form_valid(form)
+        return self.form_invalid(form)
+
+    def allocate_order(self, related_manager, count=1):
+        ''' Return the first of `count` consecutive order values to be used
+            for new instances of the related model, using the order allocator
+            configured on the `ModelAdmin`. Must be called inside the
+            transaction used to create the instances.
+        '''
+
+        allocator = self.kwargs['related_model_order_allocator_class'](
+            self.kwargs['related_model_order_field_name'])
+        with self.timed('order'):
+            return allocator.allocate(
+                self.object, related_manager, count=count)
+
+    def create_related(self, files, hashes=None):
+        ''' Create new instances of the related model for each of the
+            supplied (validated) `files` via the related manager of this
+            view's model, allocating order values where required. A single
+            file is created with `create()`, so the related model's `save()`
+            is called as normal, while several are created with one
+            `bulk_create`. Items in `files` may also be the names of files
+            already in storage (or `StoredUploadedFile`s), and `hashes` the
+            content hashes to record alongside them. Returns the new
+            instances.
+
+            The files are written to storage first, outside of any
+            transaction, so that slow storage doesn't hold a database
+            connection (or the parent's row lock) open; only the order
+            allocation and insert run in a transaction. If they fail, the
+            files just written are deleted again.
+        '''
+
+        related_manager_field_name = \
+            self.kwargs['related_manager_field_name']
+        related_model_field_name = \
+            self.kwargs['related_model_field_name']
+        related_model_order_field_name = \
+            self.kwargs['related_model_order_field_name']
+
+        spec = self.kwargs['related_model_spec']
+        related_manager = getattr(self.object, related_manager_field_name)
+        related_model = spec.related_model
+
+        # In lean mode, without order values to allocate there's nothing to
+        # make atomic beyond the insert itself (`bulk_create` takes care of
+        # its own batches), so skip the explicit transaction
+        if self.kwargs['lean_uploads'] and \
+                not related_model_order_field_name:
+            atomic = nullcontext()
+        else:
+            atomic = transaction.atomic()
+
+        instances = []
+        for index, file in enumerate(files):
+            add_kwargs = self.get_foreign_key_kwargs()
+            add_kwargs[related_model_field_name] = \
+                getattr(file, 'stored_name', file)
+            if hashes:
+                add_kwargs[spec.related_model_hash_field_name] = \
+                    hashes[index]
+            add_kwargs.update(self.get_metadata_kwargs(file))
+            instances.append(related_model(**add_kwargs))
+
+        stored = self.store_files(instances)
+        try:
+            with self.timed('transaction'), atomic:
+                if related_model_order_field_name:
+                    order = self.allocate_order(
+                        related_manager, count=len(files))
+                    for index, instance in enumerate(instances):
+                        setattr(instance, related_model_order_field_name,
+                                order + index)
+
+                with self.timed('insert'):
+                    if len(instances) == 1:
+                        instances[0].save(force_insert=True)
+                    else:
+                        related_model._default_manager.bulk_create(
+                            instances)
+        except BaseException:
+            self.discard_stored(stored)
+            raise
+
+        self.created_instances = [*self.created_instances, *instances]
+        self.mark_attached(files)
+        self.post_create(instances)
+
+        return instances
+
+    def get_metadata_kwargs(self, file):
+        ''' Return the values of the related model's metadata fields for the
+            (validated) uploaded `file` (see `related_model_metadata_fields`).
+            Files already in storage (given by name) are left for the
+            `dragndrop_metadata` command, rather than being read back.
+        '''
+
+        spec = self.kwargs['related_model_spec']
+        if not spec.related_model_metadata_fields or isinstance(file, str):
+            return {}
+        with self.timed('metadata'):
+            return get_metadata_kwargs(spec, file)
+
+    def store_files(self, instances):
+        ''' Write the files of new related model `instances` to storage, as
+            the field's `pre_save()` otherwise would while inserting them.
+            Returns the field files written, which are deleted again if any
+            of them fail.
+        '''
+
+        related_model_field_name = \
+            self.kwargs['related_model_field_name']
+
+        stored = []
+        with self.timed('store'):
+            try:
+                for instance in instances:
+                    field_file = getattr(instance, related_model_field_name)
+                    if field_file and not field_file._committed:
+                        field_file.save(
+                            field_file.name, field_file.file, save=False)
+                        stored.append(field_file)
+            except BaseException:
+                self.discard_stored(stored)
+                raise
+        return stored
+
+    def discard_stored(self, stored):
+        ''' Delete the files in `stored` (see `store_files`), for instances
+            which couldn't be inserted. Errors deleting them are logged rather
+            than raised, so as not to mask the original error.
+        '''
+
+        for field_file in stored:
+            try:
+                field_file.storage.delete(field_file.name)
+            except Exception:
+                logger.exception(
+                    'Unable to delete %s after failing to insert it',
+                    field_file.name)
+
+    def get_foreign_key_kwargs(self):
+        ''' Return the kwargs linking a new related model instance to the
+            parent: the parent itself, or with `lean_uploads` enabled just its
+            primary key value
+        '''
+
+        spec = self.kwargs['related_model_spec']
+        if self.kwargs['lean_uploads']:
+            foreign_key = spec.related_model._meta.get_field(
+                spec.foreign_key_name)
+            return {foreign_key.attname: self.object.pk}
+        return {spec.foreign_key_name: self.object}
+
+    def mark_attached(self, files):
+        ''' Record that any streamed `files` (see `streaming_uploads`) are now
+            in use, so they aren't deleted at the end of the request
+        '''
+
+        for file in files:
+            if isinstance(file, StoredUploadedFile):
+                file.attached = True
+
+    def post_create(self, instances):
+        ''' Perform any further processing of newly created related model
+            `instances`, i.e. generating `image_renditions`. The instances
+            have already been created by now, so renditions which can't be
+            generated are logged rather than failing the request.
+        '''
+
+        presets = self.kwargs['image_renditions']
+        if presets:
+            related_model_field_name = \
+                self.kwargs['related_model_field_name']
+            with self.timed('renditions'):
+                generate_renditions(
+                    [getattr(instance, related_model_field_name)
+                     for instance in instances],
+                    presets)
+
+    def defer_processing(self, files, hashes=None):
+        ''' Hand the supplied (validated) `files` off to the processing
+            backend and return the details needed to poll for the job's status
+        '''
+
+        job_id = enqueue_upload(self.model_admin, self.object, files, hashes)
+        self.mark_attached(files)
+        info = self.model._meta.app_label, self.model._meta.model_name
+        return {
+            'job': job_id,
+            'status_url': reverse(
+                'admin:{0}_{1}_drag_and_drop_job'.format(*info),
+                kwargs={'pk': self.object.pk, 'job_id': job_id},
+                current_app=self.model_admin.admin_site.name),
+        }
+
+    def deduplicate(self, files):
+        ''' Hash the supplied (validated) `files` if the related model has a
+            `related_model_hash_field_name`, and apply `deduplicate_uploads`.
+            Returns a tuple of the files to create instances for (files whose
+            stored copy can be reused are replaced by the stored file's name),
+            their hashes, and the indexes of any `files` skipped as
+            duplicates.
+        '''
+
+        spec = self.kwargs['related_model_spec']
+        mode = self.kwargs['deduplicate_uploads']
+        if not spec.related_model_hash_field_name:
+            return files, None, set()
+
+        with self.timed('hash'):
+            hashes = [hash_file(file) for file in files]
+        if not mode:
+            return files, hashes, set()
+
+        related_manager = \
+            getattr(self.object, self.kwargs['related_manager_field_name'])
+        attached, stored = find_duplicates(
+            spec, related_manager, hashes, mode)
+
+        items = []
+        item_hashes = []
+        duplicates = set()
+        for index, (file, content_hash) in enumerate(zip(files, hashes)):
+            if content_hash in attached:
+                duplicates.add(index)
+                continue
+            attached.add(content_hash)
+            items.append(stored.get(content_hash, file))
+            item_hashes.append(content_hash)
+
+        return items, item_hashes, duplicates
+
+    def preflight_valid(self):
+        ''' Check whether a file with the given `content_hash` has already
+            been uploaded, so the client can skip sending it. Responds with a
+            `status` of `duplicate` if it's already attached to this parent,
+            `attached` if a stored copy from elsewhere has just been attached
+            (with `deduplicate_uploads` set to `storage`), or `missing` if the
+            file should be uploaded as normal.
+        '''
+
+        spec = self.kwargs['related_model_spec']
+        mode = self.kwargs['deduplicate_uploads']
+        if not mode:
+            raise Http404('Deduplication is not enabled')
+
+        content_hash = self.request.POST['content_hash'].lower()
+        related_manager = \
+            getattr(self.object, self.kwargs['related_manager_field_name'])
+
+        with transaction.atomic():
+            attached, stored = find_duplicates(
+                spec, related_manager, [content_hash], mode)
+            if attached:
+                return JsonResponse({'status': 'duplicate'})
+            if stored:
+                instances = self.create_related(
+                    [stored[content_hash]], [content_hash])
+                return JsonResponse({
+                    'status': 'attached',
+                    'children': self.describe_related(instances),
+                })
+
+        return JsonResponse({'status': 'missing'})
+
+    def form_valid(self, form):
+        ''' Create a new instance of the related model via the related manager
+            of this view's model. Use the supplied `related_model_field_name`
+            as the field name when creating the instance. With
+            `deferred_processing` enabled the instance is instead created by
+            the processing backend, and a `202 Accepted` response is returned
+            describing the job.
+        '''
+
+        related_model_field_name = \
+            self.kwargs['related_model_field_name']
+
+        file = form.cleaned_data[related_model_field_name]
+
+        files, hashes, duplicates = self.deduplicate([file])
+        if duplicates:
+            return JsonResponse({
+                'message': 'This file has already been uploaded',
+                'children': [],
+            })
+
+        if self.kwargs['deferred_processing']:
+            return JsonResponse(
+                self.defer_processing(files, hashes), status=202)
+
+        instances = self.create_related(files, hashes)
+
+        return JsonResponse({
+            'message': 'Thanks, your file was processed',
+            'children': self.describe_related(instances),
+        })
+
+    def batch_valid(self, files, rejected=None):
+        ''' Validate each of the supplied `files` individually, then create
+            related model instances for the valid ones with a single
+            `bulk_create`, allocating their order values in one go. Return a
+            JSON list of per-file results, in the order the files were sent,
+            so a bad file doesn't fail the rest of the batch. Files already
+            `rejected` by the upload handler are reported in their place.
+        '''
+
+        form_class = self.get_form_class()
+
+        rejected = rejected or {}
+        remaining = iter(files)
+
+        results = []
+        valid_files = []
+        for index in range(len(files) + len(rejected)):
+            if index in rejected:
+                name, messages = rejected[index]
+                results.append(
+                    {'name': name, 'success': False, 'errors': messages})
+                continue
+
+            file = next(remaining)
+            errors = self.validate_upload(form_class, file)
+            if not errors:
+                results.append({'name': file.name, 'success': True})
+                valid_files.append(file)
+            else:
+                results.append(
+                    {'name': file.name, 'success': False, 'errors': errors})
+
+        if not valid_files:
+            return JsonResponse({'results': results}, status=400)
+
+        files, hashes, duplicates = self.deduplicate(valid_files)
+        valid_results = [result for result in results if result['success']]
+        for index in duplicates:
+            valid_results[index]['duplicate'] = True
+        if not files:
+            return JsonResponse({'results': results})
+
+        if self.kwargs['deferred_processing']:
+            return JsonResponse(
+                {'results': results,
+                 **self.defer_processing(files, hashes)},
+                status=202)
+
+        instances = self.create_related(files, hashes)
+
+        return JsonResponse({
+            'results': results,
+            'children': self.describe_related(instances),
+        })
+
+    def validate_upload(self, form_class, file):
+        ''' Validate a single uploaded `file` with the `form_class`, returning
+            a list of the error messages (empty if it's valid)
+        '''
+
+        form = form_class(files=MultiValueDict(
+            {self.kwargs['related_model_field_name']: [file]}))
+        with self.timed('validate'):
+            is_valid = form.is_valid()
+        if is_valid:
+            return []
+        return [message
+                for messages in form.errors.values()
+                for message in messages]
+
+    def has_archives(self, files):
+        ''' Return whether any of the uploaded `files` are archives to be
+            extracted, with `archive_uploads` enabled
+        '''
+
+        return self.kwargs['archive_uploads'] and \
+            any(is_archive(file.name) for file in files)
+
+    def get_max_upload_size(self, name):
+        ''' Return the largest size in bytes accepted for an uploaded file
+            called `name`: `archive_max_size` for archives to be extracted,
+            otherwise `max_upload_size`
+        '''
+
+        if self.kwargs['archive_uploads'] and is_archive(name):
+            return self.kwargs['archive_max_size']
+        return self.kwargs['related_model_spec'].max_upload_size
+
+    def iter_archive(self, file, result):
+        ''' Check the archive `file` against the `ModelAdmin`'s archive
+            limits, then extract and validate each of its entries in turn,
+            recording the outcome for each under `entries` in the archive's
+            `result`. Yields each valid entry's file and result.
+        '''
+
+        form_class = self.get_form_class()
+        backend = BaseDirectUploadBackend(
+            self.kwargs['related_model_spec'], self.object)
+        archive = Archive(
+            file, self.kwargs['archive_max_entries'],
+            self.kwargs['archive_max_size'], self.kwargs['archive_max_ratio'])
+        with self.timed('extract'):
+            archive.check()
+
+        entries = iter(archive)
+        while True:
+            with self.timed('extract'):
+                name, entry, errors = next(entries, (None, None, None))
+            if name is None:
+                return
+
+            if entry is not None:
+                try:
+                    backend.validate_name(entry.name)
+                except ValidationError as e:
+                    errors = e.messages
+                else:
+                    errors = self.validate_upload(form_class, entry)
+                if errors:
+                    entry.close()
+
+            entry_result = {'name': name, 'success': not errors}
+            result['entries'].append(entry_result)
+            if errors:
+                entry_result['errors'] = errors
+                result['success'] = False
+                result['errors'] += [f'{name}: {message}'
+                                     for message in errors]
+                continue
+            yield entry, entry_result
+
+    def create_batch(self, batch):
+        ''' Create related model instances for a `batch` of validated files,
+            given as tuples of the file, its result and whether it was
+            extracted from an archive, as for `batch_valid`. Extracted files
+            are closed (deleting them) once they're stored. Returns the new
+            instances.
+        '''
+
+        try:
+            files, hashes, duplicates = \
+                self.deduplicate([file for file, _, _ in batch])
+            for index in duplicates:
+                batch[index][1]['duplicate'] = True
+            if not files:
+                return []
+            return self.create_related(files, hashes)
+        finally:
+            for file, _, extracted in batch:
+                if extracted:
+                    file.close()
+
+    def archive_valid(self, files, rejected=None):
+        ''' Handle uploads including archives (see `archive_uploads`). Each
+            archive is checked against the limits on its entries and size
+            before anything is extracted, then its entries are extracted one
+            at a time and validated as though they'd been uploaded on their
+            own. Valid entries, along with any other valid files sent, are
+            created in batches of `archive_batch_size`, so order values follow
+            the order of entries in the archive.
+
+            Returns a JSON list of per-file results, in the order the files
+            were sent, with the results for each archive's entries under
+            `entries`. An archive's result is only successful if all of its
+            entries were, though the valid entries are created regardless.
+            Archives are always extracted within the request, even with
+            `deferred_processing` enabled.
+        '''
+
+        form_class = self.get_form_class()
+
+        rejected = rejected or {}
+        remaining = iter(files)
+
+        results = []
+        batch = []
+        accepted = 0
+        instances = []
+        try:
+            for index in range(len(files) + len(rejected)):
+                if index in rejected:
+                    name, messages = rejected[index]
+                    results.append(
+                        {'name': name, 'success': False, 'errors': messages})
+                    continue
+
+                file = next(remaining)
+                if not is_archive(file.name):
+                    errors = self.validate_upload(form_class, file)
+                    result = {'name': file.name, 'success': not errors}
+                    results.append(result)
+                    if errors:
+                        result['errors'] = errors
+                    else:
+                        batch.append((file, result, False))
+                        accepted += 1
+                    continue
+
+                result = {'name': file.name, 'success': True, 'errors': [],
+                          'entries': []}
+                results.append(result)
+                try:
+                    for entry, entry_result in \
+                            self.iter_archive(file, result):
+                        batch.append((entry, entry_result, True))
+                        accepted += 1
+                        if len(batch) >= self.archive_batch_size:
+                            instances += self.create_batch(batch)
+                            batch = []
+                except ValidationError as e:
+                    result['success'] = False
+                    result['errors'] += e.messages
+
+            if batch:
+                instances += self.create_batch(batch)
+                batch = []
+        finally:
+            for file, _, extracted in batch:
+                if extracted:
+                    file.close()
+
+        if not accepted:
+            return JsonResponse({
+                'error': ' '.join(
+                    message for result in results
+                    for message in result.get('errors', [])) or
+                'No files found to upload',
+                'results': results,
+            }, status=400)
+
+        return JsonResponse({
+            'results': results,
+            'children': self.describe_related(instances),
+        })
+
+    def get_chunked_upload(self, upload_id):
+        ''' Return the `ChunkedUpload` for the given Dropzone `dzuuid`, scoped
+            to the current user and parent, or `None` if the identifier isn't
+            valid
+        '''
+
+        scope = '{0}-{1}-{2}'.format(
+            self.request.user.pk, self.model._meta.label_lower,
+            self.object.pk)
+        try:
+            return ChunkedUpload(scope, upload_id)
+        except ValueError:
+            return None
+
+    def chunk_status(self, upload_id):
+        ''' Report the chunks received so far for a chunked upload, so that
+            an interrupted upload can be resumed from where it left off
+        '''
+
+        upload = self.get_chunked_upload(upload_id)
+        if upload is None:
+            return HttpResponseBadRequest('Invalid upload identifier')
+
+        return JsonResponse({
+            'received': upload.received_chunks(),
+            'size': upload.size(),
+        })
+
+    def chunk_valid(self):
+        ''' Handle a single chunk of a file sent using Dropzone's `chunking`
+            mode, writing it into the staging area. Once every chunk has been
+            received the file is assembled, validated and used to create the
+            related model instance as per a normal upload.
+        '''
+
+        related_model_field_name = \
+            self.kwargs['related_model_field_name']
+
+        upload = self.get_chunked_upload(self.request.POST['dzuuid'])
+        chunk = self.request.FILES.get(related_model_field_name)
+        try:
+            index = int(self.request.POST['dzchunkindex'])
+            total_chunk_count = int(self.request.POST['dztotalchunkcount'])
+            offset = int(self.request.POST['dzchunkbyteoffset'])
+            total_file_size = int(self.request.POST['dztotalfilesize'])
+        except (KeyError, ValueError):
+            return HttpResponseBadRequest('Invalid chunk parameters')
+
+        if upload is None or chunk is None:
+            return HttpResponseBadRequest('Invalid upload identifier or chunk')
+        max_upload_size = self.get_max_upload_size(chunk.name)
+        if max_upload_size is not None and total_file_size > max_upload_size:
+            upload.delete()
+            return HttpResponseBadRequest(
+                'File is larger than the maximum upload size')
+        if not 0 <= index < total_chunk_count or \
+                offset < 0 or offset + chunk.size > total_file_size:
+            return HttpResponseBadRequest('Chunk is out of range')
+
+        upload.write_chunk(index, offset, chunk)
+
+        if not upload.is_complete(total_chunk_count):
+            return JsonResponse({'received': upload.received_chunks()})
+
+        if not upload.claim():
+            # Another request is finalizing the file; a 2xx response would
+            # have Dropzone report the file uploaded without its child
+            return self.repeated(None)
+
+        try:
+            if upload.size() != total_file_size:
+                return HttpResponseBadRequest(
+                    'Assembled file does not match the expected size')
+
+            with upload.open(chunk.name) as file:
+                if self.has_archives([file]):
+                    return self.archive_valid([file])
+                form = self.get_form_class()(
+                    files=MultiValueDict({related_model_field_name: [file]}))
+                with self.timed('validate'):
+                    is_valid = form.is_valid()
+                if is_valid:
+                    return self.form_valid(form)
+                return self.form_invalid(form)
+        finally:
+            upload.delete()
+
+    def get_direct_upload_backend(self):
+        ''' Return an instance of the `direct_upload_backend_class`
+            configured on the `ModelAdmin`, or `None` if direct uploads aren't
+            enabled
+        '''
+
+        backend_class = self.kwargs['direct_upload_backend_class']
+        if backend_class is None:
+            return None
+
+        info = self.model._meta.app_label, self.model._meta.model_name
+        upload_url = reverse(
+            'admin:{0}_{1}_drag_and_drop_direct'.format(*info),
+            kwargs={'pk': self.object.pk, 'direct_action': 'upload'},
+            current_app=self.model_admin.admin_site.name)
+        return backend_class(
+            self.kwargs['related_model_spec'], self.object,
+            upload_url=upload_url)
+
+    def direct_upload_valid(self):
+        ''' Handle the `target`, `upload` and `finalize` steps of a direct
+            upload, according to the `direct_action` URL kwarg
+        '''
+
+        backend = self.get_direct_upload_backend()
+        if backend is None:
+            raise Http404('Direct uploads are not enabled')
+
+        action = self.kwargs['direct_action']
+        if action == 'target':
+            return self.direct_target(backend)
+        if action == 'upload':
+            return self.direct_upload(backend)
+        return self.direct_finalize(backend)
+
+    def direct_target(self, backend):
+        ''' Issue a signed upload target for the file described by the
+            `name`, `content_type` and `size` POST parameters
+        '''
+
+        name = self.request.POST.get('name', '')
+        content_type = self.request.POST.get('content_type') or None
+        try:
+            size = int(self.request.POST['size'])
+        except (KeyError, ValueError):
+            size = None
+
+        if not name:
+            return JsonResponse({'error': 'No file name given'}, status=400)
+        try:
+            backend.validate_name(name)
+        except ValidationError as e:
+            return JsonResponse({'error': ' '.join(e.messages)}, status=400)
+
+        max_upload_size = backend.spec.max_upload_size
+        if max_upload_size is not None and \
+                (size is None or size > max_upload_size):
+            return JsonResponse(
+                {'error': 'File is larger than the maximum upload size'},
+                status=400)
+
+        return JsonResponse(backend.create_target(name, content_type, size))
+
+    def direct_upload(self, backend):
+        ''' Receive a file sent to the local signed upload endpoint (see
+            `LocalDirectUploadBackend`), validate it and save it to storage
+            under the signed key. Responds with the token for the finalize
+            step.
+        '''
+
+        related_model_field_name = \
+            self.kwargs['related_model_field_name']
+
+        try:
+            key = unsign_upload(
+                self.object, self.request.POST.get('token', ''),
+                purpose='upload')
+        except signing.BadSignature:
+            return HttpResponseBadRequest('Invalid or expired upload token')
+
+        form = self.get_form_class()(files=MultiValueDict(
+            {related_model_field_name: self.request.FILES.getlist('file')}))
+        with self.timed('validate'):
+            is_valid = form.is_valid()
+        if not is_valid:
+            return self.form_invalid(form)
+
+        with self.timed('store'):
+            name = backend.storage.save(
+                key, form.cleaned_data[related_model_field_name])
+        return JsonResponse({'token': sign_upload(self.object, name)})
+
+    def direct_finalize(self, backend):
+        ''' Create related model instances for files uploaded directly to
+            storage, given the tokens issued for them. The files themselves
+            aren't read; each is only checked to exist in storage. Each token
+            can only be used once (see `claim_upload`), and files which are
+            already attached to a related model instance are refused, so that
+            no two instances share a file.
+        '''
+
+        results = []
+        keys = []
+        for token in self.request.POST.getlist('token'):
+            try:
+                key = unsign_upload(self.object, token)
+            except signing.BadSignature:
+                results.append({'success': False,
+                                'errors': ['Invalid or expired upload token']})
+                continue
+            if not backend.exists(key):
+                results.append({'name': key, 'success': False,
+                                'errors': ['File has not been uploaded']})
+                continue
+            if not claim_upload(key):
+                results.append({'name': key, 'success': False,
+                                'errors': ['File has already been attached']})
+                continue
+            results.append({'name': key, 'success': True})
+            keys.append(key)
+
+        related_model_field_name = self.kwargs['related_model_field_name']
+        attached = set(
+            self.kwargs['related_model']._base_manager
+            .filter(**{f'{related_model_field_name}__in': keys})
+            .values_list(related_model_field_name, flat=True)) \
+            if keys else set()
+        for result in results:
+            if result.get('name') in attached:
+                result.update(success=False,
+                              errors=['File has already been attached'])
+        keys = [key for key in keys if key not in attached]
+
+        if not keys:
+            return JsonResponse({'results': results}, status=400)
+
+        try:
+            instances = self.create_related(keys)
+        except BaseException:
+            for key in keys:
+                release_upload(key)
+            raise
+
+        return JsonResponse({
+            'results': results,
+            'children': self.describe_related(instances),
+        })
+
+    def form_invalid(self, form):
+        ''' Combine all error messages from the form and return as the text of
+            an `HttpResponseBadRequest`
+        '''
+
+        combined_message = ''
+        for _, messages in form.errors.items():
+            for message in messages:
+                combined_message = f'{combined_message} {message}'
+        return HttpResponseBadRequest(combined_message)
+
+
+class AsyncDragAndDropView(DragAndDropView):
+    ''' A native async version of `DragAndDropView` for ASGI deployments,
+        enabled by setting `drag_and_drop_view_class` on the `ModelAdmin`.
+        The permission check, object lookup and single-file uploads run on
+        the event loop using Django's async ORM, while form validation (which
+        may decode images) and storage writes are explicitly offloaded to
+        threads. Because Django's async ORM can't run inside a transaction,
+        the order allocation and insert run together in a single
+        `sync_to_async` call once the file has been stored.
+
+        Chunked, batch and archive uploads are delegated to the sync
+        implementations in a thread.
+    '''
+
+    async def dispatch(self, request, *args, **kwargs):
+        ''' Perform the permission check of `PermissionRequiredMixin` without
+            blocking the event loop, then await the handler
+        '''
+
+        if request.method != 'POST':
+            return await self.adispatch_throttled(request, *args, **kwargs)
+
+        await sync_to_async(self.start_upload)()
+        response = await self.adispatch_idempotent(request, *args, **kwargs)
+        await sync_to_async(self.finish_upload)(response)
+        return response
+
+    async def adispatch_idempotent(self, request, *args, **kwargs):
+        try:
+            upload_key = self.get_upload_key()
+        except ValueError as e:
+            return HttpResponseBadRequest(str(e))
+        if upload_key is None:
+            return await self.adispatch_throttled(request, *args, **kwargs)
+
+        with self.timed('idempotency'):
+            claimed = await sync_to_async(upload_key.claim)()
+            if not claimed:
+                return self.repeated(
+                    await sync_to_async(upload_key.replay)())
+        try:
+            response = await self.adispatch_throttled(
+                request, *args, **kwargs)
+        except BaseException:
+            await sync_to_async(upload_key.release)()
+            raise
+        await sync_to_async(self.record_upload)(upload_key, response)
+        return response
+
+    async def adispatch_throttled(self, request, *args, **kwargs):
+        throttle = self.get_upload_throttle()
+        if throttle is None:
+            return await self.adispatch_upload(request, *args, **kwargs)
+
+        with self.timed('throttle'):
+            retry_after = await sync_to_async(throttle.acquire)()
+        if retry_after is not None:
+            return self.throttled(retry_after)
+        try:
+            return await self.adispatch_upload(request, *args, **kwargs)
+        finally:
+            await sync_to_async(throttle.release)()
+
+    async def adispatch_upload(self, request, *args, **kwargs):
+        ''' Apply CSRF protection once the upload has been admitted, as
+            `DragAndDropView.dispatch_upload` does, then handle the request
+        '''
+
+        return await csrf_protect(self.ahandle)(request, *args, **kwargs)
+
+    async def ahandle(self, request, *args, **kwargs):
+        if not await sync_to_async(self.has_permission)():
+            return await sync_to_async(self.handle_no_permission)()
+
+        if request.method.lower() in self.http_method_names:
+            handler = getattr(self, request.method.lower(),
+                              self.http_method_not_allowed)
+        else:
+            handler = self.http_method_not_allowed
+        response = handler(request, *args, **kwargs)
+        if asyncio.iscoroutine(response):
+            response = await response
+        return response
+
+    async def aget_object(self):
+        ''' Async counterpart to `SingleObjectMixin.get_object` '''
+
+        try:
+            with self.timed('object'):
+                return await self.get_queryset().filter(
+                    pk=self.kwargs.get(self.pk_url_kwarg)).aget()
+        except self.model.DoesNotExist:
+            raise Http404('No {0} found matching the query'.format(
+                self.model._meta.verbose_name))
+
+    async def get(self, request, *args, **kwargs):
+        self.object = await self.aget_object()
+
+        upload_id = request.GET.get('dzuuid')
+        if upload_id:
+            # Lists the staging area on disk
+            return await sync_to_async(self.chunk_status)(upload_id)
+
         info = self.model._meta.app_label, self.model._meta.model_name
         urlpattern = 'admin:{0}_{1}_change'.format(*info)
         return HttpResponseRedirect(
             reverse(urlpattern, kwargs={'object_id': self.object.pk}))
 
-    def get_form_class(self):
-        ''' Construct a dynamic form class with a field named using the
-            `related_model_field_name` kwarg passed in from the `ModelAdmin`,
-            and with a type appropriate to the underlying field on the related
-            model
+    async def post(self, request, *args, **kwargs):
+        self.object = await self.aget_object()
 
-            source: https://stackoverflow.com/a/27505090/258794
-        '''
+        # Parsing the request body may read from a spooled temporary file
+        await sync_to_async(self.receive)()
 
-        related_manager_field_name = \
-            self.kwargs['related_manager_field_name']
-        related_model_field_name = \
-            self.kwargs['related_model_field_name']
-        related_model = \
-            getattr(self.object, related_manager_field_name).field.model
-        related_model_field_class = \
-            related_model._meta.get_field(related_model_field_name)
+        if self.kwargs.get('direct_action'):
+            return await sync_to_async(self.direct_upload_valid)()
 
-        form_fields = {}
-        form_fields[related_model_field_name] = \
-            forms.ImageField() if isinstance(related_model_field_class, models.ImageField) else forms.FileField()  # noqa: E501
+        if 'dzuuid' in request.POST:
+            return await sync_to_async(self.chunk_valid)()
 
-        return type('DragAndDropForm', (forms.Form,), form_fields)
+        if 'content_hash' in request.POST and not request.FILES:
+            return await sync_to_async(self.preflight_valid)()
 
-    def get_permission_required(self):
-        ''' Ensure the user has `change` permission for the model '''
+        files = request.FILES.getlist(self.kwargs['related_model_field_name'])
+        if self.has_archives(files):
+            return await sync_to_async(self.archive_valid)(files)
+        if len(files) > 1:
+            return await sync_to_async(self.batch_valid)(files)
 
-        info = self.model._meta.app_label, self.model._meta.model_name
-        return ('{0}.change_{1}'.format(*info), )
+        form = self.get_form()
+        with self.timed('validate'):
+            is_valid = await sync_to_async(
+                form.is_valid, thread_sensitive=False)()
+        if is_valid:
+            return await self.aform_valid(form)
+        return self.form_invalid(form)
 
-    def post(self, request, *args, **kwargs):
-        ''' Make sure the `object` is available when handling POSTs (necessary
-            due to the composition of this class)
+    async def put(self, *args, **kwargs):
+        return await self.post(*args, **kwargs)
+
+    def create_instance(self, related_manager, instance):
+        ''' Allocate an order value (if required) and insert `instance` in a
+            single short transaction
         '''
 
-        self.object = self.get_object()
-        return super().post(request, *args, **kwargs)
+        related_model_order_field_name = \
+            self.kwargs['related_model_order_field_name']
 
-    def form_valid(self, form):
-        ''' Create a new instance of the related model via the related manager
-            of this view's model. Use the supplied `related_model_field_name`
-            as the field name when creating the instance.
+        if not related_model_order_field_name and \
+                self.kwargs['lean_uploads']:
+            with self.timed('transaction'), self.timed('insert'):
+                instance.save(force_insert=True)
+        else:
+            with self.timed('transaction'), transaction.atomic():
+                if related_model_order_field_name:
+                    setattr(instance, related_model_order_field_name,
+                            self.allocate_order(related_manager))
+                with self.timed('insert'):
+                    instance.save(force_insert=True)
+        self.created_instances = [*self.created_instances, instance]
+
+    async def aform_valid(self, form):
+        ''' Write the uploaded file to storage in a thread, then create the
+            related model instance; if the insert fails the stored file is
+            deleted again
         '''
 
         related_manager_field_name = \
             self.kwargs['related_manager_field_name']
         related_model_field_name = \
             self.kwargs['related_model_field_name']
-        related_model_order_field_name = \
-            self.kwargs['related_model_order_field_name']
 
-        file = self.request.FILES.get(related_model_field_name)
+        file = form.cleaned_data[related_model_field_name]
+
+        files, hashes, duplicates = \
+            await sync_to_async(self.deduplicate)([file])
+        if duplicates:
+            return JsonResponse({
+                'message': 'This file has already been uploaded',
+                'children': [],
+            })
+
+        if self.kwargs['deferred_processing']:
+            return JsonResponse(
+                await sync_to_async(self.defer_processing)(files, hashes),
+                status=202)
+
+        spec = self.kwargs['related_model_spec']
         related_manager = getattr(self.object, related_manager_field_name)
 
+        add_kwargs = self.get_foreign_key_kwargs()
+        if hashes:
+            add_kwargs[spec.related_model_hash_field_name] = hashes[0]
+        add_kwargs.update(await sync_to_async(
+            self.get_metadata_kwargs, thread_sensitive=False)(files[0]))
+        instance = spec.related_model(**add_kwargs)
+
+        if isinstance(files[0], str):
+            setattr(instance, related_model_field_name, files[0])
+            await sync_to_async(self.create_instance)(
+                related_manager, instance)
+            await sync_to_async(self.post_create, thread_sensitive=False)(
+                [instance])
+            return await self.acreated_response(instance)
+
+        field_file = getattr(instance, related_model_field_name)
+        with self.timed('store'):
+            await sync_to_async(field_file.save, thread_sensitive=False)(
+                file.name, file, save=False)
+
+        try:
+            await sync_to_async(self.create_instance)(
+                related_manager, instance)
+        except Exception:
+            await sync_to_async(field_file.delete, thread_sensitive=False)(
+                save=False)
+            raise
+
+        await sync_to_async(self.post_create, thread_sensitive=False)(
+            [instance])
+
+        return await self.acreated_response(instance)
+
+    async def acreated_response(self, instance):
+        return JsonResponse({
+            'message': 'Thanks, your file was processed',
+            'children': await sync_to_async(self.describe_related)(
+                [instance]),
+        })
+
+
+class DragAndDropJobStatusView(DragAndDropPermissionMixin,
+                               DragAndDropInlineMixin, View):
+    ''' Report the state of a deferred processing job (see
+        `deferred_processing`) as JSON, for the Dropzone UI to poll. Once the
+        job is done the created instances are described as `children`.
+    '''
+
+    model = None
+    model_admin = None
+
+    def get(self, request, *args, **kwargs):
+        job = get_job(self.kwargs['job_id'])
+        if job is None or job['model'] != self.model._meta.label_lower or \
+                job['pk'] != self.kwargs['pk']:
+            raise Http404('No such job')
+
+        if job.get('pks'):
+            self.object = self.model._default_manager.get(pk=job['pk'])
+            related_model = self.kwargs['related_model_spec'].related_model
+            instances = related_model._default_manager \
+                .filter(pk__in=job['pks']).order_by('pk')
+            job = {**job, 'children': self.describe_related(instances)}
+
+        return JsonResponse({'job': self.kwargs['job_id'], **job})
+
+
+class DragAndDropKeysetMixin(object):
+    ''' Order the parent's related model instances by
+        `related_model_order_field_name` (if set) and the primary key, and
+        select those following a given instance in that order, for keyset
+        pagination. Requires the related model info `kwargs`.
+    '''
+
+    def get_ordering(self):
+        order_field_name = self.kwargs['related_model_order_field_name']
+        if order_field_name:
+            return [order_field_name, 'pk']
+        return ['pk']
+
+    def get_keyset_filter(self, ordering, values):
+        ''' Return a `Q` object selecting the rows which come after the row
+            with the given `values` of the `ordering` fields
+        '''
+
+        keyset_filter = Q()
+        for index, field_name in enumerate(ordering):
+            condition = Q(**{f'{field_name}__gt': values[index]})
+            for previous_name, previous_value in \
+                    zip(ordering[:index], values[:index]):
+                condition &= Q(**{previous_name: previous_value})
+            keyset_filter |= condition
+        return keyset_filter
+
+
+class DragAndDropChildrenView(DragAndDropPermissionMixin,
+                              DragAndDropInlineMixin, DragAndDropKeysetMixin,
+                              View):
+    ''' List the parent's existing related model instances as JSON for the
+        lazy inline (see `lazy_inline_page_size`), a page at a time. Pages are
+        fetched using keyset pagination on `related_model_order_field_name`
+        (if set) and the primary key, so each page costs the same to fetch
+        however far through the list it is, and the total isn't counted.
+        Also used by the sortable strip (see `sortable_children`).
+    '''
+
+    model = None
+    model_admin = None
+
+    ''' Page size used for the sortable strip when the lazy inline isn't
+        enabled
+    '''
+    sortable_page_size = 100
+
+    def get(self, request, *args, **kwargs):
+        page_size = self.kwargs['lazy_inline_page_size']
+        if not page_size and self.kwargs['sortable_children']:
+            page_size = self.sortable_page_size
+        if not page_size:
+            raise Http404('The lazy inline is not enabled')
+
+        spec = self.kwargs['related_model_spec']
+        self.object = get_object_or_404(
+            self.model._default_manager, pk=self.kwargs['pk'])
+
+        ordering = self.get_ordering()
+        queryset = getattr(self.object, spec.related_manager_field_name) \
+            .only('pk', spec.foreign_key_name, spec.related_model_field_name,
+                  *ordering[:-1]) \
+            .order_by(*ordering)
+
+        cursor = request.GET.get('cursor')
+        if cursor:
+            try:
+                values = json.loads(cursor)
+                if not isinstance(values, list) or \
+                        len(values) != len(ordering):
+                    raise ValueError('Cursor does not match the ordering')
+                queryset = queryset.filter(
+                    self.get_keyset_filter(ordering, values))
+            except (TypeError, ValueError, ValidationError):
+                return HttpResponseBadRequest('Invalid cursor')
+
+        instances = list(queryset[:page_size + 1])
+        next_cursor = None
+        if len(instances) > page_size:
+            instances = instances[:page_size]
+            next_cursor = json.dumps(
+                [getattr(instances[-1], field_name)
+                 for field_name in ordering],
+                cls=DjangoJSONEncoder)
+
+        return JsonResponse({
+            'results': [self.describe_child(instance)
+                        for instance in instances],
+            'next': next_cursor,
+        })
+
+
+class DragAndDropDownloadView(DragAndDropPermissionMixin,
+                              DragAndDropKeysetMixin, View):
+    ''' Stream every file attached to the parent's related model instances
+        as a ZIP archive, in the order of `related_model_order_field_name`
+        (if set). The archive is written into the response as it's read from
+        storage, without a temporary file, and the related instances are
+        fetched a batch at a time using keyset pagination, so parents with
+        tens of thousands of children can be downloaded in constant memory.
+        Also used by the `download_related_files` admin action, for several
+        parents at once.
+    '''
+
+    model = None
+    model_admin = None
+
+    ''' Number of related model instances fetched per query '''
+    batch_size = 1000
+
+    def has_permission(self):
+        ''' Require `view` (or `change`) permission for the model, as the
+            admin does for its change view
+        '''
+
+        return self.model_admin.has_view_permission(self.request)
+
+    def iter_stored_names(self, parent):
+        ''' Yield the stored name of the file of each of the `parent`'s
+            related model instances, in order, a batch at a time
+        '''
+
+        spec = self.kwargs['related_model_spec']
+        ordering = self.get_ordering()
+        queryset = getattr(parent, spec.related_manager_field_name) \
+            .exclude(**{spec.related_model_field_name: ''}) \
+            .order_by(*ordering) \
+            .values_list(*ordering, spec.related_model_field_name)
+
+        values = None
+        while True:
+            batch = queryset
+            if values is not None:
+                batch = batch.filter(
+                    self.get_keyset_filter(ordering, values))
+            rows = list(batch[:self.batch_size])
+            for row in rows:
+                if row[-1]:
+                    yield row[-1]
+            if len(rows) < self.batch_size:
+                return
+            values = rows[-1][:-1]
+
+    def iter_entries(self, parents):
+        ''' Yield the name in the archive and stored name of each file to
+            download. With several `parents`, each one's files are placed in a
+            folder named after it.
+        '''
+
+        for parent in parents:
+            folder = ''
+            if len(parents) > 1:
+                folder = '{0}-{1}/'.format(parent.pk, slugify(str(parent)))
+            for stored_name in self.iter_stored_names(parent):
+                yield folder + stored_name, stored_name
+
+    def download(self, parents, filename):
+        ''' Return a `StreamingHttpResponse` of a ZIP archive called
+            `filename` of the files of the given `parents`
+        '''
+
+        storage = self.kwargs['related_model_spec'].related_model_field.storage
+        response = StreamingHttpResponse(
+            stream_zip(storage, self.iter_entries(parents)),
+            content_type='application/zip')
+        response['Content-Disposition'] = \
+            f'attachment; filename="{filename}"'
+        return response
+
+    def get(self, request, *args, **kwargs):
+        parent = get_object_or_404(
+            self.model._default_manager, pk=self.kwargs['pk'])
+        return self.download([parent], '{0}-{1}.zip'.format(
+            slugify(str(parent)) or parent.pk,
+            self.kwargs['related_manager_field_name']))
+
+
+class DragAndDropReorderView(DragAndDropPermissionMixin,
+                             DragAndDropInlineMixin, View):
+    ''' Apply a new order to existing related model instances, given as a
+        JSON object with a list of their `pks` in the desired order. The
+        instances keep the set of order values they already had between
+        them, which are reassigned in the new sequence, so any subset of the
+        parent's children (e.g. those loaded so far by the sortable strip)
+        can be reordered without affecting the rest. Only rows whose order
+        value actually changes are written, with a single `bulk_update`, in
+        one transaction which locks the rows being reordered.
+    '''
+
+    model = None
+    model_admin = None
+    http_method_names = ['post']
+
+    def get_pks(self):
+        ''' Parse the list of primary keys from the request body, raising
+            `ValueError` if it isn't valid
+        '''
+
+        related_model = self.kwargs['related_model_spec'].related_model
+        try:
+            pks = json.loads(self.request.body)['pks']
+            if not isinstance(pks, list):
+                raise TypeError('pks must be a list')
+            pks = [related_model._meta.pk.to_python(pk) for pk in pks]
+        except (KeyError, TypeError, ValueError, ValidationError):
+            raise ValueError('expected a JSON object with a list of pks')
+        if not pks or len(set(pks)) != len(pks):
+            raise ValueError('pks must be a non-empty list without repeats')
+        return pks
+
+    def get_order_values(self, values):
+        ''' Return the order values to reassign, i.e. the existing `values`
+            sorted, made distinct if they weren't already by bumping any
+            repeats (or missing values) up past the one before
+        '''
+
+        order_values = sorted(
+            values, key=lambda value: (value is None, value or 0))
+        for index, value in enumerate(order_values):
+            if index and (value is None or value <= order_values[index - 1]):
+                order_values[index] = order_values[index - 1] + 1
+            elif value is None:
+                order_values[index] = 0
+        return order_values
+
+    def post(self, request, *args, **kwargs):
+        order_field_name = self.kwargs['related_model_order_field_name']
+        if not order_field_name:
+            raise Http404('Ordering is not enabled')
+
+        spec = self.kwargs['related_model_spec']
+        self.object = get_object_or_404(
+            self.model._default_manager.only(self.model._meta.pk.name),
+            pk=self.kwargs['pk'])
+
+        try:
+            pks = self.get_pks()
+        except ValueError as e:
+            return HttpResponseBadRequest(f'Invalid order: {e}')
+
+        related_manager = getattr(self.object, spec.related_manager_field_name)
+        related_model = spec.related_model
+
         with transaction.atomic():
-            add_kwargs = {}
-            add_kwargs[related_model_field_name] = file
+            current = dict(
+                related_manager.filter(pk__in=pks)
+                .select_for_update()
+                .values_list('pk', order_field_name))
+            if len(current) != len(pks):
+                return HttpResponseBadRequest(
+                    'Invalid order: not all pks are children of this parent')
 
-            if related_model_order_field_name:
-                aggregation_name = f'{related_model_order_field_name}__max'
-                order = \
-                    (related_manager.aggregate(
-                        Max(related_model_order_field_name))
-                        [aggregation_name] or 0) + 1
-                add_kwargs[related_model_order_field_name] = order
+            changed = [
+                related_model(pk=pk, **{order_field_name: order})
+                for pk, order in zip(
+                    pks, self.get_order_values(current.values()))
+                if current[pk] != order
+            ]
+            related_model._default_manager.bulk_update(
+                changed, [order_field_name], batch_size=1000)
 
-            related_manager.create(**add_kwargs)
+        related_inline = self.get_related_inline()
+        return JsonResponse({
+            'updated': len(changed),
+            'prefix': related_inline[1] if related_inline else None,
+            'children': [
+                {'pk': str(instance.pk),
+                 'order': getattr(instance, order_field_name)}
+                for instance in changed
+            ],
+        })
 
-        return HttpResponse('Thanks, your file was processed')
 
-    def form_invalid(self, form):
-        ''' Combine all error messages from the form and return as the text of
-            an `HttpResponseBadRequest`
+class DragAndDropStagingView(DragAndDropThrottleMixin, PermissionRequiredMixin,
+                             View):
+    ''' Receive uploads made on the `add` view (see `add_view_uploads`),
+        before the parent exists. Each file is validated as for
+        `DragAndDropView.batch_valid` and moved into the staging area under
+        the form's token (see `StagedUploads`), to be attached once the
+        parent is saved. Responds with a JSON list of per-file results.
+        Requires `add` permission for the model.
+    '''
+
+    model = None
+    model_admin = None
+    http_method_names = ['post']
+
+    def get_permission_required(self):
+        info = self.model._meta.app_label, self.model._meta.model_name
+        return ('{0}.add_{1}'.format(*info), )
+
+    def get_upload_keys(self, files):
+        ''' Return the keys the client sent in the `X-Upload-Key` header to
+            identify the `files` (see `DragAndDropView.get_upload_key`), or
+            new random keys if it didn't send one for each file
         '''
 
-        combined_message = ''
-        for _, messages in form.errors.items():
-            for message in messages:
-                combined_message = f'{combined_message} {message}'
-        return HttpResponseBadRequest(combined_message)
+        value = self.request.headers.get('X-Upload-Key')
+        keys = parse_upload_keys(value) if value else []
+        if len(keys) != len(files):
+            keys = [uuid.uuid4().hex for _ in files]
+        return keys
+
+    def post(self, request, *args, **kwargs):
+        if not self.kwargs['add_view_uploads']:
+            raise Http404('Uploads on the add view are not enabled')
+
+        related_model_field_name = self.kwargs['related_model_field_name']
+        files = request.FILES.getlist(related_model_field_name)
+        token = request.POST.get(FORM_TOKEN_FIELD, '')
+        try:
+            staged = StagedUploads(request.user.pk, token)
+            keys = self.get_upload_keys(files)
+        except ValueError as e:
+            return HttpResponseBadRequest(str(e))
+
+        # The form's token stands in for the parent's primary key
+        throttle = self.build_upload_throttle(f'add-{token}')
+        if throttle is not None:
+            retry_after = throttle.acquire()
+            if retry_after is not None:
+                return self.throttled(retry_after)
+
+        try:
+            results = self.stage(staged, files, keys)
+        finally:
+            if throttle is not None:
+                throttle.release()
+
+        if not any(result['success'] for result in results):
+            return JsonResponse({
+                'error': ' '.join(
+                    message for result in results
+                    for message in result.get('errors', [])) or
+                'No files found to upload',
+                'results': results,
+            }, status=400)
+        return JsonResponse({'results': results})
+
+    def stage(self, staged, files, keys):
+        ''' Validate each of the `files` and stage the valid ones under
+            their `keys`, returning a list of per-file results. Archives
+            aren't accepted, as they're extracted into the parent's children
+            as they're received.
+        '''
+
+        related_model_field_name = self.kwargs['related_model_field_name']
+        form_class = self.kwargs['related_model_spec'].form_class
+
+        results = []
+        for index, (file, key) in enumerate(zip(files, keys)):
+            if self.kwargs['archive_uploads'] and is_archive(file.name):
+                errors = ['Archives can be uploaded once the {0} has been '
+                          'saved.'.format(self.model._meta.verbose_name)]
+            else:
+                form = form_class(files=MultiValueDict(
+                    {related_model_field_name: [file]}))
+                errors = [message
+                          for messages in form.errors.values()
+                          for message in messages]
+            if errors:
+                results.append(
+                    {'name': file.name, 'success': False, 'errors': errors})
+                continue
+            staged.add(key, file, index)
+            results.append({'name': file.name, 'success': True})
+        return results
+
+
+def async_admin_view(admin_site, view):
+    ''' Equivalent of `AdminSite.admin_view` for async views, which the
+        admin's own wrapper doesn't support. As there, views marked
+        `csrf_exempt` aren't CSRF protected. Requires Django 5.0 or later,
+        where the `never_cache` and `csrf_protect` decorators are async-aware.
+    '''
+
+    if DJANGO_VERSION < (5, 0):
+        raise ImproperlyConfigured(
+            'AsyncDragAndDropView requires Django 5.0 or later')
+
+    async def inner(request, *args, **kwargs):
+        if not await sync_to_async(admin_site.has_permission)(request):
+            from django.contrib.auth.views import redirect_to_login
+            return redirect_to_login(
+                request.get_full_path(),
+                reverse('admin:login', current_app=admin_site.name))
+        return await view(request, *args, **kwargs)
+
+    inner = never_cache(inner)
+    if not getattr(view, 'csrf_exempt', False):
+        inner = csrf_protect(inner)
+    return update_wrapper(inner, view)
 
 
 class DragAndDropRelatedImageMixin(object):
@@ -143,6 +1979,14 @@ class DragAndDropRelatedImageMixin(object):
     '''
     related_model_order_field_name = None
 
+    ''' Class used to allocate values of `related_model_order_field_name` to
+        new instances of the related model; see `dragndrop_related.ordering`
+
+        The default locks the parent's row while allocating, so concurrent
+        uploads to the same parent don't receive duplicate values
+    '''
+    related_model_order_allocator_class = ParentLockOrderAllocator
+
     ''' Customise the `acceptedFiles` option passed to the Dropzone library in
         the `add` or `change` templates
 
@@ -151,6 +1995,69 @@ class DragAndDropRelatedImageMixin(object):
     '''
     dropzone_accepted_files = None
 
+    ''' Have Dropzone send several files per request (its `uploadMultiple`
+        mode), so that they can be validated together and created with a
+        single bulk insert
+
+        Defaults to `False` to send one file per request
+    '''
+    dropzone_upload_multiple = False
+
+    ''' Customise the `parallelUploads` option passed to the Dropzone library,
+        i.e. the number of files sent at once (or per request, when
+        `dropzone_upload_multiple` is enabled)
+
+        Defaults to `None` to use the Dropzone default
+    '''
+    dropzone_parallel_uploads = None
+
+    ''' Have Dropzone split files into chunks and send them one at a time
+        (its `chunking` mode), so that very large files aren't limited by the
+        size of a single request and failed chunks can be retried on their
+        own. Chunks are staged on the local filesystem (see the
+        `DRAGNDROP_RELATED_STAGING_DIR` setting) until the file is complete.
+
+        Defaults to `False`; note that Dropzone doesn't support combining this
+        with `dropzone_upload_multiple`
+    '''
+    dropzone_chunking = False
+
+    ''' Customise the `chunkSize` option (in bytes) passed to the Dropzone
+        library when `dropzone_chunking` is enabled
+
+        Defaults to `None` to use the Dropzone default
+    '''
+    dropzone_chunk_size = None
+
+    ''' Customise the `resizeWidth`, `resizeHeight`, `resizeQuality` (0 to 1)
+        and `resizeMimeType` options passed to the Dropzone library, so that
+        images are scaled down and recompressed in the browser before they're
+        uploaded
+
+        Each defaults to `None` to upload images as they are
+    '''
+    dropzone_resize_width = None
+    dropzone_resize_height = None
+    dropzone_resize_quality = None
+    dropzone_resize_mime_type = None
+
+    ''' The largest file in bytes the drag-and-drop view will accept. This is
+        enforced on the server for all kinds of upload, and in the browser
+        unless images are being resized there.
+
+        Defaults to `None` for no limit
+    '''
+    max_upload_size = None
+
+    ''' The largest image dimensions the drag-and-drop view will accept, as
+        a `(width, height)` tuple, when the field on the related model is an
+        `ImageField`. Dimensions are read from the image's header, so
+        oversized images are rejected without being decoded.
+
+        Defaults to `None` for no limit
+    '''
+    max_image_dimensions = None
+
     ''' Determine how to load the Dropzone library
 
         By default the library's JS and CSS assets will be loaded from the
@@ -162,22 +2069,249 @@ class DragAndDropRelatedImageMixin(object):
     dropzone_use_static_files = \
         getattr(settings, 'DRAGNDROP_RELATED_USE_STATIC_FILES', False)
 
+    ''' The view class used to handle drag-and-drop uploads. Set this to
+        `AsyncDragAndDropView` when serving the admin via ASGI to handle
+        uploads without tying up a thread per request (requires Django 5.0 or
+        later).
+    '''
+    drag_and_drop_view_class = DragAndDropView
+
+    ''' Hand uploaded files off to a processing backend (see
+        `dragndrop_related.processing` and the
+        `DRAGNDROP_RELATED_PROCESSING_BACKEND` setting) rather than creating
+        related model instances within the request. Uploads then receive a
+        `202 Accepted` response and the Dropzone UI polls for the outcome.
+
+        Defaults to `False`
+    '''
+    deferred_processing = False
+
+    ''' Have the browser upload files straight to storage using short-lived
+        signed targets issued by this backend class, rather than sending them
+        via Django; see `dragndrop_related.direct`. The drag-and-drop view
+        then only creates the related model instances once the uploads are
+        complete.
+
+        Defaults to `None` to upload via Django as normal
+    '''
+    direct_upload_backend_class = None
+
+    ''' Name of a field on the *related* model (e.g. a `CharField` with a
+        `max_length` of 64, ideally indexed) in which to record the SHA-256
+        hash of each uploaded file's contents
+
+        Defaults to `None` to skip hashing uploads
+    '''
+    related_model_hash_field_name = None
+
+    ''' Dict naming the fields on the *related* model in which to record
+        metadata about each uploaded file as it's created, keyed by any of
+        `width`, `height` and `format` (for images, as read from their
+        header), `size` (in bytes) and `placeholder` (an image's average
+        colour, as a hex string such as `#a0b1c2`, for display while it
+        loads), e.g. `{'width': 'width', 'height': 'height'}`. The
+        `dragndrop_metadata` command records it for existing instances.
+
+        Defaults to `None` to record no metadata
+    '''
+    related_model_metadata_fields = None
+
+    ''' Skip uploads whose content has been uploaded before, according to
+        `related_model_hash_field_name`. Set to `'parent'` to skip files
+        already attached to the same parent, or to `'storage'` to
+        additionally reuse the stored file of an identical upload attached to
+        any parent rather than storing another copy.
+
+        Defaults to `None` to disable deduplication
+    '''
+    deduplicate_uploads = None
+
+    ''' Renditions to generate for each uploaded image when the field on the
+        related model is an `ImageField`, as a dict of presets keyed by name,
+        e.g. `{'large': {'size': (2048, 2048), 'format': 'JPEG',
+        'quality': 85}}`; see `dragndrop_related.renditions.render`.
+        Renditions are generated on a process pool and stored next to the
+        original, e.g. `photo.large.jpg`.
+
+        Defaults to `None` to store uploads as they are
+    '''
+    image_renditions = None
+
+    ''' Stream files straight into the storage of the related model's field
+        as they're received, using `StorageUploadHandler`, rather than having
+        Django spool them to memory or a temporary file before they're copied
+        into storage. Invalid names, oversized files (see `max_upload_size`)
+        and, for images, invalid or oversized images (see
+        `max_image_dimensions`) are rejected from the name or the first bytes
+        of the file, before the rest is written.
+
+        Defaults to `False`; not supported in combination with
+        `dropzone_chunking` or `AsyncDragAndDropView`
+    '''
+    streaming_uploads = False
+
+    ''' Show the parent's existing related model instances in a lightweight,
+        lazily loaded list of this many at a time (loading more as the user
+        scrolls), in place of the `ModelAdmin`'s inline for the related
+        model, which renders a full form for every one. Useful for parents
+        with thousands of related instances, where the change view would
+        otherwise grow with each upload.
+
+        Defaults to `None` to leave the inlines as they are
+    '''
+    lazy_inline_page_size = None
+
+    ''' Name of one of the `image_renditions` to show in the lazy inline
+        rather than the original images
+
+        Defaults to `None` to show the original images
+    '''
+    lazy_inline_thumbnail_rendition = None
+
+    ''' Do as little database work per upload as possible: the parent is
+        fetched with only its primary key (rather than every column; other
+        fields are loaded if accessed), new children are given the parent's
+        foreign key value rather than the parent instance, and uploads which
+        don't need order values allocated are inserted without an explicit
+        transaction. Useful where the parent has large columns, or where
+        subclasses don't rely on the parent's fields when creating children.
+
+        Defaults to `False`
+    '''
+    lean_uploads = False
+
+    ''' Show a strip of the parent's existing related model instances (with
+        thumbnails, for images) above the drop zone, which can be dragged to
+        reorder them. The new order is saved straight away via the reorder
+        endpoint, which only writes the rows whose order changes. Requires
+        `related_model_order_field_name`. When `lazy_inline_page_size` is set
+        the lazy inline itself becomes sortable instead.
+
+        Defaults to `False`
+    '''
+    sortable_children = False
+
+    ''' Maximum number of uploads each user may have in progress at once;
+        further uploads are refused with `429 Too Many Requests` and retried
+        by the drop zone after a delay. Counts are kept in the cache (see the
+        `DRAGNDROP_RELATED_CACHE` setting), which must be shared between
+        processes for the limit to apply across them.
+
+        Defaults to `None` for no limit
+    '''
+    max_concurrent_uploads_per_user = None
+
+    ''' Maximum number of uploads which may be in progress at once to any one
+        parent instance, by any user, handled as for
+        `max_concurrent_uploads_per_user`
+
+        Defaults to `None` for no limit
+    '''
+    max_concurrent_uploads_per_parent = None
+
+    ''' Limit the rate at which each user may upload with a token bucket,
+        given as a tuple of the number of uploads which may be made in a
+        burst and the number of seconds it takes to allow that many again,
+        e.g. `(60, 60)` for an average of one per second. Uploads over the
+        limit are refused with `429 Too Many Requests` and a `Retry-After`
+        header, and retried by the drop zone.
+
+        Defaults to `None` for no limit
+    '''
+    upload_rate_limit = None
+
+    ''' Accept ZIP and tar archives (optionally compressed with gzip, bzip2
+        or xz) in the drop zone and extract each file in them into a new
+        related model instance, validating entries as though they'd been
+        uploaded individually. Entries are extracted one at a time to
+        temporary files rather than into memory, and created in batches.
+
+        Defaults to `False`; not supported in combination with
+        `direct_upload_backend_class`
+    '''
+    archive_uploads = False
+
+    ''' Limits applied to each archive before anything is extracted from it,
+        to guard against archive bombs: the most entries it may contain, the
+        most bytes its entries may add up to, and the most times its own size
+        that its entries may add up to. `archive_max_size` is also the largest
+        archive which may be uploaded.
+    '''
+    archive_max_entries = 1000
+    archive_max_size = 1024 ** 3
+    archive_max_ratio = 100
+
+    ''' Add a `download_related_files` action to the change list, to
+        download the files of the selected objects' related model instances
+        as a streamed ZIP archive, with a folder per object. Each change view
+        also links to a download of its own files.
+
+        Defaults to `True`
+    '''
+    download_action = True
+
+    ''' Enable drag-and-drop uploads on the `add` view. Files are validated
+        and staged as they're dropped, while the rest of the form is filled
+        in, then attached to the new object when it's saved, with a single
+        `bulk_create` and order values allocated in the order they were
+        dropped. Staged files of forms which are never saved are removed by
+        the `dragndrop_cleanup` command. Can't be combined with
+        `direct_upload_backend_class` or `dropzone_chunking`.
+
+        Defaults to `False`
+    '''
+    add_view_uploads = False
+
+    def get_related_model_spec(self):
+        ''' Resolve the related model according to the values of
+            `related_manager_field_name`, `related_model_field_name` and
+            `related_model_order_field_name`. This happens once per
+            `ModelAdmin`; configuration errors are also reported by the system
+            checks at startup.
+        '''
+
+        spec = getattr(self, '_related_model_spec', None)
+        if spec is None:
+            spec = build_related_model_spec(
+                self.model, self.related_manager_field_name,
+                self.related_model_field_name,
+                self.related_model_order_field_name,
+                self.related_model_hash_field_name,
+                self.max_upload_size,
+                self.max_image_dimensions,
+                self.related_model_metadata_fields)
+            self._related_model_spec = spec
+        return spec
+
     def get_related_model_info(self):
-        ''' Access the related model according to the value of
-            `related_manager_field_name` and build a dict of useful info
+        ''' Build a dict of useful info about the related model from its
+            `RelatedModelSpec`
         '''
 
-        related_model = \
-            getattr(self.model, self.related_manager_field_name).field.model
+        spec = self.get_related_model_spec()
+        related_model = spec.related_model
 
-        related_model_field_class = \
-            related_model._meta.get_field(self.related_model_field_name)
         if self.dropzone_accepted_files:
             dropzone_accepted_files = self.dropzone_accepted_files
-        elif isinstance(related_model_field_class, models.ImageField):
+        elif spec.is_image:
             dropzone_accepted_files = 'image/*'
         else:
             dropzone_accepted_files = None
+        if dropzone_accepted_files and self.archive_uploads:
+            dropzone_accepted_files = ','.join(
+                [dropzone_accepted_files, *ARCHIVE_EXTENSIONS])
+
+        dropzone_resize = any(option is not None for option in (
+            self.dropzone_resize_width, self.dropzone_resize_height,
+            self.dropzone_resize_quality, self.dropzone_resize_mime_type))
+        if self.max_upload_size is not None and not dropzone_resize:
+            # Dropzone's `maxFilesize` is in MiB
+            max_filesize = self.max_upload_size
+            if self.archive_uploads:
+                max_filesize = max(max_filesize, self.archive_max_size)
+            dropzone_max_filesize = max_filesize / (1024 * 1024)
+        else:
+            dropzone_max_filesize = None
 
         return {
             'related_model':
@@ -192,22 +2326,349 @@ class DragAndDropRelatedImageMixin(object):
                 self.related_model_field_name,
             'related_model_order_field_name':
                 self.related_model_order_field_name,
+            'related_model_order_allocator_class':
+                self.related_model_order_allocator_class,
+            'related_model_metadata_fields':
+                self.related_model_metadata_fields,
+            'related_model_spec':
+                spec,
             'change_form_template_parent':
                 self.change_form_template_parent,
             'dropzone_accepted_files':
                 dropzone_accepted_files,
+            'dropzone_upload_multiple':
+                self.dropzone_upload_multiple,
+            'dropzone_parallel_uploads':
+                self.dropzone_parallel_uploads,
+            'dropzone_chunking':
+                self.dropzone_chunking,
+            'dropzone_chunk_size':
+                self.dropzone_chunk_size,
+            'dropzone_resize_width':
+                self.dropzone_resize_width,
+            'dropzone_resize_height':
+                self.dropzone_resize_height,
+            'dropzone_resize_quality':
+                self.dropzone_resize_quality,
+            'dropzone_resize_mime_type':
+                self.dropzone_resize_mime_type,
+            'dropzone_max_filesize':
+                dropzone_max_filesize,
+            'deferred_processing':
+                self.deferred_processing,
+            'direct_upload_backend_class':
+                self.direct_upload_backend_class,
+            'direct_upload':
+                self.direct_upload_backend_class is not None,
+            'deduplicate_uploads':
+                self.deduplicate_uploads,
+            'image_renditions':
+                self.image_renditions if spec.is_image else None,
+            'streaming_uploads':
+                self.streaming_uploads,
+            'lazy_inline_page_size':
+                self.lazy_inline_page_size,
+            'lazy_inline_thumbnail_rendition':
+                self.lazy_inline_thumbnail_rendition,
+            'lean_uploads':
+                self.lean_uploads,
+            'sortable_children':
+                self.sortable_children,
+            'max_concurrent_uploads_per_user':
+                self.max_concurrent_uploads_per_user,
+            'max_concurrent_uploads_per_parent':
+                self.max_concurrent_uploads_per_parent,
+            'upload_rate_limit':
+                self.upload_rate_limit,
+            'archive_uploads':
+                self.archive_uploads,
+            'archive_max_entries':
+                self.archive_max_entries,
+            'archive_max_size':
+                self.archive_max_size,
+            'archive_max_ratio':
+                self.archive_max_ratio,
+            'download_action':
+                self.download_action,
+            'add_view_uploads':
+                self.add_view_uploads,
             'dropzone_use_static_files':
                 self.dropzone_use_static_files,
         }
 
+    def check(self, **kwargs):
+        ''' Add our own system checks to those of the `ModelAdmin` '''
+
+        return [
+            *super().check(**kwargs),
+            *self._check_drag_and_drop_related(),
+        ]
+
+    def _check_drag_and_drop_related(self):
+        errors = []
+
+        try:
+            self.get_related_model_spec()
+        except RelatedModelSpecError as e:
+            errors.append(checks.Error(
+                str(e), obj=self.__class__, id=e.check_id))
+
+        if self.dropzone_upload_multiple and self.dropzone_chunking:
+            errors.append(checks.Error(
+                "'dropzone_upload_multiple' and 'dropzone_chunking' can't "
+                "both be enabled.",
+                hint='Dropzone.js does not support chunked uploads of '
+                     'multiple files per request.',
+                obj=self.__class__,
+                id='dragndrop_related.E005'))
+
+        if self.deduplicate_uploads not in \
+                (None, DEDUPLICATE_PARENT, DEDUPLICATE_STORAGE):
+            errors.append(checks.Error(
+                "'deduplicate_uploads' must be None, '{0}' or '{1}'.".format(
+                    DEDUPLICATE_PARENT, DEDUPLICATE_STORAGE),
+                obj=self.__class__,
+                id='dragndrop_related.E009'))
+        elif self.deduplicate_uploads and \
+                not self.related_model_hash_field_name:
+            errors.append(checks.Error(
+                "'deduplicate_uploads' requires "
+                "'related_model_hash_field_name' to be set.",
+                obj=self.__class__,
+                id='dragndrop_related.E010'))
+
+        try:
+            is_image = self.get_related_model_spec().is_image
+        except RelatedModelSpecError:
+            is_image = True
+        if self.image_renditions and not is_image:
+            errors.append(checks.Warning(
+                "'image_renditions' is ignored as '{0}' is not an "
+                "ImageField.".format(self.related_model_field_name),
+                obj=self.__class__,
+                id='dragndrop_related.W001'))
+        if self.max_image_dimensions and not is_image:
+            errors.append(checks.Warning(
+                "'max_image_dimensions' is ignored as '{0}' is not an "
+                "ImageField.".format(self.related_model_field_name),
+                obj=self.__class__,
+                id='dragndrop_related.W002'))
+        image_metadata_keys = [
+            key for key in (self.related_model_metadata_fields or {})
+            if key in IMAGE_METADATA_KEYS]
+        if image_metadata_keys and not is_image:
+            errors.append(checks.Warning(
+                "'related_model_metadata_fields' keys {0} are ignored as "
+                "'{1}' is not an ImageField.".format(
+                    ', '.join(image_metadata_keys),
+                    self.related_model_field_name),
+                obj=self.__class__,
+                id='dragndrop_related.W003'))
+
+        if self.lazy_inline_thumbnail_rendition and \
+                self.lazy_inline_thumbnail_rendition not in \
+                (self.image_renditions or {}):
+            errors.append(checks.Error(
+                "'lazy_inline_thumbnail_rendition' must be one of the "
+                "'image_renditions'.",
+                obj=self.__class__,
+                id='dragndrop_related.E011'))
+
+        if self.streaming_uploads and self.dropzone_chunking:
+            errors.append(checks.Error(
+                "'streaming_uploads' can't be combined with "
+                "'dropzone_chunking'.",
+                hint='Chunked uploads are assembled in the staging area.',
+                obj=self.__class__,
+                id='dragndrop_related.E012'))
+        if self.streaming_uploads and \
+                getattr(self.drag_and_drop_view_class, 'view_is_async', False):
+            errors.append(checks.Error(
+                "'streaming_uploads' isn't supported by async drag-and-drop "
+                "views.",
+                obj=self.__class__,
+                id='dragndrop_related.E013'))
+
+        if self.upload_rate_limit is not None and not (
+                isinstance(self.upload_rate_limit, (list, tuple)) and
+                len(self.upload_rate_limit) == 2 and
+                all(value > 0 for value in self.upload_rate_limit)):
+            errors.append(checks.Error(
+                "'upload_rate_limit' must be a tuple of the number of uploads "
+                "and a number of seconds.",
+                obj=self.__class__,
+                id='dragndrop_related.E014'))
+
+        if self.sortable_children and \
+                not self.related_model_order_field_name:
+            errors.append(checks.Error(
+                "'sortable_children' requires "
+                "'related_model_order_field_name'.",
+                obj=self.__class__,
+                id='dragndrop_related.E015'))
+
+        if self.archive_uploads and \
+                self.direct_upload_backend_class is not None:
+            errors.append(checks.Error(
+                "'archive_uploads' can't be combined with "
+                "'direct_upload_backend_class'.",
+                hint='Direct uploads are attached without being read, so '
+                     'archives would not be extracted.',
+                obj=self.__class__,
+                id='dragndrop_related.E016'))
+
+        if self.add_view_uploads and \
+                (self.direct_upload_backend_class is not None or
+                 self.dropzone_chunking):
+            errors.append(checks.Error(
+                "'add_view_uploads' can't be combined with "
+                "'direct_upload_backend_class' or 'dropzone_chunking'.",
+                hint='Direct and chunked uploads are made to an existing '
+                     'object.',
+                obj=self.__class__,
+                id='dragndrop_related.E017'))
+
+        if self.direct_upload_backend_class is not None and \
+                (self.dropzone_upload_multiple or self.dropzone_chunking):
+            errors.append(checks.Error(
+                "'direct_upload_backend_class' can't be combined with "
+                "'dropzone_upload_multiple' or 'dropzone_chunking'.",
+                obj=self.__class__,
+                id='dragndrop_related.E007'))
+
+        if getattr(self.drag_and_drop_view_class, 'view_is_async', False) \
+                and DJANGO_VERSION < (5, 0):
+            errors.append(checks.Error(
+                'Async drag-and-drop views require Django 5.0 or later.',
+                obj=self.__class__,
+                id='dragndrop_related.E006'))
+
+        return errors
+
+    def get_actions(self, request):
+        ''' Add the `download_related_files` action, if `download_action` is
+            enabled and the user may view the objects
+        '''
+
+        actions = super().get_actions(request)
+        if self.download_action and self.actions is not None and \
+                IS_POPUP_VAR not in request.GET and \
+                self.has_view_permission(request):
+            actions['download_related_files'] = \
+                self.get_action('download_related_files')
+        return actions
+
+    def download_related_files(self, request, queryset):
+        ''' Admin action streaming the files of the selected objects' related
+            model instances as a ZIP archive (see `DragAndDropDownloadView`)
+        '''
+
+        view = DragAndDropDownloadView(
+            model=self.model, model_admin=self, request=request,
+            kwargs=self.get_related_model_info())
+        return view.download(
+            list(queryset.order_by('pk')), '{0}-{1}.zip'.format(
+                self.model._meta.model_name,
+                self.related_manager_field_name))
+
+    download_related_files.short_description = \
+        'Download related files of selected %(verbose_name_plural)s'
+
+    def get_inline_instances(self, request, obj=None):
+        ''' Leave out the inline for the related model on the `change` view
+            when `lazy_inline_page_size` is set, since the lazy inline takes
+            its place
+        '''
+
+        inline_instances = super().get_inline_instances(request, obj)
+        if not self.lazy_inline_page_size or obj is None:
+            return inline_instances
+
+        spec = self.get_related_model_spec()
+        return [inline for inline in inline_instances
+                if inline.model is not spec.related_model or
+                inline.fk_name not in (None, spec.foreign_key_name)]
+
     def add_view(self, request, form_url='', extra_context=None):
-        ''' Add our helpful related model info to the `add` view context '''
+        ''' Add our helpful related model info to the `add` view context.
+            With `add_view_uploads` enabled, also add the token identifying
+            the files uploaded on the form (kept when the form is redisplayed
+            with errors) and the names of those staged so far.
+        '''
 
         extra_context = extra_context or {}
         extra_context = {**extra_context, **self.get_related_model_info()}
+        if self.add_view_uploads:
+            staged = self.get_staged_uploads(request)
+            if staged is None:
+                token = uuid.uuid4().hex
+                staged_names = []
+            else:
+                token = request.POST[FORM_TOKEN_FIELD]
+                staged_names = [entry['name'] for entry in staged.entries()]
+            extra_context.update(
+                drag_and_drop_token=token, staged_uploads=staged_names)
         return super().add_view(
             request, form_url=form_url, extra_context=extra_context)
 
+    def get_staged_uploads(self, request):
+        ''' Return the `StagedUploads` for the token posted with the `add`
+            form, or `None` if there isn't a valid one
+        '''
+
+        if request.method != 'POST':
+            return None
+        try:
+            return StagedUploads(
+                request.user.pk, request.POST.get(FORM_TOKEN_FIELD, ''))
+        except ValueError:
+            return None
+
+    def save_related(self, request, form, formsets, change):
+        ''' Once the `add` view's transaction commits, attach any files
+            uploaded on it (see `add_view_uploads`) to the newly saved object,
+            so that they're only written to storage if the object is
+            actually created
+        '''
+
+        super().save_related(request, form, formsets, change)
+        if not self.add_view_uploads or change:
+            return
+        staged = self.get_staged_uploads(request)
+        if staged is not None:
+            obj = form.instance
+            transaction.on_commit(
+                lambda: self.attach_staged_uploads(request, obj, staged))
+
+    def attach_staged_uploads(self, request, obj, staged):
+        ''' Create related model instances on `obj` for the files `staged`
+            on the `add` view, using the drag-and-drop view so the configured
+            ordering, deduplication and renditions apply as for any upload,
+            then clear the staging area. Runs after the `add` view's
+            transaction has committed, so errors are logged rather than
+            raised; the staged files are then left to expire. Returns the new
+            instances.
+        '''
+
+        files = staged.open()
+        view = self.drag_and_drop_view_class(
+            model=self.model, model_admin=self, request=request)
+        view.kwargs = self.get_related_model_info()
+        view.object = obj
+        try:
+            items, hashes, _ = view.deduplicate(files)
+            instances = view.create_related(items, hashes) if items else []
+        except Exception:
+            logger.exception(
+                'Unable to attach the files uploaded on the add view to %r',
+                obj)
+            return []
+        finally:
+            for file in files:
+                file.close()
+        staged.delete()
+        return instances
+
     def change_view(self, request, object_id, form_url='', extra_context=None):
         ''' Add our helpful related model info to the `change` view context '''
 
@@ -219,16 +2680,70 @@ class DragAndDropRelatedImageMixin(object):
     def get_urls(self):
         ''' Define a custom route for drag-and-drop upload POSTs and attach
             our custom view to it. Pass the related model info dict to the view
-            as extra `kwargs`.
+            as extra `kwargs`. If the related model is misconfigured, the
+            routes are left out so that the URLconf still loads and the system
+            checks can report the error.
         '''
 
+        try:
+            related_model_info = self.get_related_model_info()
+        except RelatedModelSpecError:
+            return super().get_urls()
+
         info = self.model._meta.app_label, self.model._meta.model_name
-        return [
+        view = self.drag_and_drop_view_class.as_view(
+            model=self.model, model_admin=self)
+        # CSRF protection is applied by the view itself, once the upload has
+        # been admitted and any upload handler installed
+        view.csrf_exempt = True
+        if getattr(self.drag_and_drop_view_class, 'view_is_async', False):
+            view = async_admin_view(self.admin_site, view)
+        else:
+            view = self.admin_site.admin_view(view)
+
+        urls = []
+        if self.add_view_uploads:
+            urls.append(
+                re_path(r'^add/drag-and-drop/$',
+                        self.admin_site.admin_view(
+                            DragAndDropStagingView.as_view(
+                                model=self.model, model_admin=self)),
+                        related_model_info,
+                        name='{0}_{1}_drag_and_drop_add'.format(*info)))
+
+        return urls + [
             re_path(r'^(?P<pk>\d+)/drag-and-drop/$',
-                    self.admin_site.admin_view(DragAndDropView.as_view(
-                        model=self.model)),
-                    self.get_related_model_info(),
+                    view,
+                    related_model_info,
                     name='{0}_{1}_drag_and_drop'.format(*info)),
+            re_path(r'^(?P<pk>\d+)/drag-and-drop/direct/(?P<direct_action>target|upload|finalize)/$',  # noqa: E501
+                    view,
+                    related_model_info,
+                    name='{0}_{1}_drag_and_drop_direct'.format(*info)),
+            re_path(r'^(?P<pk>\d+)/drag-and-drop/children/$',
+                    self.admin_site.admin_view(
+                        DragAndDropChildrenView.as_view(
+                            model=self.model, model_admin=self)),
+                    related_model_info,
+                    name='{0}_{1}_drag_and_drop_children'.format(*info)),
+            re_path(r'^(?P<pk>\d+)/drag-and-drop/download/$',
+                    self.admin_site.admin_view(
+                        DragAndDropDownloadView.as_view(
+                            model=self.model, model_admin=self)),
+                    related_model_info,
+                    name='{0}_{1}_drag_and_drop_download'.format(*info)),
+            re_path(r'^(?P<pk>\d+)/drag-and-drop/reorder/$',
+                    self.admin_site.admin_view(
+                        DragAndDropReorderView.as_view(
+                            model=self.model, model_admin=self)),
+                    related_model_info,
+                    name='{0}_{1}_drag_and_drop_reorder'.format(*info)),
+            re_path(r'^(?P<pk>\d+)/drag-and-drop/jobs/(?P<job_id>[0-9a-f]{32})/$',  # noqa: E501
+                    self.admin_site.admin_view(
+                        DragAndDropJobStatusView.as_view(
+                            model=self.model, model_admin=self)),
+                    related_model_info,
+                    name='{0}_{1}_drag_and_drop_job'.format(*info)),
         ] + super().get_urls()
 
 
@@ -0,0 +1,152 @@
+import json
+import os
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings
+
+from benchmarks.runner import ADMINS, Benchmark, compare, parse_size
+
+
+class Command(BaseCommand):
+    ''' Benchmark `DragAndDropView` through the example admins, reporting
+        throughput, latency, queries and peak memory per upload across file
+        sizes and parent sizes as JSON, and optionally checking correctness
+        under concurrent load. Runs against a throwaway test database and
+        `MEDIA_ROOT`, so the project's own data is left alone; use
+        `--settings` to benchmark against another database backend.
+    '''
+
+    help = 'Benchmark drag-and-drop uploads through the example admins'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--admin', action='append', choices=sorted(ADMINS),
+            help='Example admin to benchmark; may be repeated (defaults to '
+                 'all of them)')
+        parser.add_argument(
+            '--sizes', default='10K,1M,10M',
+            help='Comma-separated file sizes to upload, e.g. 10K,1M,1G '
+                 '(default: %(default)s)')
+        parser.add_argument(
+            '--parent-sizes', default='0,1000,10000',
+            help='Comma-separated numbers of existing children on the parent '
+                 'uploaded to (default: %(default)s)')
+        parser.add_argument(
+            '--uploads', type=int, default=20,
+            help='Number of uploads per scenario (default: %(default)s)')
+        parser.add_argument(
+            '--concurrency', type=int, default=1,
+            help='Number of concurrent clients for an additional concurrent '
+                 'run of each scenario, checked for lost files and duplicate '
+                 'orders (default: %(default)s, for no concurrent run)')
+        parser.add_argument(
+            '--lean', action='store_true',
+            help='Run the admins with lean_uploads enabled')
+        parser.add_argument(
+            '--max-queries', type=int,
+            help='Fail any scenario in which an upload makes more than this '
+                 'many queries')
+        parser.add_argument(
+            '--reorder', action='store_true',
+            help='Also benchmark reordering the children of ordered parents')
+        parser.add_argument(
+            '--storage-delay', type=float, default=0,
+            help='Seconds to add to each write to storage, to simulate '
+                 'remote storage (default: %(default)s)')
+        parser.add_argument(
+            '--async', action='store_true', dest='async_view',
+            help='Also run each scenario through AsyncDragAndDropView under '
+                 'ASGI, from --concurrency clients at once, comparing its '
+                 'throughput with the sync view')
+        parser.add_argument(
+            '--overhead', type=int, default=0, metavar='ITERATIONS',
+            help='Also measure the per-request cost of resolving each '
+                 "admin's related model metadata, with and without it being "
+                 'cached, over this many iterations (default: %(default)s, '
+                 'for none)')
+        parser.add_argument(
+            '--renditions', type=int, default=0, metavar='IMAGES',
+            help='Also measure rendition throughput in images per second per '
+                 'core, rendering this many photos (default: %(default)s, '
+                 'for none)')
+        parser.add_argument(
+            '--rendition-megapixels', type=float, default=12,
+            help='Size of the photos rendered by --renditions, in megapixels '
+                 '(default: %(default)s)')
+        parser.add_argument(
+            '--output',
+            help='File to write the JSON results to (defaults to stdout)')
+        parser.add_argument(
+            '--compare', metavar='BASELINE',
+            help='JSON results of an earlier run to compare against')
+
+    def handle(self, *args, **options):
+        try:
+            sizes = [parse_size(size) for size in options['sizes'].split(',')]
+            parent_sizes = [int(size)
+                            for size in options['parent_sizes'].split(',')]
+        except ValueError as e:
+            raise CommandError(f'Invalid size: {e}')
+
+        baseline = None
+        if options['compare']:
+            with open(options['compare']) as file:
+                baseline = json.load(file)
+
+        work_dir = tempfile.mkdtemp(prefix='dragndrop_benchmark')
+        test_settings = connection.settings_dict.setdefault('TEST', {})
+        if connection.vendor == 'sqlite':
+            # Use a file rather than the default in-memory database, which
+            # can't be written to concurrently by the clients' threads
+            test_settings['NAME'] = os.path.join(work_dir, 'db.sqlite3')
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(
+            verbosity=0, autoclobber=True, serialize=False)
+        try:
+            with override_settings(
+                    MEDIA_ROOT=os.path.join(work_dir, 'media'),
+                    DRAGNDROP_RELATED_STAGING_DIR=os.path.join(
+                        work_dir, 'staging'),
+                    ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']):
+                results = Benchmark(
+                    options['admin'] or sorted(ADMINS), sizes, parent_sizes,
+                    options['uploads'], options['concurrency'], work_dir,
+                    lean=options['lean'], max_queries=options['max_queries'],
+                    reorder=options['reorder'],
+                    storage_delay=options['storage_delay'],
+                    async_view=options['async_view'],
+                    overhead=options['overhead'],
+                    renditions=options['renditions'],
+                    rendition_megapixels=options['rendition_megapixels'],
+                    log=self.stderr.write).run()
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+        output = json.dumps(results, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as file:
+                file.write(output)
+        else:
+            self.stdout.write(output)
+
+        if baseline is not None:
+            for key, mode, metric, old, new in compare(baseline, results):
+                change = (new - old) / old * 100 if old else 0
+                self.stderr.write('{0} {1} {2}: {3:.4g} -> {4:.4g} '
+                                  '({5:+.1f}%)'.format(
+                                      '/'.join(map(str, key)), mode, metric,
+                                      old, new, change))
+
+        if any(not result[mode]['correctness']['passed']
+               for result in results['results']
+               for mode in ('sequential', 'concurrent', 'async')
+               if mode in result) or \
+                any(not reorder['passed']
+                    for result in results['results']
+                    for reorder in result.get('reorder', {}).values()):
+            raise CommandError('Correctness checks failed; see the results')
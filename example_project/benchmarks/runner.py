@@ -0,0 +1,751 @@
+import asyncio
+import json
+import math
+import os
+import platform
+import shutil
+import statistics
+import sys
+import threading
+import time
+import tracemalloc
+import types
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from importlib.metadata import PackageNotFoundError, version
+
+import django
+from django.conf import settings
+from django.contrib import admin
+from django.contrib.admin.sites import AdminSite
+from django.contrib.auth import get_user_model
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.core.handlers.asgi import ASGIHandler
+from django.core.handlers.wsgi import WSGIHandler
+from django.db import connection
+from django.db.models import Count
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import path
+from django.utils.crypto import get_random_string
+
+from dragndrop_related.renditions import generate_renditions
+from dragndrop_related.signals import post_upload
+from dragndrop_related.views import AsyncDragAndDropView
+from gallery.models import Album
+from library.models import Collection
+
+
+''' The example admins the benchmark drives, with the kind of file each
+    accepts and the values of `related_model_order_field_name` to run them
+    with (`None` to run without ordering)
+'''
+ADMINS = {
+    'gallery': (Album, 'image', ('order', None)),
+    'library': (Collection, 'pdf', (None,)),
+}
+
+BOUNDARY = 'dragndrop-benchmark-boundary'
+
+''' Presets the rendition benchmark renders each image with '''
+RENDITION_PRESETS = {
+    'large': {'size': (2048, 2048)},
+    'thumb': {'size': (240, 240), 'format': 'WEBP'},
+}
+
+''' Reorderings applied to a parent's children by the reorder benchmark,
+    given the list of their pks in their current order
+'''
+REORDERS = {
+    'swap': lambda pks: [*pks[:len(pks) // 2 - 1], pks[len(pks) // 2],
+                         pks[len(pks) // 2 - 1], *pks[len(pks) // 2 + 1:]],
+    'move_to_start': lambda pks: [pks[-1], *pks[:-1]],
+    'reverse': lambda pks: pks[::-1],
+}
+
+
+def parse_size(value):
+    ''' Parse a size such as `10K`, `5M` or `1G` into a number of bytes '''
+
+    units = {'K': 2 ** 10, 'M': 2 ** 20, 'G': 2 ** 30}
+    value = value.strip().upper()
+    if value[-1:] in units:
+        return int(float(value[:-1]) * units[value[-1]])
+    return int(value)
+
+
+def percentile(values, fraction):
+    ''' Return the `fraction` percentile of `values` by the nearest-rank
+        method
+    '''
+
+    ordered = sorted(values)
+    index = max(0, math.ceil(fraction * len(ordered)) - 1)
+    return ordered[index]
+
+
+def write_photo(path, megapixels):
+    ''' Write a JPEG of roughly `megapixels` million pixels to `path`, with
+        smooth detail like a photo's (random noise scaled up), so that it
+        compresses and decodes like one
+    '''
+
+    from PIL import Image
+
+    width = int(math.sqrt(megapixels * 1e6 * 4 / 3))
+    height = width * 3 // 4
+    Image.frombytes('RGB', (64, 48), os.urandom(64 * 48 * 3)) \
+        .resize((width, height), Image.BICUBIC) \
+        .save(path, 'JPEG', quality=90)
+
+
+def write_payload(path, kind, size, field_name):
+    ''' Write a multipart request body uploading a file of roughly `size`
+        bytes for `field_name` to `path`: an image of random noise (which
+        doesn't compress) or a PDF padded with random bytes. Returns the size
+        of the file in the body, or `None` if an image that large would
+        exceed Pillow's decompression bomb limit.
+    '''
+
+    from PIL import Image
+
+    if kind == 'image':
+        side = max(1, int(math.sqrt(size / 3)))
+        if side * side > Image.MAX_IMAGE_PIXELS:
+            return None
+        filename, content_type = 'benchmark.png', 'image/png'
+    else:
+        filename, content_type = 'benchmark.pdf', 'application/pdf'
+
+    with open(path, 'wb') as body:
+        body.write(
+            f'--{BOUNDARY}\r\nContent-Disposition: form-data; '
+            f'name="{field_name}"; filename="{filename}"\r\n'
+            f'Content-Type: {content_type}\r\n\r\n'.encode())
+        start = body.tell()
+        if kind == 'image':
+            Image.frombytes('RGB', (side, side), os.urandom(side * side * 3)) \
+                .save(body, 'PNG', compress_level=1)
+        else:
+            body.write(b'%PDF-1.4\n')
+            remaining = max(0, size - 16)
+            while remaining:
+                block = min(remaining, 2 ** 20)
+                body.write(os.urandom(block))
+                remaining -= block
+            body.write(b'\n%%EOF\n')
+        payload_size = body.tell() - start
+        body.write(f'\r\n--{BOUNDARY}--\r\n'.encode())
+    return payload_size
+
+
+class Benchmark(object):
+    ''' Drive `DragAndDropView` through the example `gallery` and `library`
+        admins with real multipart requests via Django's WSGI handler, so
+        that the full middleware, upload handler and admin stack is measured.
+        Each admin is registered afresh on a private `AdminSite` per
+        scenario, so that its options can be varied without affecting the
+        project's own admin.
+
+        With `lean` set the admins are run with `lean_uploads` enabled, and
+        with `max_queries` set a scenario only passes if no upload made more
+        queries than that. With `reorder` set, the children of each ordered
+        parent are then reordered via the reorder endpoint. With
+        `storage_delay` set, each write to storage takes that many seconds
+        longer, to simulate remote storage. With `async_view` set, each
+        scenario is also run through `AsyncDragAndDropView` served by
+        Django's ASGI handler, from `concurrency` clients at once, to compare
+        its throughput with the sync view's. With `overhead` set, the
+        per-request cost of resolving each admin's related model metadata is
+        also measured over that many iterations. With `renditions` set,
+        the throughput of generating renditions is measured by rendering
+        that many photos of `rendition_megapixels` each.
+
+        Must be run against a disposable database and `MEDIA_ROOT`, since it
+        creates parents with many children; the management command takes
+        care of this.
+    '''
+
+    def __init__(self, admins, sizes, parent_sizes, uploads, concurrency,
+                 work_dir, lean=False, max_queries=None, reorder=False,
+                 storage_delay=0, async_view=False, overhead=0,
+                 renditions=0, rendition_megapixels=12, log=None):
+        self.admins = admins
+        self.sizes = sizes
+        self.parent_sizes = parent_sizes
+        self.uploads = uploads
+        self.concurrency = concurrency
+        self.work_dir = work_dir
+        self.lean = lean
+        self.max_queries = max_queries
+        self.reorder = reorder
+        self.storage_delay = storage_delay
+        self.async_view = async_view
+        self.overhead = overhead
+        self.renditions = renditions
+        self.rendition_megapixels = rendition_megapixels
+        self.log = log or (lambda message: None)
+        self.handler = WSGIHandler()
+
+        user = get_user_model()._default_manager.create_superuser(
+            'benchmark', 'benchmark@example.com', get_random_string(32))
+        client = Client()
+        client.force_login(user)
+        self.csrf_token = get_random_string(32)
+        self.cookie = '{0}={1}; {2}={3}'.format(
+            settings.SESSION_COOKIE_NAME,
+            client.cookies[settings.SESSION_COOKIE_NAME].value,
+            settings.CSRF_COOKIE_NAME, self.csrf_token)
+
+    def get_environment(self):
+        try:
+            package_version = version('django-dragndrop-related')
+        except PackageNotFoundError:
+            package_version = None
+        return {
+            'timestamp': datetime.now(timezone.utc).isoformat(),
+            'package_version': package_version,
+            'django_version': django.get_version(),
+            'python_version': platform.python_version(),
+            'platform': platform.platform(),
+            'database': connection.vendor,
+            'cpu_count': os.cpu_count(),
+        }
+
+    def register(self, model, order_field_name, view_class=None):
+        ''' Register a copy of the project's admin for `model` with the given
+            ordering (and `drag_and_drop_view_class`, if given) on a fresh
+            `AdminSite`, returning the `ModelAdmin` and a URLconf module
+            routing to it
+        '''
+
+        admin_class = type(admin.site._registry[model])
+        options = {
+            'related_model_order_field_name': order_field_name,
+            'lean_uploads': self.lean,
+        }
+        if view_class is not None:
+            options['drag_and_drop_view_class'] = view_class
+        site = AdminSite(name='admin')
+        site.register(
+            model, type(admin_class.__name__, (admin_class,), options))
+        urlconf = types.ModuleType('benchmark_urls')
+        urlconf.urlpatterns = [path('admin/', site.urls)]
+        return site._registry[model], urlconf
+
+    @contextmanager
+    def delay_storage(self, storage):
+        ''' Make each write to `storage` take `storage_delay` seconds longer
+            while in effect
+        '''
+
+        if not self.storage_delay:
+            yield
+            return
+
+        save = storage._save
+
+        def delayed_save(name, content):
+            time.sleep(self.storage_delay)
+            return save(name, content)
+
+        storage._save = delayed_save
+        try:
+            yield
+        finally:
+            del storage._save
+
+    def create_parent(self, model_admin, children):
+        ''' Create a parent with `children` related instances, whose files
+            needn't exist
+        '''
+
+        spec = model_admin.get_related_model_spec()
+        parent = model_admin.model._default_manager.create(title='Benchmark')
+        related_model = spec.related_model
+        instances = []
+        for index in range(children):
+            instance = related_model(**{
+                spec.foreign_key_name: parent,
+                spec.related_model_field_name: f'benchmark/{index}',
+            })
+            if spec.related_model_order_field_name:
+                setattr(instance, spec.related_model_order_field_name, index)
+            instances.append(instance)
+        related_model._default_manager.bulk_create(instances, batch_size=1000)
+        return parent
+
+    def post(self, url, body_path,
+             content_type=f'multipart/form-data; boundary={BOUNDARY}'):
+        ''' POST the body in `body_path` to `url`, returning the response
+            status code and the elapsed time in seconds
+        '''
+
+        environ = {
+            'REQUEST_METHOD': 'POST',
+            'PATH_INFO': url,
+            'CONTENT_TYPE': content_type,
+            'CONTENT_LENGTH': str(os.path.getsize(body_path)),
+            'SERVER_NAME': 'testserver',
+            'SERVER_PORT': '80',
+            'HTTP_COOKIE': self.cookie,
+            'HTTP_X_CSRFTOKEN': self.csrf_token,
+            'wsgi.url_scheme': 'http',
+            'wsgi.errors': sys.stderr,
+        }
+        status = []
+        with open(body_path, 'rb') as body:
+            environ['wsgi.input'] = body
+            started = time.perf_counter()
+            response = self.handler(
+                environ, lambda line, headers: status.append(line))
+            for _ in response:
+                pass
+            response.close()
+            elapsed = time.perf_counter() - started
+        return int(status[0].split()[0]), elapsed
+
+    async def apost(self, handler, url, body_path,
+                    content_type=f'multipart/form-data; boundary={BOUNDARY}'):
+        ''' POST the body in `body_path` to `url` through the ASGI `handler`,
+            returning the response status code and the elapsed time in
+            seconds
+        '''
+
+        scope = {
+            'type': 'http',
+            'asgi': {'version': '3.0'},
+            'http_version': '1.1',
+            'method': 'POST',
+            'scheme': 'http',
+            'path': url,
+            'raw_path': url.encode(),
+            'root_path': '',
+            'query_string': b'',
+            'server': ('testserver', 80),
+            'client': ('127.0.0.1', 0),
+            'headers': [
+                (b'host', b'testserver'),
+                (b'content-type', content_type.encode()),
+                (b'content-length',
+                 str(os.path.getsize(body_path)).encode()),
+                (b'cookie', self.cookie.encode()),
+                (b'x-csrftoken', self.csrf_token.encode()),
+            ],
+        }
+        status = []
+        received = False
+
+        with open(body_path, 'rb') as body:
+            async def receive():
+                nonlocal received
+                if received:
+                    # The client stays connected until the response is sent
+                    await asyncio.get_running_loop().create_future()
+                data = body.read(2 ** 20)
+                received = not data
+                return {'type': 'http.request', 'body': data,
+                        'more_body': bool(data)}
+
+            async def send(message):
+                if message['type'] == 'http.response.start':
+                    status.append(message['status'])
+
+            started = time.perf_counter()
+            await handler(scope, receive, send)
+            elapsed = time.perf_counter() - started
+        return status[0], elapsed
+
+    def check(self, model_admin, parent, last_pk, statuses):
+        ''' Check the children created since `last_pk` against the responses
+            received: one per successful upload, each with its file in
+            storage, and with no duplicate order values among the parent's
+            children
+        '''
+
+        spec = model_admin.get_related_model_spec()
+        children = getattr(parent, spec.related_manager_field_name).all()
+        created = list(children.filter(pk__gt=last_pk).values_list(
+            spec.related_model_field_name, flat=True))
+        storage = spec.related_model_field.storage
+        duplicate_orders = 0
+        if spec.related_model_order_field_name:
+            duplicate_orders = children.values(
+                spec.related_model_order_field_name,
+            ).annotate(
+                count=Count('pk'),
+            ).filter(count__gt=1).count()
+        succeeded = statuses.count(200)
+        missing_files = sum(1 for name in created if not storage.exists(name))
+        return {
+            'succeeded': succeeded,
+            'failed': len(statuses) - succeeded,
+            'created': len(created),
+            'missing_files': missing_files,
+            'duplicate_orders': duplicate_orders,
+            'passed': len(created) == succeeded and not missing_files and
+            not duplicate_orders,
+        }
+
+    def summarise(self, latencies, wall_time):
+        return {
+            'uploads_per_second': len(latencies) / wall_time,
+            'latency_p50': percentile(latencies, 0.5),
+            'latency_p99': percentile(latencies, 0.99),
+            'latency_mean': statistics.mean(latencies),
+        }
+
+    def run_sequential(self, model_admin, parent, url, body_path):
+        ''' Upload one file at a time, measuring queries per upload and then
+            peak Python memory use for one further upload (separately, as
+            tracing memory allocations slows requests down)
+        '''
+
+        spec = model_admin.get_related_model_spec()
+        children = getattr(parent, spec.related_manager_field_name)
+        last_pk = children.order_by('-pk').values_list('pk', flat=True) \
+            .first() or 0
+
+        statuses, latencies, queries, transactions = [], [], [], []
+
+        def record_transaction(metrics, **kwargs):
+            transactions.append(metrics.phases.get('transaction', 0))
+
+        post_upload.connect(record_transaction)
+        started = time.perf_counter()
+        try:
+            for _ in range(self.uploads):
+                with CaptureQueriesContext(connection) as captured:
+                    status, elapsed = self.post(url, body_path)
+                statuses.append(status)
+                latencies.append(elapsed)
+                queries.append(len(captured))
+        finally:
+            post_upload.disconnect(record_transaction)
+        wall_time = time.perf_counter() - started
+
+        tracemalloc.start()
+        try:
+            status, _ = self.post(url, body_path)
+            _, peak_memory = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        statuses.append(status)
+
+        correctness = self.check(model_admin, parent, last_pk, statuses)
+        if self.max_queries is not None:
+            correctness['max_queries'] = self.max_queries
+            correctness['passed'] = correctness['passed'] and \
+                max(queries) <= self.max_queries
+
+        return {
+            **self.summarise(latencies, wall_time),
+            'queries_per_upload': statistics.mean(queries),
+            'queries_max': max(queries),
+            'transaction_p50': percentile(transactions, 0.5),
+            'transaction_p99': percentile(transactions, 0.99),
+            'peak_memory': peak_memory,
+            'correctness': correctness,
+        }
+
+    def run_reorder(self, model_admin, parent, url):
+        ''' Reorder the parent's children via the reorder endpoint in each of
+            the ways in `REORDERS`, in turn
+        '''
+
+        spec = model_admin.get_related_model_spec()
+        order_field_name = spec.related_model_order_field_name
+        pks = list(
+            getattr(parent, spec.related_manager_field_name)
+            .order_by(order_field_name, 'pk')
+            .values_list('pk', flat=True))
+        body_path = os.path.join(self.work_dir, 'reorder')
+
+        results = {}
+        for name, reorder in REORDERS.items():
+            reordered = reorder(pks)
+            with open(body_path, 'w') as body:
+                json.dump({'pks': reordered}, body)
+            with CaptureQueriesContext(connection) as captured:
+                status, elapsed = self.post(
+                    url, body_path, content_type='application/json')
+            current = getattr(parent, spec.related_manager_field_name) \
+                .order_by(order_field_name, 'pk') \
+                .values_list('pk', flat=True)
+            results[name] = {
+                'children': len(pks),
+                'moved': sum(1 for old, new in zip(pks, reordered)
+                             if old != new),
+                'latency': elapsed,
+                'queries': len(captured),
+                'passed': status == 200 and list(current) == reordered,
+            }
+            pks = reordered
+        os.remove(body_path)
+        return results
+
+    def run_concurrent(self, model_admin, parent, url, body_path):
+        ''' Upload from `concurrency` clients at once, then check nothing was
+            lost or given a duplicate order under load
+        '''
+
+        spec = model_admin.get_related_model_spec()
+        children = getattr(parent, spec.related_manager_field_name)
+        last_pk = children.order_by('-pk').values_list('pk', flat=True) \
+            .first() or 0
+
+        lock = threading.Lock()
+        statuses, latencies = [], []
+
+        def upload(_):
+            status, elapsed = self.post(url, body_path)
+            with lock:
+                statuses.append(status)
+                latencies.append(elapsed)
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            list(executor.map(upload, range(self.uploads)))
+        wall_time = time.perf_counter() - started
+
+        return {
+            **self.summarise(latencies, wall_time),
+            'clients': self.concurrency,
+            'correctness': self.check(model_admin, parent, last_pk, statuses),
+        }
+
+    def run_async(self, model_admin, parent, url, body_path):
+        ''' Upload from `concurrency` clients at once through
+            `AsyncDragAndDropView` served by Django's ASGI handler, on a
+            single event loop, then check nothing was lost or given a
+            duplicate order under load
+        '''
+
+        spec = model_admin.get_related_model_spec()
+        children = getattr(parent, spec.related_manager_field_name)
+        last_pk = children.order_by('-pk').values_list('pk', flat=True) \
+            .first() or 0
+
+        handler = ASGIHandler()
+        statuses, latencies = [], []
+
+        async def run():
+            semaphore = asyncio.Semaphore(self.concurrency)
+
+            async def upload():
+                async with semaphore:
+                    status, elapsed = await self.apost(
+                        handler, url, body_path)
+                statuses.append(status)
+                latencies.append(elapsed)
+
+            await asyncio.gather(*(upload() for _ in range(self.uploads)))
+
+        started = time.perf_counter()
+        asyncio.run(run())
+        wall_time = time.perf_counter() - started
+
+        return {
+            **self.summarise(latencies, wall_time),
+            'clients': self.concurrency,
+            'correctness': self.check(model_admin, parent, last_pk, statuses),
+        }
+
+    def run_overhead(self, model_admin):
+        ''' Measure the per-request cost of resolving the related model
+            metadata and upload form class, which `add_view`, `change_view`
+            and each upload need: both rebuilt for every request, as they
+            were before being cached in a `RelatedModelSpec` per
+            `ModelAdmin`, and taken from the cached spec. Returns the mean
+            time per request of each, in seconds.
+        '''
+
+        def rebuilt():
+            model_admin._related_model_spec = None
+            return model_admin.get_related_model_info()[
+                'related_model_spec'].form_class
+
+        def cached():
+            return model_admin.get_related_model_info()[
+                'related_model_spec'].form_class
+
+        result = {'iterations': self.overhead}
+        for name, resolve in (('rebuilt', rebuilt), ('cached', cached)):
+            resolve()
+            started = time.perf_counter()
+            for _ in range(self.overhead):
+                resolve()
+            result[name] = (time.perf_counter() - started) / self.overhead
+        result['speedup'] = result['rebuilt'] / result['cached']
+        return result
+
+    def run_renditions(self):
+        ''' Measure the throughput of `generate_renditions` on the process
+            pool, rendering `renditions` copies of a photo with
+            `RENDITION_PRESETS` from and to local storage once the pool's
+            workers have started. Returns the images rendered per second,
+            overall and per worker process.
+        '''
+
+        storage = FileSystemStorage(
+            location=os.path.join(self.work_dir, 'renditions'))
+        path = os.path.join(self.work_dir, 'photo.jpg')
+        write_photo(path, self.rendition_megapixels)
+        field_files = []
+        for index in range(self.renditions + 1):
+            with open(path, 'rb') as file:
+                field_files.append(types.SimpleNamespace(
+                    storage=storage,
+                    name=storage.save(f'photo-{index}.jpg', File(file))))
+        os.remove(path)
+
+        workers = getattr(settings, 'DRAGNDROP_RELATED_RENDITION_WORKERS',
+                          None) or os.cpu_count()
+        # Start the pool's workers, which are spawned on first use
+        generate_renditions(field_files[:1], RENDITION_PRESETS)
+        started = time.perf_counter()
+        failed = generate_renditions(field_files[1:], RENDITION_PRESETS)
+        wall_time = time.perf_counter() - started
+        shutil.rmtree(storage.location)
+
+        images_per_second = self.renditions / wall_time
+        return {
+            'images': self.renditions,
+            'megapixels': self.rendition_megapixels,
+            'presets': len(RENDITION_PRESETS),
+            'workers': workers,
+            'failed': len(failed),
+            'wall_time': wall_time,
+            'images_per_second': images_per_second,
+            'images_per_second_per_core': images_per_second / workers,
+        }
+
+    def run(self):
+        ''' Run every combination of admin, ordering, file size and parent
+            size, returning the results as a JSON-serialisable dict
+        '''
+
+        results = []
+        overhead = []
+        for name in self.admins:
+            model, kind, orderings = ADMINS[name]
+            if self.overhead:
+                self.log(f'{name} overhead')
+                model_admin, _ = self.register(model, orderings[0])
+                overhead.append(
+                    {'admin': name, **self.run_overhead(model_admin)})
+            field_name = admin.site._registry[model] \
+                .get_related_model_spec().related_model_field_name
+            for size in self.sizes:
+                body_path = os.path.join(self.work_dir, f'{kind}-{size}')
+                payload_size = write_payload(body_path, kind, size, field_name)
+                for order_field_name in orderings:
+                    model_admin, urlconf = self.register(
+                        model, order_field_name)
+                    if self.async_view:
+                        async_admin, async_urlconf = self.register(
+                            model, order_field_name, AsyncDragAndDropView)
+                    for children in self.parent_sizes:
+                        result = {
+                            'admin': name,
+                            'ordered': order_field_name is not None,
+                            'lean': self.lean,
+                            'storage_delay': self.storage_delay,
+                            'file_size': size,
+                            'payload_size': payload_size,
+                            'parent_size': children,
+                            'uploads': self.uploads,
+                        }
+                        results.append(result)
+                        if payload_size is None:
+                            result['skipped'] = 'exceeds MAX_IMAGE_PIXELS'
+                            continue
+
+                        self.log('{admin} ordered={ordered} lean={lean} '
+                                 'file_size={file_size} '
+                                 'parent_size={parent_size}'.format(**result))
+                        storage = model_admin.get_related_model_spec() \
+                            .related_model_field.storage
+                        with override_settings(ROOT_URLCONF=urlconf), \
+                                self.delay_storage(storage):
+                            parent = self.create_parent(model_admin, children)
+                            url = f'/admin/{model._meta.app_label}/' \
+                                f'{model._meta.model_name}/{parent.pk}/' \
+                                'drag-and-drop/'
+                            result['sequential'] = self.run_sequential(
+                                model_admin, parent, url, body_path)
+                            if self.concurrency > 1:
+                                result['concurrent'] = self.run_concurrent(
+                                    model_admin, parent, url, body_path)
+                            if self.async_view:
+                                with override_settings(
+                                        ROOT_URLCONF=async_urlconf):
+                                    result['async'] = self.run_async(
+                                        async_admin, parent, url, body_path)
+                                sync = result.get(
+                                    'concurrent', result['sequential'])
+                                result['async']['speedup'] = \
+                                    result['async']['uploads_per_second'] / \
+                                    sync['uploads_per_second']
+                            if self.reorder and order_field_name:
+                                result['reorder'] = self.run_reorder(
+                                    model_admin, parent, f'{url}reorder/')
+                if os.path.exists(body_path):
+                    os.remove(body_path)
+
+        output = {'environment': self.get_environment(), 'results': results}
+        if overhead:
+            output['overhead'] = overhead
+        if self.renditions:
+            self.log('renditions')
+            output['renditions'] = self.run_renditions()
+        return output
+
+
+def get_result_key(result):
+    return (result['admin'], result['ordered'], result.get('lean', False),
+            result.get('storage_delay', 0), result['file_size'],
+            result['parent_size'])
+
+
+def compare(baseline, current):
+    ''' Compare the results of two benchmark runs, yielding a tuple for each
+        metric of each scenario present in both: the scenario's key, the
+        mode, the metric's name and its baseline and current values
+    '''
+
+    metrics = ('uploads_per_second', 'latency_p50', 'latency_p99',
+               'queries_per_upload', 'transaction_p50', 'transaction_p99',
+               'peak_memory')
+    previous = {get_result_key(result): result
+                for result in baseline['results']}
+    for result in current['results']:
+        old = previous.get(get_result_key(result))
+        if old is None:
+            continue
+        for mode in ('sequential', 'concurrent', 'async'):
+            if mode not in result or mode not in old:
+                continue
+            for metric in metrics:
+                if metric in result[mode] and metric in old[mode]:
+                    yield (get_result_key(result), mode, metric,
+                           old[mode][metric], result[mode][metric])
+
+    previous = {result['admin']: result
+                for result in baseline.get('overhead', ())}
+    for result in current.get('overhead', ()):
+        old = previous.get(result['admin'])
+        if old is None:
+            continue
+        for metric in ('rebuilt', 'cached'):
+            yield ((result['admin'],), 'overhead', metric, old[metric],
+                   result[metric])
+
+    if 'renditions' in baseline and 'renditions' in current:
+        old, new = baseline['renditions'], current['renditions']
+        key = (old['megapixels'],)
+        if key == (new['megapixels'],):
+            for metric in ('images_per_second', 'images_per_second_per_core'):
+                yield key, 'renditions', metric, old[metric], new[metric]
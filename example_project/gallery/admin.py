@@ -15,3 +15,9 @@ class ImageInline(admin.StackedInline):
 @admin.register(Album)
 class AlbumAdmin(DragAndDropRelatedImageMixin, admin.ModelAdmin):
     inlines = [ImageInline]
+    related_model_order_field_name = 'order'
+    related_model_metadata_fields = {
+        'width': 'width',
+        'height': 'height',
+        'placeholder': 'placeholder',
+    }
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gallery', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='image',
+            options={'ordering': ['order']},
+        ),
+        migrations.AddField(
+            model_name='image',
+            name='order',
+            field=models.PositiveIntegerField(default=0, verbose_name='Order'),
+        ),
+        migrations.AddIndex(
+            model_name='image',
+            index=models.Index(fields=['album', 'order'], name='gallery_ima_album_i_a78b64_idx'),
+        ),
+    ]
@@ -22,3 +22,39 @@ class Image(models.Model):
         related_name='images',
         on_delete=models.CASCADE
     )
+
+    order = models.PositiveIntegerField(
+        'Order',
+        default=0
+    )
+
+    width = models.PositiveIntegerField(
+        'Width',
+        blank=True,
+        null=True
+    )
+
+    height = models.PositiveIntegerField(
+        'Height',
+        blank=True,
+        null=True
+    )
+
+    placeholder = models.CharField(
+        'Placeholder colour',
+        max_length=7,
+        blank=True
+    )
+
+    content_hash = models.CharField(
+        'Content hash',
+        max_length=64,
+        blank=True,
+        db_index=True
+    )
+
+    class Meta:
+        ordering = ['order']
+        indexes = [
+            models.Index(fields=['album', 'order']),
+        ]
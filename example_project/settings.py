@@ -43,6 +43,7 @@ INSTALLED_APPS = [
     'dragndrop_related',
     'example_project.gallery.apps.GalleryConfig',
     'example_project.library.apps.LibraryConfig',
+    'example_project.benchmarks.apps.BenchmarksConfig',
 ]
 
 MIDDLEWARE = [
@@ -83,6 +84,11 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': PROJECT_DIR / 'db.sqlite3',
+        # A file rather than the default in-memory database, which can't be
+        # written to concurrently by the threads of the ordering tests
+        'TEST': {
+            'NAME': PROJECT_DIR / 'test_db.sqlite3',
+        },
     }
 }
 
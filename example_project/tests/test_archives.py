@@ -0,0 +1,143 @@
+import io
+import os
+import zipfile
+
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase
+
+from dragndrop_related.archives import Archive
+from gallery.models import Album
+
+from .utils import UploadTestMixin, override_admin, png
+
+
+def zip_file(entries, name='photos.zip'):
+    ''' Return an uploaded ZIP archive of the dict of `entries`, mapping
+        entry names to their contents
+    '''
+
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as archive:
+        for entry_name, content in entries.items():
+            archive.writestr(entry_name, content)
+    return SimpleUploadedFile(
+        name, buffer.getvalue(), content_type='application/zip')
+
+
+class ArchiveTests(TestCase):
+    ''' Check archives against the limits on their entries before any of
+        them is extracted
+    '''
+
+    def check(self, file, max_entries=10, max_size=10 ** 6, max_ratio=100):
+        Archive(file, max_entries, max_size, max_ratio).check()
+
+    def test_within_limits(self):
+        self.check(zip_file({f'{index}.png': b'data' for index in range(10)}))
+
+    def test_too_many_entries(self):
+        with self.assertRaisesMessage(
+                ValidationError, 'Archive has more than 10 entries.'):
+            self.check(zip_file(
+                {f'{index}.png': b'data' for index in range(11)}))
+
+    def test_total_size(self):
+        with self.assertRaisesMessage(
+                ValidationError, 'Archive expands to more than 1000'):
+            self.check(zip_file({'one.png': os.urandom(600),
+                                 'two.png': os.urandom(600)}),
+                       max_size=1000)
+
+    def test_compression_ratio(self):
+        ''' A small archive which expands enormously (a "zip bomb") is
+            refused from its stated sizes alone
+        '''
+
+        with self.assertRaisesMessage(
+                ValidationError,
+                'Archive expands to more than 100 times its size.'):
+            self.check(zip_file({'bomb.png': b'\0' * 10 ** 6}),
+                       max_size=10 ** 9)
+
+    def test_path_traversal(self):
+        ''' Entries with a path out of the archive aren't extracted, and
+            those with an absolute path are extracted under their base name
+        '''
+
+        archive = Archive(zip_file({'../../evil.png': b'data',
+                                    '/tmp/evil.png': b'data'}), 10, 1000, 100)
+        (name, file, errors), = list(archive)
+        with file:
+            self.assertEqual((name, file.name, errors),
+                             ('/tmp/evil.png', 'evil.png', []))
+
+    def test_corrupt(self):
+        with self.assertRaisesMessage(
+                ValidationError, 'Not a valid ZIP or tar archive.'):
+            self.check(SimpleUploadedFile('photos.zip', b'not a zip'))
+
+
+class ArchiveUploadTests(UploadTestMixin, TestCase):
+    ''' Archives uploaded through the example `gallery` admin with
+        `archive_uploads`
+    '''
+
+    def setUp(self):
+        super().setUp()
+        override_admin(self, Album, archive_uploads=True,
+                       archive_max_entries=10)
+
+    def upload(self, *files):
+        return self.client.post(self.url, {'image': list(files)})
+
+    def test_archive(self):
+        response = self.upload(zip_file({
+            'one.png': png().read(), 'folder/two.png': png().read(),
+            '__MACOSX/._one.png': b'', '.DS_Store': b''}))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [entry['name'] for entry in response.json()['results'][0][
+                'entries']],
+            ['one.png', 'folder/two.png'])
+        self.assertEqual(self.album.images.count(), 2)
+
+    def test_too_many_entries(self):
+        response = self.upload(zip_file(
+            {f'{index}.png': png().read() for index in range(11)}))
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['results'][0]['errors'],
+                         ['Archive has more than 10 entries.'])
+        self.assertEqual(self.album.images.count(), 0)
+
+    def test_path_traversal(self):
+        ''' Entries with a path out of the archive are left out, and nothing
+            is written outside storage
+        '''
+
+        response = self.upload(zip_file({
+            '../../evil.png': png().read(), 'one.png': png().read()}))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [entry['name'] for entry in response.json()['results'][0][
+                'entries']],
+            ['one.png'])
+        self.assertEqual(self.album.images.count(), 1)
+        self.assertFalse(os.path.exists(
+            os.path.join(self.media_root, os.pardir, 'evil.png')))
+
+    def test_nested_archive(self):
+        ''' Archives within archives aren't extracted, but validated as
+            entries like any other
+        '''
+
+        inner = zip_file({'inner.png': png().read()}, 'inner.zip')
+        response = self.upload(zip_file({
+            'one.png': png().read(), 'inner.zip': inner.read()}))
+        self.assertEqual(response.status_code, 200)
+        entries = response.json()['results'][0]['entries']
+        self.assertEqual([entry['success'] for entry in entries],
+                         [True, False])
+        self.assertEqual(self.album.images.count(), 1)
+        self.assertFalse(
+            self.album.images.filter(image__contains='inner').exists())
@@ -0,0 +1,69 @@
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase
+from django.urls import reverse
+
+from gallery.models import Album, Image
+
+from .utils import UploadTestMixin, override_admin, png
+
+
+class BatchUploadTests(UploadTestMixin, TestCase):
+    ''' Several files uploaded in one request through the example `gallery`
+        admin, as Dropzone's `uploadMultiple` mode sends them
+    '''
+
+    def setUp(self):
+        super().setUp()
+        override_admin(self, Album, dropzone_upload_multiple=True,
+                       dropzone_parallel_uploads=10)
+
+    def upload(self, *files):
+        return self.client.post(self.url, {'image': list(files)})
+
+    def not_an_image(self, name='bad.png'):
+        return SimpleUploadedFile(name, b'text', content_type='image/png')
+
+    def test_widget(self):
+        response = self.client.get(reverse(
+            'admin:gallery_album_change', args=[self.album.pk]))
+        self.assertContains(response, 'uploadMultiple: true')
+        self.assertContains(response, 'parallelUploads: 10')
+
+    def test_results(self):
+        ''' A bad file is reported in its place without failing the rest of
+            the batch
+        '''
+
+        response = self.upload(
+            png('one.png'), self.not_an_image(), png('two.png'))
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(
+            [(result['name'], result['success'])
+             for result in data['results']],
+            [('one.png', True), ('bad.png', False), ('two.png', True)])
+        self.assertTrue(data['results'][1]['errors'])
+        self.assertEqual(len(data['children']), 2)
+        self.assertEqual(self.album.images.count(), 2)
+
+    def test_order(self):
+        ''' The files are ordered after the existing children, in the order
+            they were sent
+        '''
+
+        Image.objects.create(album=self.album, image='existing.png', order=5)
+        self.upload(png('one.png'), png('two.png'), png('three.png'))
+        self.assertEqual(
+            list(self.album.images.order_by('order')
+                 .values_list('image', 'order')),
+            [('existing.png', 5), ('one.png', 6), ('two.png', 7),
+             ('three.png', 8)])
+
+    def test_all_invalid(self):
+        response = self.upload(self.not_an_image('one.png'),
+                               self.not_an_image('two.png'))
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(
+            [result['success'] for result in response.json()['results']],
+            [False, False])
+        self.assertEqual(self.album.images.count(), 0)
@@ -0,0 +1,73 @@
+import json
+
+from django.test import TestCase
+from django.urls import reverse
+
+from gallery.models import Album, Image
+
+from .utils import UploadTestMixin, override_admin
+
+
+class LazyInlineTests(UploadTestMixin, TestCase):
+    ''' The example `gallery` admin's images listed a page at a time by the
+        lazy inline
+    '''
+
+    def setUp(self):
+        super().setUp()
+        override_admin(self, Album, lazy_inline_page_size=2)
+        # Out of pk order, with a repeated order value
+        self.images = [
+            Image.objects.create(album=self.album, image=f'{order}.png',
+                                 order=order)
+            for order in (3, 1, 2, 2, 5)]
+        self.children_url = reverse(
+            'admin:gallery_album_drag_and_drop_children',
+            kwargs={'pk': self.album.pk})
+
+    def get_page(self, cursor=None):
+        response = self.client.get(
+            self.children_url, {'cursor': cursor} if cursor else {})
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_pages(self):
+        ''' Following the cursors lists every child once, by order then pk,
+            each page with the same number of queries
+        '''
+
+        pks = []
+        cursor = None
+        while True:
+            with self.assertNumQueries(4):
+                page = self.get_page(cursor)
+            self.assertLessEqual(len(page['results']), 2)
+            pks += [int(child['pk']) for child in page['results']]
+            cursor = page['next']
+            if cursor is None:
+                break
+
+        expected = sorted(self.images, key=lambda image: (image.order,
+                                                          image.pk))
+        self.assertEqual(pks, [image.pk for image in expected])
+
+    def test_invalid_cursor(self):
+        for cursor in ('not json', json.dumps([1]), json.dumps({})):
+            with self.subTest(cursor=cursor):
+                response = self.client.get(
+                    self.children_url, {'cursor': cursor})
+                self.assertEqual(response.status_code, 400)
+
+    def test_change_view(self):
+        ''' The change view lists the images lazily in place of their inline
+        '''
+
+        response = self.client.get(reverse(
+            'admin:gallery_album_change', args=[self.album.pk]))
+        self.assertContains(response, 'id="dropzone-children"')
+        self.assertContains(response, 'image.loading = "lazy"')
+        self.assertNotContains(response, 'name="images-TOTAL_FORMS"')
+
+    def test_disabled(self):
+        override_admin(self, Album)
+        self.assertEqual(self.client.get(self.children_url).status_code, 404)
@@ -0,0 +1,157 @@
+import asyncio
+import os
+import shutil
+import tempfile
+import time
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import AsyncClient, Client, TestCase
+
+from dragndrop_related.staging import (ChunkedUpload, _remove_if_stale,
+                                       cleanup_stale_uploads)
+from dragndrop_related.views import AsyncDragAndDropView
+from gallery.models import Album
+
+from .utils import UploadTestMixin, override, override_admin, png
+
+
+class ChunkedUploadTests(UploadTestMixin, TestCase):
+    ''' Files sent in chunks through the example `gallery` admin, in the way
+        Dropzone's `chunking` mode sends them
+    '''
+
+    client_class = Client
+    options = {}
+    upload_id = 'c0ffee00-0000-4000-8000-000000000000'
+
+    def setUp(self):
+        super().setUp()
+        staging_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, staging_root)
+        override(self, DRAGNDROP_RELATED_STAGING_DIR=staging_root)
+        override_admin(self, Album, dropzone_chunking=True, **self.options)
+        self.client = self.client_class()
+        self.client.force_login(self.user)
+
+        self.content = png().read()
+        size = -(-len(self.content) // 3)
+        self.chunks = [self.content[offset:offset + size]
+                       for offset in range(0, len(self.content), size)]
+        self.upload = ChunkedUpload(
+            f'{self.user.pk}-gallery.album-{self.album.pk}', self.upload_id)
+
+    def send(self, index):
+        offset = sum(len(chunk) for chunk in self.chunks[:index])
+        return self.post(self.url, {
+            'dzuuid': self.upload_id,
+            'dzchunkindex': index,
+            'dztotalchunkcount': len(self.chunks),
+            'dzchunkbyteoffset': offset,
+            'dztotalfilesize': len(self.content),
+            'image': SimpleUploadedFile(
+                'photo.png', self.chunks[index], content_type='image/png'),
+        })
+
+    def status(self):
+        return self.get(self.url, {'dzuuid': self.upload_id}).json()
+
+    def get(self, *args, **kwargs):
+        return self.client.get(*args, **kwargs)
+
+    def post(self, *args, **kwargs):
+        return self.client.post(*args, **kwargs)
+
+    def test_resume(self):
+        ''' The chunks received before an interruption are reported, and
+            sending the rest completes the upload
+        '''
+
+        self.assertEqual(self.send(0).json(), {'received': [0]})
+        self.assertEqual(self.send(1).json(), {'received': [0, 1]})
+        self.assertEqual(self.status()['received'], [0, 1])
+
+        response = self.send(2)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.album.images.count(), 1)
+        self.assertFalse(os.path.exists(self.upload.directory))
+
+    def test_claimed(self):
+        ''' The last chunk of a file another request is still finalizing is
+            refused with `409 Conflict`, to be retried
+        '''
+
+        self.send(0)
+        self.send(1)
+        self.assertTrue(self.upload.claim())
+
+        response = self.send(2)
+        self.assertEqual(response.status_code, 409)
+        self.assertIn('Retry-After', response)
+        self.assertEqual(self.album.images.count(), 0)
+
+    def test_abandoned_claim(self):
+        ''' A claim left by a request which died while finalizing expires,
+            and the last chunk being sent again completes the upload
+        '''
+
+        self.send(0)
+        self.send(1)
+        self.assertTrue(self.upload.claim())
+        stale = time.time() - 7200
+        os.utime(os.path.join(self.upload.directory, 'finalizing'),
+                 (stale, stale))
+
+        self.assertEqual(self.send(2).status_code, 200)
+        self.assertEqual(self.album.images.count(), 1)
+
+    def test_claim_timeout(self):
+        self.send(0)
+        self.assertTrue(self.upload.claim())
+        self.assertFalse(self.upload.claim())
+        time.sleep(0.01)
+        self.assertTrue(self.upload.claim(timeout=0))
+
+    def test_cleanup_stale_uploads(self):
+        self.send(0)
+        self.assertEqual(cleanup_stale_uploads(), 0)
+        self.assertTrue(os.path.exists(self.upload.directory))
+
+        stale = time.time() - 7200
+        for root, directories, names in os.walk(self.upload.directory):
+            for name in directories + names:
+                os.utime(os.path.join(root, name), (stale, stale))
+        os.utime(self.upload.directory, (stale, stale))
+        self.assertEqual(cleanup_stale_uploads(max_age=3600), 1)
+        self.assertFalse(os.path.exists(self.upload.directory))
+
+    def test_cleanup_races_finalize(self):
+        ''' An upload finalized while it's being checked is skipped '''
+
+        self.assertFalse(_remove_if_stale(self.upload.directory, time.time()))
+
+
+class AsyncChunkedUploadTests(ChunkedUploadTests):
+    ''' As `ChunkedUploadTests`, through `AsyncDragAndDropView` '''
+
+    client_class = AsyncClient
+    options = {'drag_and_drop_view_class': AsyncDragAndDropView}
+
+    def get(self, *args, **kwargs):
+        return async_to_sync(self.client.get)(*args, **kwargs)
+
+    def post(self, *args, **kwargs):
+        return async_to_sync(self.client.post)(*args, **kwargs)
+
+    def test_status_off_event_loop(self):
+        ''' The staging area is listed on a thread, not the event loop '''
+
+        def received_chunks(upload):
+            with self.assertRaises(RuntimeError):
+                asyncio.get_running_loop()
+            return []
+
+        with mock.patch.object(
+                ChunkedUpload, 'received_chunks', received_chunks):
+            self.assertEqual(self.status()['received'], [])
@@ -0,0 +1,68 @@
+import hashlib
+from unittest import mock
+
+from django.test import TestCase
+
+from gallery.models import Album
+
+from .utils import UploadTestMixin, override_admin, png
+
+
+class DeduplicationTests(UploadTestMixin, TestCase):
+    ''' Uploads through the example `gallery` admin, hashed into the images'
+        `content_hash` and deduplicated per parent
+    '''
+
+    options = {'related_model_hash_field_name': 'content_hash',
+               'deduplicate_uploads': 'parent'}
+
+    def upload(self, *files):
+        response = self.client.post(self.url, {'image': list(files)})
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_hashed_while_received(self):
+        ''' Uploads are hashed as they're received, not read again to hash
+            them
+        '''
+
+        override_admin(self, Album, **self.options)
+        file = png()
+        content_hash = hashlib.sha256(file.read()).hexdigest()
+        file.seek(0)
+        with mock.patch('dragndrop_related.dedupe.hashlib') as dedupe_hashlib:
+            self.upload(file)
+        dedupe_hashlib.sha256.assert_not_called()
+        self.assertEqual(self.album.images.get().content_hash, content_hash)
+
+    def test_duplicate_in_batch(self):
+        for streaming_uploads in (False, True):
+            with self.subTest(streaming_uploads=streaming_uploads):
+                override_admin(self, Album, **self.options,
+                               streaming_uploads=streaming_uploads)
+                self.album.images.all().delete()
+                results = self.upload(png('one.png'), png('two.png'))
+                self.assertEqual(
+                    [result.get('duplicate', False)
+                     for result in results['results']],
+                    [False, True])
+                self.assertEqual(self.album.images.count(), 1)
+
+    def test_duplicate_of_existing_child(self):
+        override_admin(self, Album, **self.options)
+        self.upload(png('one.png'))
+        response = self.upload(png('two.png'))
+        self.assertEqual(response['message'],
+                         'This file has already been uploaded')
+        self.assertEqual(self.album.images.count(), 1)
+
+    def test_no_hash_field(self):
+        ''' Without a hash field uploads are neither hashed nor deduplicated
+        '''
+
+        override_admin(self, Album, deduplicate_uploads='parent')
+        self.upload(png('one.png'))
+        self.upload(png('two.png'))
+        self.assertEqual(
+            list(self.album.images.values_list('content_hash', flat=True)),
+            ['', ''])
@@ -0,0 +1,193 @@
+import types
+
+from django.core.files.base import ContentFile
+from django.test import TestCase
+from django.urls import reverse
+
+from dragndrop_related.direct import S3DirectUploadBackend, unsign_upload
+from dragndrop_related.processing import get_cache
+from gallery.models import Album, Image
+
+from .utils import RemoteStorage, UploadTestMixin, override_admin, png
+
+
+class StandInS3Client(object):
+    ''' Records the presigned POSTs requested of it, in place of `boto3`'s
+        S3 client
+    '''
+
+    def __init__(self):
+        self.calls = []
+
+    def generate_presigned_post(self, **kwargs):
+        self.calls.append(kwargs)
+        return {
+            'url': 'https://{0}.s3.example.com/'.format(kwargs['Bucket']),
+            'fields': {**kwargs['Fields'], 'key': kwargs['Key'],
+                       'policy': 'policy', 'x-amz-signature': 'signature'},
+        }
+
+
+class StandInS3Storage(RemoteStorage):
+    ''' A stand-in for `django-storages`' `S3Storage`, providing the
+        attributes `S3DirectUploadBackend` uses. Files "uploaded to the
+        bucket" are kept in a local `FileSystemStorage`.
+    '''
+
+    bucket_name = 'dragndrop'
+
+    def __init__(self, location, prefix=''):
+        super().__init__(location)
+        self.location = prefix
+        self.client = StandInS3Client()
+        self.bucket = types.SimpleNamespace(
+            meta=types.SimpleNamespace(client=self.client))
+
+
+class S3DirectUploadTests(UploadTestMixin, TestCase):
+    ''' Upload files straight to an S3 stand-in and finalize them through
+        the example `gallery` admin
+    '''
+
+    def setUp(self):
+        super().setUp()
+        override_admin(
+            self, Album, direct_upload_backend_class=S3DirectUploadBackend)
+
+        field = Image._meta.get_field('image')
+        self.storage = StandInS3Storage(location=self.media_root)
+        old_storage = field.storage
+        field.storage = self.storage
+        self.addCleanup(setattr, field, 'storage', old_storage)
+
+    def direct_url(self, action, album=None):
+        return reverse('admin:gallery_album_drag_and_drop_direct', kwargs={
+            'pk': (album or self.album).pk, 'direct_action': action})
+
+    def upload(self, name='photo.png'):
+        ''' Request a target for a file, "upload" it to the bucket and
+            return the finalize token
+        '''
+
+        content = png().read()
+        response = self.client.post(self.direct_url('target'), {
+            'name': name,
+            'size': len(content),
+            'content_type': 'image/png',
+        })
+        self.assertEqual(response.status_code, 200)
+        target = response.json()
+        key = target['fields']['key']
+        self.assertEqual(self.storage.save(key, ContentFile(content)), key)
+        return target
+
+    def finalize(self, token, **extra):
+        return self.client.post(
+            self.direct_url('finalize'), {'token': token}, **extra)
+
+    def test_target(self):
+        target = self.upload()
+        self.assertEqual(target['url'], 'https://dragndrop.s3.example.com/')
+        self.assertEqual(target['fields']['Content-Type'], 'image/png')
+        self.assertTrue(target['token'])
+
+        call, = self.storage.client.calls
+        self.assertEqual(call['Bucket'], 'dragndrop')
+        self.assertEqual(call['Key'], target['fields']['key'])
+        self.assertTrue(call['Key'].endswith('.png'))
+        size = call['Conditions'][-1][1]
+        self.assertEqual(
+            call['Conditions'][-1], ['content-length-range', size, size])
+
+    def test_target_location(self):
+        ''' Files are uploaded below the storage's `location` prefix, but
+            attached under their names in the storage
+        '''
+
+        self.storage.location = '/uploads/'
+        response = self.client.post(self.direct_url('target'), {
+            'name': 'photo.png', 'size': 10, 'content_type': 'image/png'})
+        self.assertEqual(response.status_code, 200)
+        call, = self.storage.client.calls
+        self.assertTrue(call['Key'].startswith('uploads/'))
+        key = call['Key'][len('uploads/'):]
+        self.assertEqual(unsign_upload(self.album, response.json()['token']),
+                         key)
+
+    def test_target_validates_name(self):
+        response = self.client.post(self.direct_url('target'), {
+            'name': 'document.txt', 'size': 10, 'content_type': 'image/png'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.storage.client.calls, [])
+
+    def test_finalize(self):
+        target = self.upload()
+        response = self.finalize(target['token'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['children']), 1)
+        image = self.album.images.get()
+        self.assertEqual(image.image.name, target['fields']['key'])
+
+    def test_finalize_not_uploaded(self):
+        response = self.client.post(self.direct_url('target'), {
+            'name': 'photo.png', 'size': 10, 'content_type': 'image/png'})
+        response = self.finalize(response.json()['token'])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['results'][0]['errors'],
+                         ['File has not been uploaded'])
+        self.assertFalse(self.album.images.exists())
+
+    def test_finalize_other_parent(self):
+        target = self.upload()
+        other = Album.objects.create(title='Other')
+        response = self.client.post(
+            self.direct_url('finalize', other), {'token': target['token']})
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Image.objects.exists())
+
+    def test_finalize_replayed_token(self):
+        target = self.upload()
+        self.assertEqual(self.finalize(target['token']).status_code, 200)
+
+        response = self.finalize(target['token'])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['results'][0]['errors'],
+                         ['File has already been attached'])
+        self.assertEqual(self.album.images.count(), 1)
+
+    def test_finalize_replayed_token_without_claim(self):
+        ''' A token replayed once its claim has gone from the cache (e.g.
+            with a cache per process) is still refused, as its file is
+            attached
+        '''
+
+        target = self.upload()
+        self.assertEqual(self.finalize(target['token']).status_code, 200)
+        get_cache().clear()
+
+        response = self.finalize(target['token'])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.album.images.count(), 1)
+
+    def test_finalize_repeated_token_in_request(self):
+        target = self.upload()
+        response = self.client.post(self.direct_url('finalize'), {
+            'token': [target['token'], target['token']]})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [result['success'] for result in response.json()['results']],
+            [True, False])
+        self.assertEqual(self.album.images.count(), 1)
+
+    def test_finalize_upload_key(self):
+        ''' A repeated finalize request with the same upload key gets the
+            original response back
+        '''
+
+        target = self.upload()
+        first = self.finalize(target['token'], HTTP_X_UPLOAD_KEY='file-1')
+        second = self.finalize(target['token'], HTTP_X_UPLOAD_KEY='file-1')
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(second['Idempotent-Replayed'], 'true')
+        self.assertEqual(second.content, first.content)
+        self.assertEqual(self.album.images.count(), 1)
@@ -0,0 +1,63 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+from django.db import connection
+from django.test import Client, TransactionTestCase
+
+from dragndrop_related.views import DragAndDropView
+
+from .utils import UploadTestMixin, png
+
+
+class UploadKeyTests(UploadTestMixin, TransactionTestCase):
+    ''' Uploads through the example `gallery` admin repeated with the same
+        `X-Upload-Key`, as Dropzone's retries are
+    '''
+
+    def upload(self, client=None):
+        return (client or self.client).post(
+            self.url, {'image': png()}, headers={'X-Upload-Key': 'file-1'})
+
+    def test_concurrent_repeat(self):
+        ''' A repeat while the first attempt is in flight is refused with
+            `409 Conflict`; once it's done, its response is replayed
+        '''
+
+        started = threading.Event()
+        finish = threading.Event()
+        create_related = DragAndDropView.create_related
+
+        def slow_create_related(view, *args, **kwargs):
+            started.set()
+            finish.wait(10)
+            return create_related(view, *args, **kwargs)
+
+        def first_attempt():
+            client = Client()
+            client.force_login(self.user)
+            try:
+                return self.upload(client)
+            finally:
+                connection.close()
+
+        with mock.patch.object(DragAndDropView, 'create_related',
+                               slow_create_related), \
+                ThreadPoolExecutor(max_workers=1) as executor:
+            first = executor.submit(first_attempt)
+            self.assertTrue(started.wait(10))
+            try:
+                response = self.upload()
+                self.assertEqual(response.status_code, 409)
+                self.assertIn('Retry-After', response)
+            finally:
+                finish.set()
+            first = first.result()
+
+        self.assertEqual(first.status_code, 200)
+        self.assertNotIn('Idempotent-Replayed', first)
+        response = self.upload()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Idempotent-Replayed'], 'true')
+        self.assertEqual(response.content, first.content)
+        self.assertEqual(self.album.images.count(), 1)
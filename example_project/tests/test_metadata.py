@@ -0,0 +1,68 @@
+import io
+import os
+import shutil
+import tempfile
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from gallery.models import Image
+
+from .utils import RemoteStorage, UploadTestMixin, png
+
+
+class BackfillMetadataTests(UploadTestMixin, TestCase):
+    ''' Record the metadata of images already in the example `gallery` with
+        the `dragndrop_metadata` command
+    '''
+
+    def setUp(self):
+        super().setUp()
+        field = Image._meta.get_field('image')
+        self.storage = RemoteStorage(location=self.media_root)
+        old_storage = field.storage
+        field.storage = self.storage
+        self.addCleanup(setattr, field, 'storage', old_storage)
+
+        self.temporary_directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.temporary_directory)
+        old_tempdir = tempfile.tempdir
+        tempfile.tempdir = self.temporary_directory
+        self.addCleanup(setattr, tempfile, 'tempdir', old_tempdir)
+
+    def backfill(self):
+        stdout, stderr = io.StringIO(), io.StringIO()
+        call_command('dragndrop_metadata', stdout=stdout, stderr=stderr)
+        return stdout.getvalue(), stderr.getvalue()
+
+    def test_storage_without_paths(self):
+        ''' Files in storage without local paths are read from temporary
+            copies, which are removed afterwards
+        '''
+
+        name = self.storage.save('photo.png', png(size=(40, 20)))
+        image = Image.objects.create(album=self.album, image=name)
+
+        stdout, stderr = self.backfill()
+        self.assertIn('Updated metadata of 1 gallery.image.image', stdout)
+        self.assertEqual(stderr, '')
+        image.refresh_from_db()
+        self.assertEqual((image.width, image.height), (40, 20))
+        self.assertEqual(os.listdir(self.temporary_directory), [])
+
+    def test_unreadable_file(self):
+        ''' A file which can't be read is reported, with the reason, without
+            failing the rest of its batch
+        '''
+
+        name = self.storage.save('photo.png', png(size=(40, 20)))
+        image = Image.objects.create(album=self.album, image=name)
+        missing = Image.objects.create(album=self.album, image='missing.png')
+
+        stdout, stderr = self.backfill()
+        self.assertIn('Updated metadata of 1 gallery.image.image', stdout)
+        self.assertIn('Could not read missing.png: ', stderr)
+        image.refresh_from_db()
+        self.assertEqual(image.width, 40)
+        missing.refresh_from_db()
+        self.assertIsNone(missing.width)
@@ -0,0 +1,85 @@
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import connection, transaction
+from django.test import TransactionTestCase
+
+from dragndrop_related.ordering import ParentLockOrderAllocator
+from gallery.models import Album, Image
+
+from .utils import UploadTestMixin
+
+
+class ParentLockOrderAllocatorTests(UploadTestMixin, TransactionTestCase):
+    ''' Allocate order values for many uploads to one parent at once, each
+        thread making its uploads in transactions on its own database
+        connection, as concurrent requests would
+    '''
+
+    threads = 8
+    uploads_per_thread = 10
+
+    def setUp(self):
+        super().setUp()
+        self.allocator = ParentLockOrderAllocator('order')
+
+    def upload(self, barrier, count):
+        ''' Make `uploads_per_thread` uploads of `count` files each to the
+            album, once every thread is ready
+        '''
+
+        try:
+            barrier.wait()
+            for _ in range(self.uploads_per_thread):
+                with transaction.atomic():
+                    start = self.allocator.allocate(
+                        self.album, self.album.images, count)
+                    Image.objects.bulk_create(
+                        Image(album=self.album, image=f'{uuid.uuid4()}.png',
+                              order=start + index)
+                        for index in range(count))
+        finally:
+            connection.close()
+
+    def run_uploads(self, count):
+        barrier = threading.Barrier(self.threads)
+        with ThreadPoolExecutor(max_workers=self.threads) as executor:
+            futures = [executor.submit(self.upload, barrier, count)
+                       for _ in range(self.threads)]
+            for future in futures:
+                future.result()
+
+    def assertOrders(self, count):
+        ''' Assert the album's children have order values 1 to `count`, with
+            none repeated or skipped
+        '''
+
+        self.assertEqual(
+            list(self.album.images.order_by('order')
+                 .values_list('order', flat=True)),
+            list(range(1, count + 1)))
+
+    def test_concurrent_uploads(self):
+        self.run_uploads(1)
+        self.assertOrders(self.threads * self.uploads_per_thread)
+
+    def test_concurrent_batches(self):
+        self.run_uploads(5)
+        self.assertOrders(self.threads * self.uploads_per_thread * 5)
+
+    def test_existing_children(self):
+        Image.objects.bulk_create(
+            Image(album=self.album, image=f'{index}.png', order=index + 1)
+            for index in range(100))
+        self.run_uploads(1)
+        self.assertOrders(100 + self.threads * self.uploads_per_thread)
+
+    def test_other_parent(self):
+        ''' Concurrent uploads to another parent don't affect the album's '''
+
+        other = Album.objects.create(title='Other')
+        Image.objects.create(album=other, image='other.png', order=50)
+        self.run_uploads(1)
+        self.assertOrders(self.threads * self.uploads_per_thread)
+        self.assertEqual(self.allocator.allocate(other, other.images), 51)
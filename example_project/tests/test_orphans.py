@@ -0,0 +1,52 @@
+import io
+
+from django.core.management import CommandError, call_command
+from django.test import TestCase
+
+from gallery.models import Image
+
+from .utils import UploadTestMixin, png
+
+
+def upload_to(instance, filename):
+    return f'albums/{filename}'
+
+
+class OrphansTests(UploadTestMixin, TestCase):
+    ''' Find the files in the example `gallery`'s storage which no image
+        refers to, with the `dragndrop_orphans` command
+    '''
+
+    def setUp(self):
+        super().setUp()
+        self.storage = Image._meta.get_field('image').storage
+        self.referenced = self.storage.save('albums/photo.png', png())
+        Image.objects.create(album=self.album, image=self.referenced)
+        self.orphan = self.storage.save('albums/orphan.png', png())
+
+    def orphans(self, *args):
+        stdout = io.StringIO()
+        call_command('dragndrop_orphans', '--min-age', '0', *args,
+                     stdout=stdout)
+        return stdout.getvalue().splitlines()
+
+    def test_orphans(self):
+        self.assertEqual(self.orphans(),
+                         [self.orphan, 'Found 1 orphaned file(s)'])
+
+    def test_callable_upload_to(self):
+        ''' Storage isn't scanned from its root for a field with a callable
+            `upload_to` unless the directories to scan are given
+        '''
+
+        field = Image._meta.get_field('image')
+        old_upload_to = field.upload_to
+        field.upload_to = upload_to
+        self.addCleanup(setattr, field, 'upload_to', old_upload_to)
+
+        with self.assertRaisesMessage(CommandError, 'upload_to is callable'):
+            self.orphans('--delete')
+        self.assertTrue(self.storage.exists(self.orphan))
+
+        self.assertEqual(self.orphans('--directory', 'albums'),
+                         [self.orphan, 'Found 1 orphaned file(s)'])
@@ -0,0 +1,124 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from dragndrop_related import processing
+from dragndrop_related.processing import (BaseProcessingBackend,
+                                          ImmediateProcessingBackend,
+                                          get_processing_backend,
+                                          process_upload)
+from dragndrop_related.views import DragAndDropView
+from gallery.models import Album
+
+from .utils import UploadTestMixin, override, override_admin, png
+
+
+class SlowProcessingBackend(BaseProcessingBackend):
+    ''' A backend which takes a while to create, as a pool would '''
+
+    def __init__(self, **options):
+        time.sleep(0.05)
+        super().__init__(**options)
+
+
+class DeferredProcessingTests(UploadTestMixin, TestCase):
+    ''' Uploads through the example `gallery` admin with
+        `deferred_processing`, processed within the request by
+        `ImmediateProcessingBackend`
+    '''
+
+    def setUp(self):
+        super().setUp()
+        staging_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, staging_root)
+        override(self, DRAGNDROP_RELATED_STAGING_DIR=staging_root)
+        override_admin(self, Album, deferred_processing=True)
+
+        patcher = mock.patch.object(
+            processing, '_backend', ImmediateProcessingBackend())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_connections_left_open(self):
+        ''' Jobs run within the request leave its database connection alone
+        '''
+
+        with mock.patch('dragndrop_related.processing.'
+                        'close_old_connections') as close_old_connections:
+            response = self.client.post(self.url, {'image': png()})
+        self.assertEqual(response.status_code, 202)
+        close_old_connections.assert_not_called()
+        self.assertEqual(self.album.images.count(), 1)
+
+    def test_job_status(self):
+        ''' The job is reported done, describing the children it created,
+            on the status URL returned for it
+        '''
+
+        response = self.client.post(
+            self.url, {'image': [png('one.png'), png('two.png')]})
+        self.assertEqual(response.status_code, 202)
+        data = response.json()
+        self.assertEqual([result['success'] for result in data['results']],
+                         [True, True])
+
+        job = self.client.get(data['status_url']).json()
+        self.assertEqual(job['status'], processing.JOB_DONE)
+        self.assertEqual(
+            [child['pk'] for child in job['children']],
+            [str(pk) for pk in self.album.images.order_by('pk')
+             .values_list('pk', flat=True)])
+
+    def test_job_status_of_other_parent(self):
+        response = self.client.post(self.url, {'image': png()})
+        other = Album.objects.create(title='Other')
+        url = reverse('admin:gallery_album_drag_and_drop_job', kwargs={
+            'pk': other.pk, 'job_id': response.json()['job']})
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+    def test_failed_job(self):
+        ''' A job which fails is reported with its error, and its staged
+            files are removed
+        '''
+
+        with mock.patch.object(ImmediateProcessingBackend, 'submit') as submit:
+            response = self.client.post(self.url, {'image': png()})
+        (payload,), _ = submit.call_args
+        with mock.patch.object(DragAndDropView, 'create_related',
+                               side_effect=OSError('Disk full')), \
+                self.assertRaises(OSError):
+            process_upload(payload, close_connections=False)
+
+        job = self.client.get(response.json()['status_url']).json()
+        self.assertEqual((job['status'], job['error']),
+                         (processing.JOB_FAILED, 'Disk full'))
+        self.assertFalse(os.path.exists(
+            processing.get_job_directory(payload['job'])))
+        self.assertEqual(self.album.images.count(), 0)
+
+
+class ProcessingBackendTests(TestCase):
+
+    @override_settings(DRAGNDROP_RELATED_PROCESSING_BACKEND=(
+        'tests.test_processing.SlowProcessingBackend'))
+    def test_created_once(self):
+        ''' Requests asking for the backend at once share one instance '''
+
+        barrier = threading.Barrier(8)
+
+        def get_backend():
+            barrier.wait()
+            return get_processing_backend()
+
+        with mock.patch.object(processing, '_backend', None), \
+                ThreadPoolExecutor(max_workers=8) as executor:
+            futures = [executor.submit(get_backend) for _ in range(8)]
+            backends = {id(future.result()) for future in futures}
+        self.assertEqual(len(backends), 1)
@@ -0,0 +1,53 @@
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase
+from django.urls import reverse
+
+from gallery.models import Album
+from library.models import Collection
+
+from .utils import UploadTestMixin, override_admin, png
+
+
+class QueryBudgetTests(UploadTestMixin, TestCase):
+    ''' The number of queries an upload of one file and of a batch of three
+        makes through the example admins, with and without `lean_uploads`.
+        Each includes the session and user lookups, and each created child
+        costs one query to render its inline.
+    '''
+
+    def assertUploadQueries(self, url, field_name, file, budgets):
+        for count, queries in ((1, budgets[0]), (3, budgets[1])):
+            with self.subTest(files=count), self.assertNumQueries(queries):
+                response = self.client.post(
+                    url, {field_name: [file(index) for index in range(count)]})
+            self.assertEqual(response.status_code, 200)
+
+    def upload_gallery(self, budgets, **options):
+        override_admin(self, Album, **options)
+        self.assertUploadQueries(
+            self.url, 'image',
+            lambda index: png(f'photo-{index}.png'), budgets)
+
+    def upload_library(self, budgets, **options):
+        override_admin(self, Collection, **options)
+        collection = Collection.objects.create(title='Collection')
+        url = reverse('admin:library_collection_drag_and_drop',
+                      kwargs={'pk': collection.pk})
+        self.assertUploadQueries(
+            url, 'file',
+            lambda index: SimpleUploadedFile(
+                f'book-{index}.pdf', b'%PDF-1.4',
+                content_type='application/pdf'),
+            budgets)
+
+    def test_gallery(self):
+        self.upload_gallery((9, 11))
+
+    def test_gallery_lean(self):
+        self.upload_gallery((9, 11), lean_uploads=True)
+
+    def test_library(self):
+        self.upload_library((7, 9))
+
+    def test_library_lean(self):
+        self.upload_library((5, 7), lean_uploads=True)
@@ -0,0 +1,88 @@
+import os
+import shutil
+import tempfile
+from concurrent.futures.process import BrokenProcessPool
+from unittest import mock
+
+from django.test import TestCase
+from PIL import Image as PILImage
+
+from dragndrop_related import renditions
+from gallery.models import Album, Image
+
+from .utils import RemoteStorage, UploadTestMixin, override_admin, png
+
+
+class RenditionTests(UploadTestMixin, TestCase):
+    ''' Uploads through the example `gallery` admin with renditions '''
+
+    def upload(self, **extra):
+        return self.client.post(
+            self.url, {'image': png(size=(40, 20))}, **extra)
+
+    def test_renditions(self):
+        override_admin(self, Album, image_renditions={
+            'thumb': {'size': (10, 10), 'format': 'PNG'}})
+        self.assertEqual(self.upload().status_code, 200)
+        image = self.album.images.get()
+        name = image.image.name.rsplit('.', 1)[0] + '.thumb.png'
+        with image.image.storage.open(name) as file, \
+                PILImage.open(file) as rendition:
+            self.assertEqual(rendition.size, (10, 5))
+
+    def test_failed_rendition(self):
+        ''' A rendition which can't be generated is logged, and the upload
+            still succeeds, so a retry with the same key doesn't create
+            another child
+        '''
+
+        override_admin(self, Album, image_renditions={
+            'thumb': {'size': (10, 10), 'format': 'UNKNOWN'}})
+        with self.assertLogs('dragndrop_related.renditions', 'ERROR'):
+            response = self.upload(HTTP_X_UPLOAD_KEY='file-1')
+        self.assertEqual(response.status_code, 200)
+        response = self.upload(HTTP_X_UPLOAD_KEY='file-1')
+        self.assertEqual(response['Idempotent-Replayed'], 'true')
+        self.assertEqual(self.album.images.count(), 1)
+
+    def test_storage_without_paths(self):
+        ''' Originals in storage without local paths are copied to a
+            temporary file for rendering, which is removed afterwards
+        '''
+
+        override_admin(self, Album, image_renditions={
+            'thumb': {'size': (10, 10), 'format': 'PNG'}})
+        field = Image._meta.get_field('image')
+        old_storage = field.storage
+        field.storage = RemoteStorage(location=self.media_root)
+        self.addCleanup(setattr, field, 'storage', old_storage)
+        temporary_directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, temporary_directory)
+        old_tempdir = tempfile.tempdir
+        tempfile.tempdir = temporary_directory
+        self.addCleanup(setattr, tempfile, 'tempdir', old_tempdir)
+
+        with mock.patch('tempfile.mkstemp', wraps=tempfile.mkstemp) as mkstemp:
+            self.assertEqual(self.upload().status_code, 200)
+        mkstemp.assert_called_once()
+        image = self.album.images.get()
+        name = image.image.name.rsplit('.', 1)[0] + '.thumb.png'
+        self.assertTrue(field.storage.exists(name))
+        self.assertEqual(os.listdir(temporary_directory), [])
+
+    def test_broken_pool(self):
+        ''' A pool broken by a worker dying is replaced, and the renditions
+            generated on the new one
+        '''
+
+        override_admin(self, Album, image_renditions={
+            'thumb': {'size': (10, 10), 'format': 'PNG'}})
+        broken = mock.Mock(submit=mock.Mock(side_effect=BrokenProcessPool))
+        with mock.patch.object(renditions, '_executor', broken):
+            self.assertEqual(self.upload().status_code, 200)
+            self.addCleanup(renditions._executor.shutdown)
+            self.assertIsNot(renditions._executor, broken)
+        broken.shutdown.assert_called_once_with(wait=False)
+        image = self.album.images.get()
+        name = image.image.name.rsplit('.', 1)[0] + '.thumb.png'
+        self.assertTrue(image.image.storage.exists(name))
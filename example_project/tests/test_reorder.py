@@ -0,0 +1,88 @@
+import json
+
+from django.test import TestCase
+from django.urls import reverse
+
+from gallery.models import Album, Image
+from library.models import Collection
+
+from .utils import UploadTestMixin, override_admin
+
+
+class ReorderTests(UploadTestMixin, TestCase):
+    ''' Reorder the images of an album in the example `gallery` admin with
+        the sortable strip's reorder endpoint
+    '''
+
+    def setUp(self):
+        super().setUp()
+        override_admin(self, Album, sortable_children=True)
+        self.images = [
+            Image.objects.create(album=self.album, image=f'{order}.png',
+                                 order=order)
+            for order in (1, 2, 3, 4)]
+        self.reorder_url = reverse(
+            'admin:gallery_album_drag_and_drop_reorder',
+            kwargs={'pk': self.album.pk})
+
+    def reorder(self, pks):
+        return self.client.post(
+            self.reorder_url, json.dumps({'pks': pks}),
+            content_type='application/json')
+
+    def assertOrder(self, images):
+        self.assertEqual(
+            list(self.album.images.order_by('order', 'pk')),
+            images)
+
+    def test_widget(self):
+        response = self.client.get(reverse(
+            'admin:gallery_album_change', args=[self.album.pk]))
+        self.assertContains(response, f'data-reorder-url="{self.reorder_url}"')
+
+    def test_reorder(self):
+        ''' Only the rows whose order changes are written '''
+
+        first, second, third, fourth = self.images
+        response = self.reorder(
+            [first.pk, third.pk, second.pk, fourth.pk])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['updated'], 2)
+        self.assertOrder([first, third, second, fourth])
+
+    def test_reorder_subset(self):
+        ''' Reordering some children reuses their order values, leaving the
+            rest in place
+        '''
+
+        first, second, third, fourth = self.images
+        self.assertEqual(self.reorder([fourth.pk, second.pk]).status_code,
+                         200)
+        self.assertOrder([first, fourth, third, second])
+
+    def test_repeated_order_values(self):
+        Image.objects.filter(pk__in=[image.pk for image in self.images]) \
+            .update(order=1)
+        pks = [image.pk for image in reversed(self.images)]
+        self.assertEqual(self.reorder(pks).status_code, 200)
+        self.assertOrder(list(reversed(self.images)))
+
+    def test_invalid(self):
+        other = Album.objects.create(title='Other')
+        other_image = Image.objects.create(
+            album=other, image='other.png', order=1)
+        first = self.images[0]
+        for pks in ([], [first.pk, first.pk], ['x'], [other_image.pk]):
+            with self.subTest(pks=pks):
+                self.assertEqual(self.reorder(pks).status_code, 400)
+        self.assertOrder(self.images)
+        self.assertEqual(Image.objects.get(pk=other_image.pk).order, 1)
+
+    def test_without_order_field(self):
+        override_admin(self, Collection)
+        collection = Collection.objects.create(title='Collection')
+        response = self.client.post(
+            reverse('admin:library_collection_drag_and_drop_reorder',
+                    kwargs={'pk': collection.pk}),
+            json.dumps({'pks': [1]}), content_type='application/json')
+        self.assertEqual(response.status_code, 404)
@@ -0,0 +1,138 @@
+import shutil
+import tempfile
+import uuid
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase
+from django.urls import NoReverseMatch, reverse
+
+from dragndrop_related.staging import FORM_TOKEN_FIELD, StagedUploads
+from gallery.models import Album
+
+from .utils import UploadTestMixin, override, override_admin, png
+
+
+class StagingTests(UploadTestMixin, TestCase):
+    ''' Files dropped on the `add` view of the example `gallery` admin, with
+        `add_view_uploads` enabled
+    '''
+
+    options = {}
+
+    def setUp(self):
+        super().setUp()
+        staging_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, staging_root)
+        override(self, DRAGNDROP_RELATED_STAGING_DIR=staging_root)
+        override_admin(self, Album, add_view_uploads=True, **self.options)
+        self.add_url = reverse('admin:gallery_album_add')
+        self.stage_url = reverse('admin:gallery_album_drag_and_drop_add')
+        self.token = uuid.uuid4().hex
+
+    def stage(self, *files, token=None):
+        return self.client.post(self.stage_url, {
+            FORM_TOKEN_FIELD: self.token if token is None else token,
+            'image': list(files),
+        })
+
+    def save(self, title='Staged'):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(self.add_url, {
+                'title': title,
+                FORM_TOKEN_FIELD: self.token,
+                'images-TOTAL_FORMS': '0',
+                'images-INITIAL_FORMS': '0',
+                'images-MIN_NUM_FORMS': '0',
+                'images-MAX_NUM_FORMS': '1000',
+            })
+        self.assertEqual(response.status_code, 302)
+        return Album.objects.get(title=title)
+
+    def staged_names(self):
+        staged = StagedUploads(self.user.pk, self.token)
+        return [entry['name'] for entry in staged.entries()]
+
+    def test_add_view_token(self):
+        response = self.client.get(self.add_url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.context['drag_and_drop_token'])
+        self.assertEqual(response.context['staged_uploads'], [])
+
+    def test_staged(self):
+        response = self.stage(png('a.png'), png('b.png'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['results'], [
+            {'name': 'a.png', 'success': True},
+            {'name': 'b.png', 'success': True},
+        ])
+        self.assertEqual(self.staged_names(), ['a.png', 'b.png'])
+        self.assertEqual(self.album.images.count(), 0)
+
+    def test_attached_on_save(self):
+        self.stage(png('a.png'), png('b.png'))
+        self.stage(png('c.png', size=(30, 10)))
+
+        album = self.save()
+        images = list(album.images.all())
+        self.assertEqual([image.order for image in images], [1, 2, 3])
+        self.assertEqual(images[2].width, 30)
+        self.assertEqual(self.staged_names(), [])
+
+    def test_redisplayed_with_errors(self):
+        ''' Files staged on a form redisplayed with errors are listed, and
+            aren't attached
+        '''
+
+        self.stage(png('a.png'))
+        response = self.client.post(self.add_url, {
+            'title': '',
+            FORM_TOKEN_FIELD: self.token,
+            'images-TOTAL_FORMS': '0',
+            'images-INITIAL_FORMS': '0',
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['drag_and_drop_token'], self.token)
+        self.assertEqual(response.context['staged_uploads'], ['a.png'])
+        self.assertEqual(self.staged_names(), ['a.png'])
+
+    def test_invalid_file(self):
+        invalid = SimpleUploadedFile(
+            'notes.png', b'not an image', content_type='image/png')
+        response = self.stage(invalid, png('a.png'))
+        self.assertEqual(response.status_code, 200)
+        results = response.json()['results']
+        self.assertFalse(results[0]['success'])
+        self.assertTrue(results[0]['errors'])
+        self.assertTrue(results[1]['success'])
+        self.assertEqual(self.staged_names(), ['a.png'])
+
+        response = self.stage(invalid)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.staged_names(), ['a.png'])
+
+    def test_invalid_token(self):
+        self.assertEqual(self.stage(png(), token='../x').status_code, 400)
+
+    def test_not_enabled(self):
+        override_admin(self, Album, add_view_uploads=False)
+        with self.assertRaises(NoReverseMatch):
+            reverse('admin:gallery_album_drag_and_drop_add')
+
+
+class ThrottledStagingTests(StagingTests):
+    ''' Files dropped on the `add` view with an upload rate limit of two per
+        hour, counted per form
+    '''
+
+    options = {'upload_rate_limit': (2, 3600)}
+
+    def test_throttled(self):
+        self.assertEqual(self.stage(png('a.png')).status_code, 200)
+        self.assertEqual(self.stage(png('b.png')).status_code, 200)
+        response = self.stage(png('c.png'))
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response.json()['error'],
+                         'Too many uploads, retrying shortly')
+        self.assertEqual(int(response['Retry-After']),
+                         response.json()['retry_after'])
+        self.assertEqual(self.staged_names(), ['a.png', 'b.png'])
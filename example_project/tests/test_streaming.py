@@ -0,0 +1,66 @@
+import os
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase
+
+from gallery.models import Album
+
+from .utils import UploadTestMixin, override_admin, png
+
+
+class StreamingUploadTests(UploadTestMixin, TestCase):
+    ''' Batches streamed straight into storage through the example `gallery`
+        admin
+    '''
+
+    def upload(self, *files):
+        return self.client.post(self.url, {'image': list(files)})
+
+    def assertStored(self, count):
+        ''' Assert `count` files are left in `MEDIA_ROOT` '''
+
+        self.assertEqual(
+            sum(len(names) for _, _, names in os.walk(self.media_root)),
+            count)
+
+    def test_batch(self):
+        override_admin(self, Album, streaming_uploads=True)
+        response = self.upload(png('one.png'), png('two.png'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.album.images.count(), 2)
+        self.assertStored(2)
+
+    def test_last_file_too_large(self):
+        ''' A file rejected for its size as the last in the batch doesn't
+            lose the files stored before it
+        '''
+
+        override_admin(self, Album, streaming_uploads=True,
+                       max_upload_size=1000)
+        response = self.upload(
+            png('ok.png'),
+            SimpleUploadedFile('big.png', b'\0' * 5000,
+                               content_type='image/png'))
+        self.assertEqual(response.status_code, 200)
+        results = response.json()['results']
+        self.assertEqual([result['success'] for result in results],
+                         [True, False])
+        self.assertEqual(results[1]['name'], 'big.png')
+        self.assertEqual(self.album.images.count(), 1)
+        self.assertStored(1)
+
+    def test_last_image_too_large(self):
+        ''' An image rejected for its dimensions as the last in the batch
+            doesn't lose the files stored before it
+        '''
+
+        override_admin(self, Album, streaming_uploads=True,
+                       max_image_dimensions=(100, 100))
+        response = self.upload(png('ok.png'), png('big.png', (200, 200)))
+        self.assertEqual(response.status_code, 200)
+        results = response.json()['results']
+        self.assertEqual([result['success'] for result in results],
+                         [True, False])
+        self.assertIn('no larger than 100x100 pixels', results[1]['errors'][0])
+        self.assertEqual(self.album.images.count(), 1)
+        self.assertStored(1)
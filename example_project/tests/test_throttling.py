@@ -0,0 +1,84 @@
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.core.handlers.wsgi import WSGIRequest
+from django.test import AsyncClient, Client, TestCase
+from django.utils.crypto import get_random_string
+
+from dragndrop_related.views import AsyncDragAndDropView
+from gallery.models import Album
+
+from .utils import UploadTestMixin, override_admin, png
+
+
+class ThrottlingTests(UploadTestMixin, TestCase):
+    ''' Uploads through the example `gallery` admin with an upload rate
+        limit of two per hour, with CSRF checks enforced
+    '''
+
+    client_class = Client
+    request_class = WSGIRequest
+    options = {}
+
+    def setUp(self):
+        super().setUp()
+        override_admin(self, Album, upload_rate_limit=(2, 3600),
+                       **self.options)
+
+        self.client = self.client_class(enforce_csrf_checks=True)
+        self.client.force_login(self.user)
+        self.csrf_token = get_random_string(32)
+        self.client.cookies[settings.CSRF_COOKIE_NAME] = self.csrf_token
+
+    def upload(self, csrf=True, headers=None):
+        headers = dict(headers or {})
+        if csrf:
+            headers['X-CSRFToken'] = self.csrf_token
+        return self.post(self.url, {'image': png()}, headers=headers)
+
+    def post(self, *args, **kwargs):
+        return self.client.post(*args, **kwargs)
+
+    def test_csrf(self):
+        self.assertEqual(self.upload(csrf=False).status_code, 403)
+        self.assertEqual(self.upload().status_code, 200)
+        self.assertEqual(self.album.images.count(), 1)
+
+    def test_throttled_before_body_parsed(self):
+        ''' An upload over the limit is refused before its body is parsed,
+            and so before its CSRF token is checked
+        '''
+
+        self.assertEqual(self.upload().status_code, 200)
+        self.assertEqual(self.upload().status_code, 200)
+        with mock.patch.object(
+                self.request_class, '_load_post_and_files',
+                side_effect=AssertionError('Body parsed')):
+            response = self.upload(csrf=False)
+        self.assertEqual(response.status_code, 429)
+        self.assertIn('Retry-After', response)
+        self.assertEqual(self.album.images.count(), 2)
+
+    def test_csrf_refusal_not_replayed(self):
+        ''' An upload refused by the CSRF check can be retried with the same
+            key
+        '''
+
+        response = self.upload(csrf=False, headers={'X-Upload-Key': 'file-1'})
+        self.assertEqual(response.status_code, 403)
+        response = self.upload(headers={'X-Upload-Key': 'file-1'})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('Idempotent-Replayed', response)
+
+
+class AsyncThrottlingTests(ThrottlingTests):
+    ''' As `ThrottlingTests`, through `AsyncDragAndDropView` '''
+
+    client_class = AsyncClient
+    request_class = ASGIRequest
+    options = {'drag_and_drop_view_class': AsyncDragAndDropView}
+
+    def post(self, *args, **kwargs):
+        return async_to_sync(self.client.post)(*args, **kwargs)
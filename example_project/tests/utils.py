@@ -0,0 +1,96 @@
+import io
+import shutil
+import tempfile
+import types
+
+from django.contrib import admin
+from django.contrib.admin.sites import AdminSite
+from django.contrib.auth import get_user_model
+from django.core.files.storage import FileSystemStorage, Storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import override_settings
+from django.urls import path, reverse
+from PIL import Image as PILImage
+
+from dragndrop_related.processing import get_cache
+from gallery.models import Album
+
+
+def override_admin(test_case, model, **options):
+    ''' Register a copy of the project's admin for `model` with `options`
+        overridden on a fresh `AdminSite`, and route to it for the rest of
+        the test. Returns the `ModelAdmin`.
+    '''
+
+    admin_class = type(admin.site._registry[model])
+    site = AdminSite(name='admin')
+    site.register(model, type(admin_class.__name__, (admin_class,), options))
+    urlconf = types.ModuleType('test_urls')
+    urlconf.urlpatterns = [path('admin/', site.urls)]
+    override(test_case, ROOT_URLCONF=urlconf)
+    return site._registry[model]
+
+
+def override(test_case, **settings):
+    ''' Override `settings` for the rest of the test '''
+
+    overridden = override_settings(**settings)
+    overridden.enable()
+    test_case.addCleanup(overridden.disable)
+
+
+def png(name='photo.png', size=(20, 10)):
+    ''' Return an uploaded PNG image of `size` '''
+
+    buffer = io.BytesIO()
+    PILImage.new('RGB', size, 'red').save(buffer, 'PNG')
+    return SimpleUploadedFile(
+        name, buffer.getvalue(), content_type='image/png')
+
+
+class RemoteStorage(Storage):
+    ''' A stand-in for remote storage, which has no local paths, keeping
+        files in a local `FileSystemStorage`
+    '''
+
+    def __init__(self, location):
+        self.local = FileSystemStorage(location=location)
+
+    def _open(self, name, mode='rb'):
+        return self.local.open(name, mode)
+
+    def _save(self, name, content):
+        return self.local.save(name, content)
+
+    def delete(self, name):
+        self.local.delete(name)
+
+    def exists(self, name):
+        return self.local.exists(name)
+
+    def size(self, name):
+        return self.local.size(name)
+
+    def url(self, name):
+        return self.local.url(name)
+
+
+class UploadTestMixin(object):
+    ''' Set each test up with an empty `MEDIA_ROOT` and cache, a logged in
+        superuser, and an album in the example `gallery` to upload to, at
+        `url`
+    '''
+
+    def setUp(self):
+        super().setUp()
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        override(self, MEDIA_ROOT=self.media_root)
+        get_cache().clear()
+
+        self.user = get_user_model()._default_manager.create_superuser(
+            'admin', 'admin@example.com', 'password')
+        self.client.force_login(self.user)
+        self.album = Album.objects.create(title='Album')
+        self.url = reverse('admin:gallery_album_drag_and_drop',
+                           kwargs={'pk': self.album.pk})